@@ -1,12 +1,25 @@
 import telebot
+import argparse
 import requests
-import uuid
-from datetime import datetime
-import json
 import logging
 import os
 from config import Config
-from database import get_db
+from storage import get_storage
+from catalog import get_catalog
+from sessions import get_session_store, CartItem
+from reservations import get_reservations
+from order_ids import get_order_ids
+from order_history import get_order_history, parse_orders_callback, ORDERS_CALLBACK_PREFIX
+from webhook import run_webhook
+from listings import (get_listing_cache, parse_page_callback, PAGE_CALLBACK_PREFIX, CATEGORY, SEARCH,
+                      POPULAR, POPULAR_LIMIT)
+from outbox import SendQueue, PRIORITY_HIGH, PRIORITY_LOW
+from views import (welcome_text, HELP_TEXT, contact_text, PAGE_NOOP, cart_text,
+                   generate_bill, order_totals, order_record, trim_short_items)
+from keyboards import get_keyboards
+from metrics import get_metrics, instrument, MetricsServer, DB_CALL_SECONDS
+import menus
+from router import Router, set_state, MAIN_MENU, BROWSING, CHOOSING_ORDER_TYPE, CHECKOUT, PHONE_INPUT, SEARCHING
 
 # Configure logging
 logging.basicConfig(
@@ -20,61 +33,70 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Initialize bot
+if Config.TELEGRAM_API_URL:
+    telebot.apihelper.API_URL = Config.TELEGRAM_API_URL
 bot = telebot.TeleBot(Config.BOT_TOKEN)
 
+# Replies go through a rate-limited queue instead of blocking handler threads
+send_queue = SendQueue(bot)
+
 # Initialize database
-db = get_db()
+db = get_storage()
 
-# User session management
-user_sessions = {}
+# In-memory catalog for browsing; stock is re-checked by the DB at checkout
+catalog = get_catalog()
 
-class UserSession:
-    def __init__(self, user_id):
-        self.user_id = user_id
-        self.cart = {}
-        self.current_state = "main_menu"
-        self.delivery_type = None
-        self.customer_info = {}
-        self.order_id = None
+# Reply keyboards, serialized once
+keyboards = get_keyboards()
+
+# Rendered listing pages, cached per catalog version
+listings = get_listing_cache()
+
+# User session management
+user_sessions = get_session_store()
+
+# Time-ordered order IDs, unique per ORDER_WORKER_ID and continuing after the newest stored one
+order_ids = get_order_ids()
+order_ids.resume_after(db.get_latest_order_id(order_ids.resume_ceiling()))
+
+# Stock held by carts; holds go when a cart is cleared or its session leaves memory
+reservations = get_reservations()
+user_sessions.add_eviction_listener(lambda session: reservations.release(session.user_id))
+
+# Order history pages; a customer's cached first page goes when they check out or an order changes status
+order_history = get_order_history()
+db.add_order_listener(order_history.invalidate)
+
+# Latency histograms and runtime gauges, when METRICS_PORT is set
+metrics = get_metrics()
+if metrics is not None:
+    instrument(db, metrics.histogram(*DB_CALL_SECONDS), db.NONE_RESULTS, db.UNTIMED)
+    metrics.gauge('grocery_sessions', "Session store size and hit counts", user_sessions.stats)
+    metrics.gauge('grocery_db_pool', "Database connection pool usage", db.get_pool_stats)
+    metrics.gauge('grocery_send_queue', "Outbound message queue depth and outcomes", send_queue.stats)
+    metrics.gauge('grocery_listing_cache', "Cached listing pages and hit counts", listings.stats)
+    metrics.gauge('grocery_reservations', "Stock held by carts and hold outcomes", reservations.stats)
+    metrics.gauge('grocery_order_history', "Cached order history pages and hit counts", order_history.stats)
+    if db.replicas is not None:
+        metrics.gauge('grocery_db_replicas', "Replica health, lag and reads routed", db.get_replica_stats)
 
 def get_user_session(user_id):
-    if user_id not in user_sessions:
-        user_sessions[user_id] = UserSession(user_id)
-    return user_sessions[user_id]
-
-# Keyboard markups
-def create_main_menu_keyboard():
-    markup = telebot.types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-    markup.add("🛒 Browse Products", "🛍️ View Cart")
-    markup.add("📦 Order Type", "📋 My Orders")
-    markup.add("ℹ️ Help", "📞 Contact")
-    return markup
-
-def create_order_type_keyboard():
-    markup = telebot.types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-    markup.add("🚚 Home Delivery", "🏪 Take Away")
-    markup.add("🔙 Back to Main Menu")
-    return markup
-
-def create_category_keyboard():
-    markup = telebot.types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-    categories = db.get_all_categories()
-    if categories:
-        for category in categories:
-            markup.add(f"📂 {category[0]}")
-    markup.add("🔍 Search Products", "⭐ Popular Items")
-    markup.add("🔙 Back to Main Menu")
-    return markup
-
-def create_cart_keyboard():
-    markup = telebot.types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-    markup.add("➕ Add More Items", "➖ Remove Items")
-    markup.add("🛒 Checkout", "🗑️ Clear Cart")
-    markup.add("🔙 Back to Main Menu")
-    return markup
+    return user_sessions.get(user_id)
+
+def order_history_page(user_id, before=None):
+    """A page of the user's orders, the newest unless before is a cursor"""
+    return order_history.page(user_id, lambda limit, cursor: db.get_customer_orders(user_id, limit, cursor), before)
+
+def peek_user_state(user_id):
+    """Get a user's conversation state without creating a session"""
+    session = user_sessions.peek(user_id)
+    return session.current_state if session else None
+
+# Message dispatch: one telebot handler, routed by dict lookups
+router = Router(peek_user_state, menus.BUTTON_ACTIONS, metrics)
 
 # Bot command handlers
-@bot.message_handler(commands=['start'])
+@router.command('start')
 def start_command(message):
     user_id = message.from_user.id
     session = get_user_session(user_id)
@@ -87,182 +109,152 @@ def start_command(message):
         message.from_user.username
     )
     
-    welcome_text = f"""
-🏪 Welcome to {Config.STORE_NAME}, {message.from_user.first_name}!
-
-I can help you:
-• 🛒 Browse and order products
-• 🛍️ Manage your shopping cart
-• 📦 Choose delivery or take-away
-• 📋 Track your orders
-• 📞 Get customer support
-
-Let's get started! 🛒
-    """
-    
-    bot.reply_to(message, welcome_text, reply_markup=create_main_menu_keyboard())
+    send_queue.reply_to(message, welcome_text(message.from_user.first_name), reply_markup=keyboards.get(menus.MAIN))
 
-@bot.message_handler(commands=['help'])
+@router.command('help')
+@router.action('help')
 def help_command(message):
-    help_text = """
-🆘 **How to use this bot:**
-
-🛒 **Browse Products** - View available items by category
-🛍️ **View Cart** - See items in your cart and manage them
-📦 **Order Type** - Choose between home delivery or take-away
-📋 **My Orders** - View your order history
-ℹ️ **Help** - Show this help message
-📞 **Contact** - Get store contact information
-
-**Commands:**
-/start - Start the bot
-/help - Show help
-/cart - Quick access to cart
-/orders - View your orders
-    """
-    bot.reply_to(message, help_text, parse_mode='Markdown')
-
-@bot.message_handler(func=lambda message: message.text == "🛒 Browse Products")
+    send_queue.reply_to(message, HELP_TEXT, parse_mode='Markdown', priority=PRIORITY_LOW)
+
+@router.action('browse')
 def browse_products(message):
     session = get_user_session(message.from_user.id)
-    session.current_state = "browsing"
+    set_state(session, BROWSING)
     
-    bot.reply_to(message, "Please select a category:", reply_markup=create_category_keyboard())
+    send_queue.reply_to(message, "Please select a category:", reply_markup=keyboards.categories())
 
-@bot.message_handler(func=lambda message: message.text.startswith("📂 "))
+@router.prefix(menus.CATEGORY_PREFIX)
 def show_category_products(message):
-    category = message.text.replace("📂 ", "")
-    products = db.get_products_by_category(category)
+    category = message.text[len(menus.CATEGORY_PREFIX):]
+    page = listings.page(CATEGORY, category)
     
-    if products:
-        response = f"🏷️ **{category}** Products:\n\n"
-        markup = telebot.types.InlineKeyboardMarkup()
-        
-        for product in products:
-            product_id, name, price, stock, description, image_url = product
-            response += f"**{name}**\n"
-            response += f"💰 Price: ${price:.2f}\n"
-            response += f"📦 Stock: {stock} units\n"
-            if description:
-                response += f"📝 {description}\n"
-            response += "\n"
-            
-            # Add inline keyboard for adding to cart
-            markup.add(telebot.types.InlineKeyboardButton(
-                f"🛒 Add {name}", 
-                callback_data=f"add_to_cart_{product_id}"
-            ))
-        
-        bot.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
+    if page:
+        response, markup, page_count = page
+        send_queue.reply_to(message, response, reply_markup=markup, parse_mode='Markdown', priority=PRIORITY_LOW)
     else:
-        bot.reply_to(message, f"Sorry, no products available in {category} category.")
+        send_queue.reply_to(message, f"Sorry, no products available in {category} category.")
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("add_to_cart_"))
+@router.callback
 def add_to_cart_callback(call):
     product_id = int(call.data.split("_")[-1])
     session = get_user_session(call.from_user.id)
     
     # Get product details
-    product = db.get_product_by_id(product_id)
+    product = catalog.get_product_by_id(product_id)
     
     if product:
         product_id, name, category, price, stock, description = product
+        item = session.cart.get(product_id)
+        
+        if item is None and len(session.cart) >= Config.MAX_CART_ITEMS:
+            bot.answer_callback_query(call.id, f"❌ Cart is full! Maximum {Config.MAX_CART_ITEMS} items allowed.")
+            return
         
-        if product_id in session.cart:
-            if session.cart[product_id]['quantity'] < stock:
-                session.cart[product_id]['quantity'] += 1
-                bot.answer_callback_query(call.id, f"✅ Added another {name} to cart!")
-            else:
-                bot.answer_callback_query(call.id, f"❌ Sorry, only {stock} {name} available!")
+        # Hold the unit before it goes in the cart, so no other cart can claim it
+        held, available = reservations.hold(call.from_user.id, product_id, (item.quantity if item else 0) + 1)
+        if not held:
+            bot.answer_callback_query(call.id, f"❌ Sorry, only {available} {name} available!" if available
+                                      else f"❌ Sorry, {name} is out of stock!")
+        elif item is not None:
+            item.quantity += 1
+            bot.answer_callback_query(call.id, f"✅ Added another {name} to cart!")
         else:
-            if len(session.cart) >= Config.MAX_CART_ITEMS:
-                bot.answer_callback_query(call.id, f"❌ Cart is full! Maximum {Config.MAX_CART_ITEMS} items allowed.")
-                return
-                
-            session.cart[product_id] = {
-                'name': name,
-                'price': price,
-                'quantity': 1
-            }
+            session.cart[product_id] = CartItem(name, price)
             bot.answer_callback_query(call.id, f"✅ Added {name} to cart!")
     else:
         bot.answer_callback_query(call.id, "❌ Product not found!")
 
-@bot.message_handler(func=lambda message: message.text == "🛍️ View Cart")
+@bot.callback_query_handler(func=lambda call: call.data.startswith(PAGE_CALLBACK_PREFIX) or call.data == PAGE_NOOP)
+@router.callback
+def listing_page_callback(call):
+    if call.data == PAGE_NOOP:
+        bot.answer_callback_query(call.id)
+        return
+    
+    kind, token, page_number = parse_page_callback(call.data)
+    key = listings.key_for(kind, token)
+    fetch = (lambda: db.get_popular_products(POPULAR_LIMIT)) if kind == POPULAR else None
+    page = listings.page(kind, key, page_number, fetch) if key is not None else None
+    if page is None:
+        bot.answer_callback_query(call.id, "❌ This list has expired, please open it again.")
+        return
+    
+    # Turn the page by editing the listing message in place
+    response, markup, page_count = page
+    send_queue.enqueue('edit_message_text', call.message.chat.id, (response,), {
+        'chat_id': call.message.chat.id,
+        'message_id': call.message.message_id,
+        'reply_markup': markup,
+        'parse_mode': 'Markdown',
+    })
+    bot.answer_callback_query(call.id)
+
+@router.command('cart')
+@router.action('view_cart')
 def view_cart(message):
     session = get_user_session(message.from_user.id)
     
     if not session.cart:
-        bot.reply_to(message, "Your cart is empty! 🛒\nUse '🛒 Browse Products' to add items.")
+        send_queue.reply_to(message, "Your cart is empty! 🛒\nUse '🛒 Browse Products' to add items.")
         return
     
-    cart_text = "🛍️ **Your Cart:**\n\n"
-    total = 0
-    
-    for product_id, item in session.cart.items():
-        subtotal = item['price'] * item['quantity']
-        total += subtotal
-        cart_text += f"**{item['name']}**\n"
-        cart_text += f"💰 ${item['price']:.2f} x {item['quantity']} = ${subtotal:.2f}\n\n"
-    
-    cart_text += f"**Total: ${total:.2f}**"
-    
-    bot.reply_to(message, cart_text, reply_markup=create_cart_keyboard(), parse_mode='Markdown')
+    send_queue.reply_to(message, cart_text(session.cart), reply_markup=keyboards.get(menus.CART), parse_mode='Markdown')
 
-@bot.message_handler(func=lambda message: message.text == "📦 Order Type")
+@router.action('order_type')
 def choose_order_type(message):
     session = get_user_session(message.from_user.id)
-    session.current_state = "choosing_order_type"
+    set_state(session, CHOOSING_ORDER_TYPE)
     
-    bot.reply_to(message, "How would you like to receive your order?", 
-                reply_markup=create_order_type_keyboard())
+    send_queue.reply_to(message, "How would you like to receive your order?", 
+                        reply_markup=keyboards.get(menus.ORDER_TYPE))
 
-@bot.message_handler(func=lambda message: message.text in ["🚚 Home Delivery", "🏪 Take Away"])
+@router.action('home_delivery', 'take_away')
 def set_order_type(message):
     session = get_user_session(message.from_user.id)
     
-    if message.text == "🚚 Home Delivery":
+    if menus.BUTTON_ACTIONS[message.text] == 'home_delivery':
         session.delivery_type = "delivery"
-        bot.reply_to(message, "Great! You've selected Home Delivery 🚚\n\nFor delivery, we'll need your address during checkout.")
+        send_queue.reply_to(message, "Great! You've selected Home Delivery 🚚\n\nFor delivery, we'll need your address during checkout.")
     else:
         session.delivery_type = "takeaway"
-        bot.reply_to(message, "Perfect! You've selected Take Away 🏪\n\nYou can pick up your order from our store.")
+        send_queue.reply_to(message, "Perfect! You've selected Take Away 🏪\n\nYou can pick up your order from our store.")
     
-    bot.send_message(message.chat.id, "Order type set! You can now browse products and checkout.", 
-                    reply_markup=create_main_menu_keyboard())
+    send_queue.send_message(message.chat.id, "Order type set! You can now browse products and checkout.", 
+                            reply_markup=keyboards.get(menus.MAIN))
 
-@bot.message_handler(func=lambda message: message.text == "🛒 Checkout")
+@router.action('checkout')
 def checkout(message):
     session = get_user_session(message.from_user.id)
     
     if not session.cart:
-        bot.reply_to(message, "Your cart is empty! Add some products first.")
+        send_queue.reply_to(message, "Your cart is empty! Add some products first.")
         return
     
     if not session.delivery_type:
-        bot.reply_to(message, "Please select order type first (📦 Order Type)")
+        send_queue.reply_to(message, "Please select order type first (📦 Order Type)")
         return
     
-    session.current_state = "checkout"
+    set_state(session, CHECKOUT)
     
     if session.delivery_type == "delivery":
-        bot.reply_to(message, "Please provide your delivery address:")
+        send_queue.reply_to(message, "Please provide your delivery address:", priority=PRIORITY_HIGH)
     else:
-        bot.reply_to(message, "Please provide your phone number for pickup notification:")
+        send_queue.reply_to(message, "Please provide your phone number for pickup notification:", priority=PRIORITY_HIGH)
 
-@bot.message_handler(func=lambda message: get_user_session(message.from_user.id).current_state == "checkout")
+@router.state(CHECKOUT)
 def process_checkout(message):
     session = get_user_session(message.from_user.id)
     
     if session.delivery_type == "delivery":
         session.customer_info['address'] = message.text
-        bot.reply_to(message, "Address saved! Now please provide your phone number:")
-        session.current_state = "phone_input"
+        send_queue.reply_to(message, "Address saved! Now please provide your phone number:", priority=PRIORITY_HIGH)
+        set_state(session, PHONE_INPUT)
     else:
         session.customer_info['phone'] = message.text
         create_order(message)
 
-@bot.message_handler(func=lambda message: get_user_session(message.from_user.id).current_state == "phone_input")
+@router.state(PHONE_INPUT)
 def get_phone_number(message):
     session = get_user_session(message.from_user.id)
     session.customer_info['phone'] = message.text
@@ -270,229 +262,166 @@ def get_phone_number(message):
 
 def create_order(message):
     session = get_user_session(message.from_user.id)
-    order_id = str(uuid.uuid4())[:8].upper()
+    order_id = order_ids.next_id()
     
     # Calculate total
-    total = sum(item['price'] * item['quantity'] for item in session.cart.values())
+    total, delivery_fee, final_total = order_totals(session)
     
     # Check minimum order amount
     if total < Config.MIN_ORDER_AMOUNT:
-        bot.reply_to(message, f"❌ Minimum order amount is ${Config.MIN_ORDER_AMOUNT:.2f}. Your cart total is ${total:.2f}")
+        send_queue.reply_to(message, f"❌ Minimum order amount is ${Config.MIN_ORDER_AMOUNT:.2f}. Your cart total is ${total:.2f}", priority=PRIORITY_HIGH)
+        set_state(session, MAIN_MENU)
         return
     
-    # Add delivery fee if applicable
-    delivery_fee = 0.0
-    if session.delivery_type == "delivery":
-        if total < Config.FREE_DELIVERY_MINIMUM:
-            delivery_fee = Config.DELIVERY_FEE
-    
-    final_total = total + delivery_fee
-    
     # Create order in database
-    order_data = (
-        order_id,
-        message.from_user.id,
-        json.dumps(session.cart),
-        total,
-        delivery_fee,
-        final_total,
-        session.delivery_type,
-        session.customer_info.get('address', ''),
-        session.customer_info.get('phone', ''),
-        'pending',
-        datetime.now()
-    )
-    
-    # Insert order
-    if db.create_order(order_data):
-        # Add individual order items
-        db.add_order_items(order_id, session.cart)
-        
-        # Update product stock
-        for product_id, item in session.cart.items():
-            db.update_product_stock(product_id, item['quantity'])
-        
+    order_data = order_record(order_id, message.from_user.id, session, total, delivery_fee, final_total)
+    
+    # Hold the cart again in case its holds expired; lines nobody can have never reach MySQL
+    short_items = reservations.hold_cart(message.from_user.id, session.cart)
+    placed = False
+    if not short_items:
+        # Insert order, items and stock decrements in a single transaction
+        placed, short_items = db.place_order(order_data, session.cart)
+        if placed:
+            reservations.confirm(message.from_user.id)
+        catalog.invalidate()
+    if placed:
         # Generate bill
         bill_text = generate_bill(session, order_id, total, delivery_fee, final_total)
         
-        bot.reply_to(message, bill_text, parse_mode='Markdown', reply_markup=create_main_menu_keyboard())
+        send_queue.reply_to(message, bill_text, parse_mode='Markdown', reply_markup=keyboards.get(menus.MAIN), priority=PRIORITY_HIGH)
         
         # Clear cart and reset session
         session.cart = {}
-        session.current_state = "main_menu"
+        set_state(session, MAIN_MENU)
         session.customer_info = {}
         
         logger.info(f"Order {order_id} created successfully for user {message.from_user.id}")
+    elif short_items:
+        response = trim_short_items(session, short_items)
+        reservations.hold_cart(message.from_user.id, session.cart)
+        
+        set_state(session, MAIN_MENU)
+        send_queue.reply_to(message, response, reply_markup=keyboards.get(menus.CART), priority=PRIORITY_HIGH)
     else:
-        bot.reply_to(message, "❌ Sorry, there was an error processing your order. Please try again.")
-
-def generate_bill(session, order_id, subtotal, delivery_fee, total):
-    bill = f"""
-🧾 **ORDER CONFIRMATION**
-
-📋 Order ID: `{order_id}`
-📅 Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-**Items Ordered:**
-"""
-    
-    for item in session.cart.values():
-        item_total = item['price'] * item['quantity']
-        bill += f"• {item['name']} x {item['quantity']} = ${item_total:.2f}\n"
-    
-    bill += f"""
-💰 **Subtotal:** ${subtotal:.2f}
-🚚 **Delivery Fee:** ${delivery_fee:.2f}
-**Total Amount:** ${total:.2f}
-
-📦 **Order Type:** {session.delivery_type.title()}
-"""
-    
-    if session.delivery_type == "delivery":
-        bill += f"📍 **Delivery Address:** {session.customer_info.get('address', 'N/A')}\n"
-    
-    bill += f"📞 **Phone:** {session.customer_info.get('phone', 'N/A')}\n"
-    bill += "\n✅ Your order has been confirmed!\n"
-    
-    if session.delivery_type == "delivery":
-        bill += "🚚 Expected delivery time: 30-45 minutes"
-    else:
-        bill += "🏪 You can pick up your order in 15-20 minutes"
-    
-    return bill
+        send_queue.reply_to(message, "❌ Sorry, there was an error processing your order. Please try again.", priority=PRIORITY_HIGH)
 
-@bot.message_handler(func=lambda message: message.text == "📋 My Orders")
+@router.command('orders')
+@router.action('my_orders')
 def my_orders(message):
-    orders = db.get_customer_orders(message.from_user.id, 10)
+    page = order_history_page(message.from_user.id)
     
-    if orders:
-        response = "📋 **Your Recent Orders:**\n\n"
-        for order in orders:
-            order_id, total, status, order_date, order_type, delivery_address = order
-            response += f"🔢 **Order #{order_id}**\n"
-            response += f"💰 Total: ${total:.2f}\n"
-            response += f"📦 Type: {order_type.title()}\n"
-            response += f"📅 Date: {order_date.strftime('%Y-%m-%d %H:%M')}\n"
-            response += f"📊 Status: {status.title()}\n"
-            if order_type == 'delivery' and delivery_address:
-                response += f"📍 Address: {delivery_address[:50]}...\n"
-            response += "\n"
+    if page:
+        response, markup = page
         
-        bot.reply_to(message, response, parse_mode='Markdown')
+        send_queue.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
     else:
-        bot.reply_to(message, "You haven't placed any orders yet. Start shopping! 🛒")
+        send_queue.reply_to(message, "You haven't placed any orders yet. Start shopping! 🛒")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(ORDERS_CALLBACK_PREFIX))
+@router.callback
+def orders_page_callback(call):
+    page = order_history_page(call.from_user.id, parse_orders_callback(call.data))
+    if page is None:
+        bot.answer_callback_query(call.id, "No older orders.")
+        return
+    
+    response, markup = page
+    send_queue.enqueue('edit_message_text', call.message.chat.id, (response,), {
+        'chat_id': call.message.chat.id,
+        'message_id': call.message.message_id,
+        'reply_markup': markup,
+        'parse_mode': 'Markdown',
+    })
+    bot.answer_callback_query(call.id)
 
-@bot.message_handler(func=lambda message: message.text == "� Search Products")
+@router.action('search')
 def search_products_prompt(message):
     session = get_user_session(message.from_user.id)
-    session.current_state = "searching"
-    bot.reply_to(message, "🔍 What product are you looking for? Type the product name:")
+    set_state(session, SEARCHING)
+    send_queue.reply_to(message, "🔍 What product are you looking for? Type the product name:")
 
-@bot.message_handler(func=lambda message: get_user_session(message.from_user.id).current_state == "searching")
+@router.state(SEARCHING)
 def search_products(message):
     session = get_user_session(message.from_user.id)
     search_term = message.text.strip()
     
     if len(search_term) < 2:
-        bot.reply_to(message, "Please enter at least 2 characters to search.")
+        send_queue.reply_to(message, "Please enter at least 2 characters to search.")
         return
     
-    products = db.search_products(search_term)
-    session.current_state = "main_menu"
+    page = listings.page(SEARCH, search_term)
+    set_state(session, MAIN_MENU)
     
-    if products:
-        response = f"🔍 **Search Results for '{search_term}':**\n\n"
-        markup = telebot.types.InlineKeyboardMarkup()
-        
-        for product in products:
-            product_id, name, category, price, stock, description = product
-            response += f"**{name}**\n"
-            response += f"📂 Category: {category}\n"
-            response += f"💰 Price: ${price:.2f}\n"
-            response += f"📦 Stock: {stock} units\n"
-            if description:
-                response += f"📝 {description}\n"
-            response += "\n"
-            
-            markup.add(telebot.types.InlineKeyboardButton(
-                f"🛒 Add {name}", 
-                callback_data=f"add_to_cart_{product_id}"
-            ))
+    if page:
+        response, markup, page_count = page
         
-        bot.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
+        send_queue.reply_to(message, response, reply_markup=markup, parse_mode='Markdown', priority=PRIORITY_LOW)
     else:
-        bot.reply_to(message, f"❌ No products found for '{search_term}'. Try different keywords!")
+        send_queue.reply_to(message, f"❌ No products found for '{search_term}'. Try different keywords!")
 
-@bot.message_handler(func=lambda message: message.text == "⭐ Popular Items")
+@router.action('popular')
 def show_popular_products(message):
-    products = db.get_popular_products(10)
+    page = listings.page(POPULAR, '', fetch=lambda: db.get_popular_products(POPULAR_LIMIT))
     
-    if products:
-        response = "⭐ **Most Popular Products:**\n\n"
-        markup = telebot.types.InlineKeyboardMarkup()
+    if page:
+        response, markup, page_count = page
         
-        for i, product in enumerate(products, 1):
-            product_id, name, category, price, stock, order_count, total_sold = product
-            response += f"**{i}. {name}**\n"
-            response += f"📂 {category} | 💰 ${price:.2f}\n"
-            response += f"📦 {stock} in stock | 🔥 Ordered {order_count} times\n\n"
-            
-            markup.add(telebot.types.InlineKeyboardButton(
-                f"🛒 Add {name}", 
-                callback_data=f"add_to_cart_{product_id}"
-            ))
-        
-        bot.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
+        send_queue.reply_to(message, response, reply_markup=markup, parse_mode='Markdown', priority=PRIORITY_LOW)
     else:
-        bot.reply_to(message, "No popular products data available yet.")
+        send_queue.reply_to(message, "No popular products data available yet.")
 
-@bot.message_handler(func=lambda message: message.text == "📞 Contact")
+@router.action('contact')
 def contact_info(message):
-    contact_text = f"""
-📞 **Contact Information**
-
-🏪 **Store Name:** {Config.STORE_NAME}
-📍 **Address:** {Config.STORE_ADDRESS}
-📞 **Phone:** {Config.STORE_PHONE}
-📧 **Email:** {Config.STORE_EMAIL}
-
-🕒 **Store Hours:**
-Monday - Friday: {Config.STORE_OPEN_TIME} - {Config.STORE_CLOSE_TIME}
-Saturday - Sunday: {Config.STORE_OPEN_TIME} - {Config.STORE_CLOSE_TIME}
+    send_queue.reply_to(message, contact_text(), parse_mode='Markdown', priority=PRIORITY_LOW)
 
-🚚 **Delivery Hours:**
-Monday - Sunday: {Config.DELIVERY_OPEN_TIME} - {Config.DELIVERY_CLOSE_TIME}
-
-💰 **Delivery Info:**
-• Delivery fee: ${Config.DELIVERY_FEE:.2f}
-• Free delivery on orders over ${Config.FREE_DELIVERY_MINIMUM:.2f}
-• Delivery radius: {Config.DELIVERY_RADIUS_KM} km
-    """
-    bot.reply_to(message, contact_text, parse_mode='Markdown')
-
-@bot.message_handler(func=lambda message: message.text == "🔙 Back to Main Menu")
+@router.action('main_menu')
 def back_to_main_menu(message):
     session = get_user_session(message.from_user.id)
-    session.current_state = "main_menu"
-    bot.reply_to(message, "Back to main menu!", reply_markup=create_main_menu_keyboard())
+    set_state(session, MAIN_MENU)
+    send_queue.reply_to(message, "Back to main menu!", reply_markup=keyboards.get(menus.MAIN))
 
-@bot.message_handler(func=lambda message: message.text == "🗑️ Clear Cart")
+@router.action('clear_cart')
 def clear_cart(message):
     session = get_user_session(message.from_user.id)
     session.cart = {}
-    bot.reply_to(message, "Cart cleared! 🗑️", reply_markup=create_main_menu_keyboard())
+    reservations.release(message.from_user.id)
+    send_queue.reply_to(message, "Cart cleared! 🗑️", reply_markup=keyboards.get(menus.MAIN))
 
 # Error handler
-@bot.message_handler(func=lambda message: True)
+@router.fallback
 def handle_unknown_message(message):
-    bot.reply_to(message, "Sorry, I didn't understand that. Please use the menu buttons below.", 
-                reply_markup=create_main_menu_keyboard())
+    send_queue.reply_to(message, "Sorry, I didn't understand that. Please use the menu buttons below.", 
+                        reply_markup=keyboards.get(menus.MAIN))
+
+@bot.message_handler(content_types=['text'])
+def dispatch_message(message):
+    router.dispatch(message)
+
+def shutdown():
+    """Send queued replies and close the session store and database"""
+    send_queue.close()
+    logger.info(f"Session store stats: {user_sessions.stats()}")
+    user_sessions.close()
+    db.close()
 
 if __name__ == "__main__":
-    logger.info("Starting Grocery Store Bot...")
+    parser = argparse.ArgumentParser(description="Grocery Store Bot")
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default=Config.BOT_MODE,
+                        help="receive updates by long polling (development) or webhook")
+    args = parser.parse_args()
+    
+    logger.info(f"Starting Grocery Store Bot in {args.mode} mode...")
+    metrics_server = MetricsServer(metrics).start() if metrics is not None else None
     try:
-        bot.polling(none_stop=True)
+        if args.mode == 'webhook':
+            run_webhook(bot)
+        else:
+            bot.remove_webhook()
+            bot.polling(none_stop=True)
     except Exception as e:
         logger.error(f"Bot error: {e}")
     finally:
-        db.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        shutdown()
@@ -6,13 +6,20 @@ Provides basic administrative functions for managing the store
 
 import sys
 import json
+import time
+import argparse
+import resource
 from datetime import datetime, timedelta
-from database import get_db
+from storage import get_storage
 from config import Config
+import catalog_io
+import exports
+import slowlog
+from order_ids import normalize_order_id
 
 class AdminUtility:
     def __init__(self):
-        self.db = get_db()
+        self.db = get_storage()
         
     def show_menu(self):
         """Display admin menu"""
@@ -47,13 +54,9 @@ class AdminUtility:
         else:
             print("No sales data for today")
             
-        # Get weekly summary
-        week_ago = datetime.now() - timedelta(days=7)
-        weekly_orders = self.db.execute_query("""
-            SELECT COUNT(*) as orders, COALESCE(SUM(total), 0) as revenue
-            FROM orders 
-            WHERE order_date >= %s AND status NOT IN ('cancelled')
-        """, (week_ago,))
+        # Get weekly summary; whole hours from the hourly rollup, including the current one
+        this_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+        weekly_orders = self.db.get_sales_summary(this_hour - timedelta(days=7), this_hour + timedelta(hours=1))
         
         if weekly_orders and weekly_orders[0]:
             orders, revenue = weekly_orders[0]
@@ -88,14 +91,7 @@ class AdminUtility:
         limit = input("Number of orders to show (default 10): ").strip()
         limit = int(limit) if limit.isdigit() else 10
         
-        orders = self.db.execute_query("""
-            SELECT o.order_id, c.first_name, c.last_name, o.total, 
-                   o.status, o.order_type, o.order_date
-            FROM orders o
-            JOIN customers c ON o.customer_id = c.telegram_id
-            ORDER BY o.order_date DESC
-            LIMIT %s
-        """, (limit,))
+        orders = self.db.get_recent_orders(limit)
         
         if orders:
             for order in orders:
@@ -113,29 +109,9 @@ class AdminUtility:
         print("\n👥 CUSTOMER STATISTICS")
         print("-" * 30)
         
-        # Total customers
-        total_customers = self.db.execute_query("SELECT COUNT(*) FROM customers")
-        print(f"📊 Total Customers: {total_customers[0][0] if total_customers else 0}")
-        
-        # Active customers (ordered in last 30 days)
-        month_ago = datetime.now() - timedelta(days=30)
-        active_customers = self.db.execute_query("""
-            SELECT COUNT(DISTINCT customer_id) FROM orders 
-            WHERE order_date >= %s
-        """, (month_ago,))
-        print(f"🔥 Active Customers (30 days): {active_customers[0][0] if active_customers else 0}")
-        
-        # Top customers
-        top_customers = self.db.execute_query("""
-            SELECT c.first_name, c.last_name, COUNT(o.id) as order_count, 
-                   SUM(o.total) as total_spent
-            FROM customers c
-            JOIN orders o ON c.telegram_id = o.customer_id
-            WHERE o.status NOT IN ('cancelled')
-            GROUP BY c.telegram_id
-            ORDER BY total_spent DESC
-            LIMIT 5
-        """)
+        total_customers, active_customers, top_customers = self.db.get_customer_stats(active_days=30, top=5)
+        print(f"📊 Total Customers: {total_customers}")
+        print(f"🔥 Active Customers (30 days): {active_customers}")
         
         if top_customers:
             print("\n🏆 Top Customers:")
@@ -149,10 +125,14 @@ class AdminUtility:
         print("\n📈 POPULAR PRODUCTS REPORT")
         print("-" * 30)
         
-        products = self.db.get_popular_products(10)
+        days = input("Time window in days, e.g. 7 or 30 (default all time): ").strip()
+        days = int(days) if days.isdigit() and int(days) > 0 else None
+        
+        products = self.db.get_popular_products(10, days)
         
         if products:
-            print("Top 10 Most Ordered Products:")
+            window = f"Last {days} Days" if days else "All Time"
+            print(f"Top 10 Most Ordered Products ({window}):")
             for i, product in enumerate(products, 1):
                 product_id, name, category, price, stock, order_count, total_sold = product
                 print(f"  {i}. {name} ({category})")
@@ -162,6 +142,162 @@ class AdminUtility:
         else:
             print("No sales data available yet")
             
+    def rebuild_popularity(self):
+        """Recompute popularity aggregates from order history"""
+        print("\n📈 REBUILD POPULARITY AGGREGATES")
+        print("-" * 30)
+        
+        result = self.db.rebuild_popularity()
+        if result is not None:
+            products, daily_rows = result
+            print(f"✅ Rebuilt popularity for {products} products ({daily_rows} daily rows)")
+        else:
+            print("❌ Failed to rebuild popularity aggregates")
+            
+    def rebuild_sales(self, since=None):
+        """Recompute sales rollups and customer totals from order history"""
+        print("\n📊 REBUILD SALES ROLLUPS")
+        print("-" * 30)
+        
+        result = self.db.rebuild_sales(since)
+        if result is not None:
+            days, customers = result
+            print(f"✅ Rebuilt sales for {days} days and totals for {customers} customers")
+        else:
+            print("❌ Failed to rebuild sales rollups")
+            
+    def import_products(self, path, fmt=None, chunk_size=None, dry_run=False):
+        """Stream products from CSV or JSONL into the products table in chunks"""
+        print(f"\n📥 {'DRY RUN: ' if dry_run else ''}IMPORT PRODUCTS FROM {path}")
+        print("-" * 30)
+        
+        fmt = exports.export_format(path, fmt)
+        chunk_size = chunk_size or Config.IMPORT_CHUNK_SIZE
+        errors = []
+        inserted = updated = unchanged = failed = 0
+        start = time.perf_counter()
+        
+        with catalog_io.open_catalog(path) as stream:
+            products = catalog_io.read_products(stream, fmt, errors)
+            for chunk in catalog_io.chunked(products, chunk_size):
+                if dry_run:
+                    result = self._diff_chunk(chunk)
+                else:
+                    result = self.db.upsert_products(chunk, reason=f"Bulk import from {path}"[:200])
+                if result is None:
+                    failed += len(chunk)
+                    print(f"❌ Chunk of {len(chunk)} products failed, see the log")
+                    continue
+                inserted += result[0]
+                updated += result[1]
+                unchanged += result[2]
+        
+        elapsed = time.perf_counter() - start
+        total = inserted + updated + unchanged + failed + len(errors)
+        for error in errors[:20]:
+            print(f"⚠️  Skipped {error}")
+        if len(errors) > 20:
+            print(f"⚠️  ... and {len(errors) - 20} more invalid rows")
+        verb = "Would insert" if dry_run else "Inserted"
+        print(f"{'🔍' if dry_run else '✅'} {verb} {inserted}, update {updated}, leave {unchanged} unchanged"
+              f" ({failed} failed, {len(errors)} invalid)")
+        print(f"⏱️  {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)")
+        
+    def _diff_chunk(self, chunk):
+        """Print what importing a chunk would change; returns (new, changed, unchanged)"""
+        keys = [catalog_io.product_key(product) for product in chunk]
+        rows = self.db.get_products_by_keys([value for kind, value in keys if kind == 'sku'],
+                                            [value for kind, value in keys if kind == 'id'])
+        if rows is None:
+            return None
+        existing = catalog_io.index_existing(rows)
+        
+        new = changed = 0
+        for key, product in zip(keys, chunk):
+            current = existing.get(key)
+            label = product['sku'] or f"#{product['id']}"
+            if current is None:
+                new += 1
+                print(f"  + {label}: {product['name']} ({product['category']}) ${product['price']} x{product['stock']}")
+                continue
+            diff = catalog_io.diff_product(current, product)
+            if diff:
+                changed += 1
+                changes = ", ".join(f"{field} {old!r} → {value!r}" for field, (old, value) in diff.items())
+                print(f"  ~ {label}: {changes}")
+        return new, changed, len(chunk) - new - changed
+        
+    def export_products(self, path, fmt=None, batch_size=None):
+        """Stream the products table to CSV or JSONL in batches"""
+        print(f"\n📤 EXPORT PRODUCTS TO {path}")
+        print("-" * 30)
+        
+        start = time.perf_counter()
+        count = exports.export_batches(self.db.iter_products(batch_size), path, catalog_io.PRODUCT_FIELDS, fmt)
+        elapsed = time.perf_counter() - start
+        print(f"✅ Exported {count} products in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s)")
+            
+    def export_orders(self, start_date, end_date, orders_path, items_path=None, fmt=None, batch_size=None):
+        """Stream orders placed from start_date through end_date, and their items, to CSV or JSONL"""
+        print(f"\n📤 EXPORT ORDERS {start_date} TO {end_date}")
+        print("-" * 30)
+        
+        start = datetime.combine(start_date, datetime.min.time())
+        end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        started = time.perf_counter()
+        orders, items = exports.export_orders(self.db, start, end, orders_path, items_path, fmt, batch_size)
+        elapsed = time.perf_counter() - started
+        rows = orders + items
+        print(f"✅ Exported {orders} orders to {orders_path}" + (f" and {items} items to {items_path}" if items_path else ""))
+        print(f"⏱️  {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s), "
+              f"peak memory {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+            
+    @staticmethod
+    def slow_query_report(path=None, top=20, as_json=False):
+        """Rank slow-query fingerprints by total time, with their callers and EXPLAIN findings"""
+        path = path or Config.SLOW_QUERY_LOG
+        ranked = slowlog.summarize(slowlog.read_entries(path))[:top]
+        if as_json:
+            print(json.dumps(ranked, indent=2, default=str))
+            return
+        
+        print(f"\n🐢 SLOW QUERIES ({path})")
+        print("-" * 30)
+        if not ranked:
+            print("No slow queries logged" + ("" if slowlog.log_files(path) else "; set SLOW_QUERY_MS to record them"))
+            return
+        for rank, group in enumerate(ranked, 1):
+            print(f"\n{rank}. {group['fingerprint']}  total {group['total_ms']:.0f} ms  "
+                  f"{group['count']} runs  mean {group['mean_ms']:.1f} ms  max {group['max_ms']:.1f} ms")
+            print(f"   SQL: {group['sql'][:300]}")
+            if group['params']:
+                print(f"   Params: {group['params']}")
+            callers = sorted(group['callers'].items(), key=lambda item: item[1], reverse=True)[:3]
+            print("   Callers: " + ", ".join(f"{caller} ({count})" for caller, count in callers))
+            for warning in group['warnings']:
+                print(f"   ⚠️  {warning}")
+            if group['explain_error']:
+                print(f"   (EXPLAIN failed: {group['explain_error']})")
+            elif group['explain'] is None:
+                print("   (no EXPLAIN plan in the retained logs)")
+            
+    def replica_status(self):
+        """Show each configured read replica's health and replication lag"""
+        print("\n🪞 READ REPLICAS")
+        print("-" * 30)
+        
+        if self.db.replicas is None:
+            print("No replicas configured; set DB_REPLICAS to route reads to them")
+            return
+        for replica in self.db.replicas.replicas:
+            lag = "unknown lag" if replica.lag is None else f"{replica.lag}s behind"
+            if replica.healthy:
+                print(f"✅ {replica.name}: in rotation, {lag}")
+            else:
+                print(f"❌ {replica.name}: out of rotation, {replica.problem}")
+        print(f"Reads go to replicas at most {self.db.replicas.max_lag:g}s behind; "
+              f"customers read from the primary for {self.db.replicas.sticky_window:g}s after a write")
+        
     def add_product(self):
         """Add a new product"""
         print("\n➕ ADD NEW PRODUCT")
@@ -187,10 +323,7 @@ class AdminUtility:
         description = input("Description (optional): ").strip()
         
         # Insert product
-        result = self.db.execute_query("""
-            INSERT INTO products (name, category, price, stock, description)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (name, category, price, stock, description or None))
+        result = self.db.add_product(name, category, price, stock, description or None)
         
         if result:
             print(f"✅ Product '{name}' added successfully!")
@@ -208,16 +341,7 @@ class AdminUtility:
             return
             
         # Try to find product
-        if search.isdigit():
-            products = self.db.execute_query("""
-                SELECT id, name, category, price, stock 
-                FROM products WHERE id = %s
-            """, (int(search),))
-        else:
-            products = self.db.execute_query("""
-                SELECT id, name, category, price, stock 
-                FROM products WHERE name LIKE %s
-            """, (f"%{search}%",))
+        products = self.db.find_products(search)
             
         if not products:
             print("❌ Product not found")
@@ -255,22 +379,11 @@ class AdminUtility:
             print("❌ Invalid stock value")
             return
             
-        # Update stock
-        result = self.db.execute_query("""
-            UPDATE products SET stock = %s WHERE id = %s
-        """, (new_stock, product_id))
+        # Update stock; the change is logged against the stock at the time of the update
+        previous_stock = self.db.set_product_stock(product_id, new_stock, "Admin update")
         
-        if result:
-            print(f"✅ Stock updated! {name}: {current_stock} → {new_stock}")
-            
-            # Log the change
-            change = new_stock - current_stock
-            action = "restock" if change > 0 else "adjustment"
-            self.db.execute_query("""
-                INSERT INTO inventory_logs (product_id, action, quantity_change, 
-                                         previous_stock, new_stock, reason)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (product_id, action, change, current_stock, new_stock, "Admin update"))
+        if previous_stock is not None:
+            print(f"✅ Stock updated! {name}: {previous_stock} → {new_stock}")
         else:
             print("❌ Failed to update stock")
             
@@ -279,7 +392,7 @@ class AdminUtility:
         print("\n📋 ORDER MANAGEMENT")
         print("-" * 30)
         
-        order_id = input("Enter order ID: ").strip().upper()
+        order_id = normalize_order_id(input("Enter order ID: "))
         if not order_id:
             return
             
@@ -345,14 +458,7 @@ class AdminUtility:
             return
             
         # Find product
-        if search.isdigit():
-            products = self.db.execute_query("""
-                SELECT id, name, category, stock FROM products WHERE id = %s
-            """, (int(search),))
-        else:
-            products = self.db.execute_query("""
-                SELECT id, name, category, stock FROM products WHERE name LIKE %s
-            """, (f"%{search}%",))
+        products = self.db.find_products(search)
             
         if not products:
             print("❌ Product not found")
@@ -361,7 +467,7 @@ class AdminUtility:
         if len(products) > 1:
             print("Multiple products found:")
             for i, product in enumerate(products):
-                product_id, name, category, stock = product
+                product_id, name, category, price, stock = product
                 print(f"  {i+1}. {name} ({category}) - Stock: {stock}")
                 
             try:
@@ -377,7 +483,7 @@ class AdminUtility:
         else:
             selected_product = products[0]
             
-        product_id, name, category, stock = selected_product
+        product_id, name, category, price, stock = selected_product
         
         print(f"\n⚠️  You are about to delete:")
         print(f"Product: {name} ({category})")
@@ -385,7 +491,7 @@ class AdminUtility:
         
         confirm = input("\nType 'DELETE' to confirm: ").strip()
         if confirm == 'DELETE':
-            result = self.db.execute_query("DELETE FROM products WHERE id = %s", (product_id,))
+            result = self.db.delete_product(product_id)
             if result:
                 print(f"✅ Product '{name}' deleted successfully!")
             else:
@@ -398,7 +504,7 @@ class AdminUtility:
         print("🏪 Grocery Store Bot Admin Utility")
         print("Connecting to database...")
         
-        if not self.db.connection or not self.db.connection.is_connected():
+        if not self.db.is_connected():
             print("❌ Failed to connect to database. Check your configuration.")
             return
             
@@ -445,6 +551,67 @@ class AdminUtility:
         # Close database connection
         self.db.close()
 
-if __name__ == "__main__":
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def main():
+    parser = argparse.ArgumentParser(description="Grocery Store Bot admin utility")
+    subcommands = parser.add_subparsers(dest='command')
+    subcommands.add_parser('rebuild-popularity', help="Recompute popularity aggregates from order history")
+    rebuild_sales = subcommands.add_parser('rebuild-sales', help="Recompute sales rollups and customer totals from order history")
+    rebuild_sales.add_argument('--since', type=parse_date,
+                               help="Only rebuild daily and hourly rollups from this date (YYYY-MM-DD)")
+    import_parser = subcommands.add_parser('import-products', help="Upsert products from a CSV or JSONL file, matched on sku or id")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=exports.FORMATS, help="Default: from the file extension")
+    import_parser.add_argument('--chunk-size', type=int, help=f"Rows per transaction (default {Config.IMPORT_CHUNK_SIZE})")
+    import_parser.add_argument('--dry-run', action='store_true', help="Print what would change without writing")
+    export_parser = subcommands.add_parser('export-products', help="Write all products to a CSV or JSONL file")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--format', choices=exports.FORMATS, help="Default: from the file extension")
+    export_parser.add_argument('--batch-size', type=int, help=f"Rows per fetch (default {Config.EXPORT_BATCH_SIZE})")
+    orders_parser = subcommands.add_parser('export-orders', help="Stream orders and their items for a date range to CSV or JSONL; add .gz to compress")
+    orders_parser.add_argument('path', help="Orders file, e.g. orders.csv or orders.jsonl.gz")
+    orders_parser.add_argument('--items', help="Also write the orders' items to this file")
+    orders_parser.add_argument('--from', dest='start_date', type=parse_date, required=True, help="First day (YYYY-MM-DD)")
+    orders_parser.add_argument('--to', dest='end_date', type=parse_date, help="Last day, inclusive (default today)")
+    orders_parser.add_argument('--format', choices=exports.FORMATS, help="Default: from the file extension")
+    orders_parser.add_argument('--batch-size', type=int, help=f"Rows per fetch (default {Config.EXPORT_BATCH_SIZE})")
+    subcommands.add_parser('replicas', help="Show read replica health and replication lag")
+    slow_parser = subcommands.add_parser('slow-queries', help="Rank logged slow queries by total time")
+    slow_parser.add_argument('--log', help=f"Slow-query log file (default {Config.SLOW_QUERY_LOG})")
+    slow_parser.add_argument('--top', type=int, default=20, help="Fingerprints to show (default 20)")
+    slow_parser.add_argument('--json', action='store_true', help="Print the ranking as JSON")
+    args = parser.parse_args()
+    
+    if args.command == 'slow-queries':
+        # Reads the log file only, so it works while the database is down
+        AdminUtility.slow_query_report(args.log, args.top, args.json)
+        return
+    
     admin = AdminUtility()
-    admin.run()
+    if args.command is None:
+        admin.run()
+        return
+    
+    if not admin.db.is_connected():
+        print("❌ Failed to connect to database. Check your configuration.")
+        sys.exit(1)
+    
+    if args.command == 'rebuild-popularity':
+        admin.rebuild_popularity()
+    elif args.command == 'rebuild-sales':
+        admin.rebuild_sales(args.since)
+    elif args.command == 'import-products':
+        admin.import_products(args.path, args.format, args.chunk_size, args.dry_run)
+    elif args.command == 'export-products':
+        admin.export_products(args.path, args.format, args.batch_size)
+    elif args.command == 'replicas':
+        admin.replica_status()
+    elif args.command == 'export-orders':
+        admin.export_orders(args.start_date, args.end_date or datetime.now().date(), args.path, args.items,
+                            args.format, args.batch_size)
+    admin.db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+Asyncio runtime for Grocery Store Bot
+Serves the same conversation as Bot.py on AsyncTeleBot and the async database
+layer, so one process can keep many users' database round trips in flight
+"""
+
+import asyncio
+import logging
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from config import Config
+from async_database import get_async_db
+from catalog import get_catalog
+from sessions import get_session_store, CartItem
+from reservations import get_reservations
+from order_ids import get_order_ids
+from order_history import get_order_history, parse_orders_callback, ORDERS_CALLBACK_PREFIX
+from views import (welcome_text, HELP_TEXT, contact_text, PAGE_NOOP, cart_text,
+                   generate_bill, order_totals, order_record, trim_short_items)
+from listings import (get_listing_cache, parse_page_callback, PAGE_CALLBACK_PREFIX, CATEGORY, SEARCH,
+                      POPULAR, POPULAR_LIMIT)
+from keyboards import get_keyboards
+from metrics import get_metrics, instrument, MetricsServer, DB_CALL_SECONDS
+import menus
+from router import Router, set_state, MAIN_MENU, BROWSING, CHOOSING_ORDER_TYPE, CHECKOUT, PHONE_INPUT, SEARCHING
+
+# Configure logging
+logging.basicConfig(
+    level=getattr(logging, Config.LOG_LEVEL.upper()),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(Config.LOG_FILE),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Initialize bot
+if Config.TELEGRAM_API_URL:
+    asyncio_helper.API_URL = Config.TELEGRAM_API_URL
+bot = AsyncTeleBot(Config.BOT_TOKEN)
+
+# Set by main() once the event loop is running
+db = None
+
+# The catalog is synced by a background thread (see refresh_catalog), so
+# handler reads never block the event loop on MySQL
+catalog = get_catalog()
+catalog.max_staleness = float('inf')
+
+# Reply keyboards, serialized once
+keyboards = get_keyboards()
+
+# Rendered listing pages, cached per catalog version
+listings = get_listing_cache()
+
+# User session management
+user_sessions = get_session_store()
+
+# Time-ordered order IDs, unique per ORDER_WORKER_ID
+order_ids = get_order_ids()
+
+# Stock held by carts; holds go when a cart is cleared or its session leaves memory
+reservations = get_reservations()
+user_sessions.add_eviction_listener(lambda session: reservations.release(session.user_id))
+
+# Order history pages; a customer's cached first page goes when they check out or an order changes status
+order_history = get_order_history()
+
+# Fire-and-forget tasks, referenced until they finish so they are not garbage collected
+background_tasks = set()
+
+def run_in_background(coro):
+    """Schedule coro without awaiting it; its failure is logged"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_done)
+    return task
+
+def background_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task failed: {task.exception()!r}")
+
+def get_user_session(user_id):
+    return user_sessions.get(user_id)
+
+def peek_user_state(user_id):
+    """Get a user's conversation state without creating a session"""
+    session = user_sessions.peek(user_id)
+    return session.current_state if session else None
+
+# Latency histograms and runtime gauges, when METRICS_PORT is set; the
+# database is instrumented once main() has created it
+metrics = get_metrics()
+if metrics is not None:
+    metrics.gauge('grocery_sessions', "Session store size and hit counts", user_sessions.stats)
+    metrics.gauge('grocery_db_pool', "Database connection pool usage", lambda: db.get_pool_stats() if db else {})
+    metrics.gauge('grocery_listing_cache', "Cached listing pages and hit counts", listings.stats)
+    metrics.gauge('grocery_reservations', "Stock held by carts and hold outcomes", reservations.stats)
+    metrics.gauge('grocery_order_history', "Cached order history pages and hit counts", order_history.stats)
+
+# Handlers are coroutines, so router.dispatch returns an awaitable
+router = Router(peek_user_state, menus.BUTTON_ACTIONS, metrics)
+
+async def popular_page(page_number=0):
+    """Popular products page, fetching the ranking from the async database on a cache miss"""
+    rows = listings.rows(POPULAR, '')
+    if rows is None:
+        rows = await db.get_popular_products(POPULAR_LIMIT)
+    return listings.page(POPULAR, '', page_number, fetch=lambda: rows)
+
+async def order_history_page(user_id, before=None):
+    """A page of the user's orders, the newest unless before is a cursor; cached first pages skip the database"""
+    if before is None:
+        page = order_history.cached(user_id)
+        if page is not None:
+            return page
+    stamp = order_history.stamp()
+    orders = await db.get_customer_orders(user_id, order_history.page_size + 1, before)
+    return order_history.render(user_id, orders, before, stamp)
+
+async def refresh_catalog():
+    """Keep the catalog replica within CATALOG_MAX_STALENESS of MySQL"""
+    while True:
+        await asyncio.sleep(Config.CATALOG_MAX_STALENESS)
+        try:
+            await asyncio.to_thread(catalog.sync)
+        except Exception as e:
+            logger.error(f"Catalog refresh failed: {e}")
+
+# Bot command handlers
+@router.command('start')
+async def start_command(message):
+    user_id = message.from_user.id
+    
+    # Register user in database
+    await db.register_customer(
+        user_id, 
+        message.from_user.first_name, 
+        message.from_user.last_name, 
+        message.from_user.username
+    )
+    
+    await bot.reply_to(message, welcome_text(message.from_user.first_name), reply_markup=keyboards.get(menus.MAIN))
+
+@router.command('help')
+@router.action('help')
+async def help_command(message):
+    await bot.reply_to(message, HELP_TEXT, parse_mode='Markdown')
+
+@router.action('browse')
+async def browse_products(message):
+    session = get_user_session(message.from_user.id)
+    set_state(session, BROWSING)
+    
+    await bot.reply_to(message, "Please select a category:", reply_markup=keyboards.categories())
+
+@router.prefix(menus.CATEGORY_PREFIX)
+async def show_category_products(message):
+    category = message.text[len(menus.CATEGORY_PREFIX):]
+    page = listings.page(CATEGORY, category)
+    
+    if page:
+        response, markup, page_count = page
+        await bot.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
+    else:
+        await bot.reply_to(message, f"Sorry, no products available in {category} category.")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("add_to_cart_"))
+@router.callback
+async def add_to_cart_callback(call):
+    product_id = int(call.data.split("_")[-1])
+    session = get_user_session(call.from_user.id)
+    
+    # Get product details
+    product = catalog.get_product_by_id(product_id)
+    
+    if product:
+        product_id, name, category, price, stock, description = product
+        item = session.cart.get(product_id)
+        
+        if item is None and len(session.cart) >= Config.MAX_CART_ITEMS:
+            await bot.answer_callback_query(call.id, f"❌ Cart is full! Maximum {Config.MAX_CART_ITEMS} items allowed.")
+            return
+        
+        # Hold the unit before it goes in the cart, so no other cart can claim it
+        held, available = reservations.hold(call.from_user.id, product_id, (item.quantity if item else 0) + 1)
+        if not held:
+            await bot.answer_callback_query(call.id, f"❌ Sorry, only {available} {name} available!" if available
+                                            else f"❌ Sorry, {name} is out of stock!")
+        elif item is not None:
+            item.quantity += 1
+            await bot.answer_callback_query(call.id, f"✅ Added another {name} to cart!")
+        else:
+            session.cart[product_id] = CartItem(name, price)
+            await bot.answer_callback_query(call.id, f"✅ Added {name} to cart!")
+    else:
+        await bot.answer_callback_query(call.id, "❌ Product not found!")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(PAGE_CALLBACK_PREFIX) or call.data == PAGE_NOOP)
+@router.callback
+async def listing_page_callback(call):
+    if call.data == PAGE_NOOP:
+        await bot.answer_callback_query(call.id)
+        return
+    
+    kind, token, page_number = parse_page_callback(call.data)
+    key = listings.key_for(kind, token)
+    if kind == POPULAR:
+        page = await popular_page(page_number)
+    else:
+        page = listings.page(kind, key, page_number) if key is not None else None
+    if page is None:
+        await bot.answer_callback_query(call.id, "❌ This list has expired, please open it again.")
+        return
+    
+    # Turn the page by editing the listing message in place
+    response, markup, page_count = page
+    await bot.edit_message_text(response, call.message.chat.id, call.message.message_id,
+                                reply_markup=markup, parse_mode='Markdown')
+    await bot.answer_callback_query(call.id)
+
+@router.command('cart')
+@router.action('view_cart')
+async def view_cart(message):
+    session = get_user_session(message.from_user.id)
+    
+    if not session.cart:
+        await bot.reply_to(message, "Your cart is empty! 🛒\nUse '🛒 Browse Products' to add items.")
+        return
+    
+    await bot.reply_to(message, cart_text(session.cart), reply_markup=keyboards.get(menus.CART), parse_mode='Markdown')
+
+@router.action('order_type')
+async def choose_order_type(message):
+    session = get_user_session(message.from_user.id)
+    set_state(session, CHOOSING_ORDER_TYPE)
+    
+    await bot.reply_to(message, "How would you like to receive your order?", 
+                       reply_markup=keyboards.get(menus.ORDER_TYPE))
+
+@router.action('home_delivery', 'take_away')
+async def set_order_type(message):
+    session = get_user_session(message.from_user.id)
+    
+    if menus.BUTTON_ACTIONS[message.text] == 'home_delivery':
+        session.delivery_type = "delivery"
+        await bot.reply_to(message, "Great! You've selected Home Delivery 🚚\n\nFor delivery, we'll need your address during checkout.")
+    else:
+        session.delivery_type = "takeaway"
+        await bot.reply_to(message, "Perfect! You've selected Take Away 🏪\n\nYou can pick up your order from our store.")
+    
+    await bot.send_message(message.chat.id, "Order type set! You can now browse products and checkout.", 
+                           reply_markup=keyboards.get(menus.MAIN))
+
+@router.action('checkout')
+async def checkout(message):
+    session = get_user_session(message.from_user.id)
+    
+    if not session.cart:
+        await bot.reply_to(message, "Your cart is empty! Add some products first.")
+        return
+    
+    if not session.delivery_type:
+        await bot.reply_to(message, "Please select order type first (📦 Order Type)")
+        return
+    
+    set_state(session, CHECKOUT)
+    
+    if session.delivery_type == "delivery":
+        await bot.reply_to(message, "Please provide your delivery address:")
+    else:
+        await bot.reply_to(message, "Please provide your phone number for pickup notification:")
+
+@router.state(CHECKOUT)
+async def process_checkout(message):
+    session = get_user_session(message.from_user.id)
+    
+    if session.delivery_type == "delivery":
+        session.customer_info['address'] = message.text
+        await bot.reply_to(message, "Address saved! Now please provide your phone number:")
+        set_state(session, PHONE_INPUT)
+    else:
+        session.customer_info['phone'] = message.text
+        await create_order(message)
+
+@router.state(PHONE_INPUT)
+async def get_phone_number(message):
+    session = get_user_session(message.from_user.id)
+    session.customer_info['phone'] = message.text
+    await create_order(message)
+
+async def create_order(message):
+    session = get_user_session(message.from_user.id)
+    order_id = order_ids.next_id()
+    
+    # Calculate total
+    total, delivery_fee, final_total = order_totals(session)
+    
+    # Check minimum order amount
+    if total < Config.MIN_ORDER_AMOUNT:
+        await bot.reply_to(message, f"❌ Minimum order amount is ${Config.MIN_ORDER_AMOUNT:.2f}. Your cart total is ${total:.2f}")
+        set_state(session, MAIN_MENU)
+        return
+    
+    # Create order in database
+    order_data = order_record(order_id, message.from_user.id, session, total, delivery_fee, final_total)
+    
+    # Hold the cart again in case its holds expired; lines nobody can have never reach MySQL
+    short_items = reservations.hold_cart(message.from_user.id, session.cart)
+    placed = False
+    if not short_items:
+        # Insert order, items and stock decrements in a single transaction
+        placed, short_items = await db.place_order(order_data, session.cart)
+        if placed:
+            reservations.confirm(message.from_user.id)
+        run_in_background(asyncio.to_thread(catalog.sync))
+    if placed:
+        # Generate bill
+        bill_text = generate_bill(session, order_id, total, delivery_fee, final_total)
+        
+        await bot.reply_to(message, bill_text, parse_mode='Markdown', reply_markup=keyboards.get(menus.MAIN))
+        
+        # Clear cart and reset session
+        session.cart = {}
+        set_state(session, MAIN_MENU)
+        session.customer_info = {}
+        
+        logger.info(f"Order {order_id} created successfully for user {message.from_user.id}")
+    elif short_items:
+        response = trim_short_items(session, short_items)
+        reservations.hold_cart(message.from_user.id, session.cart)
+        
+        set_state(session, MAIN_MENU)
+        await bot.reply_to(message, response, reply_markup=keyboards.get(menus.CART))
+    else:
+        await bot.reply_to(message, "❌ Sorry, there was an error processing your order. Please try again.")
+
+@router.command('orders')
+@router.action('my_orders')
+async def my_orders(message):
+    page = await order_history_page(message.from_user.id)
+    
+    if page:
+        response, markup = page
+        
+        await bot.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
+    else:
+        await bot.reply_to(message, "You haven't placed any orders yet. Start shopping! 🛒")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(ORDERS_CALLBACK_PREFIX))
+@router.callback
+async def orders_page_callback(call):
+    page = await order_history_page(call.from_user.id, parse_orders_callback(call.data))
+    if page is None:
+        await bot.answer_callback_query(call.id, "No older orders.")
+        return
+    
+    response, markup = page
+    await bot.edit_message_text(response, call.message.chat.id, call.message.message_id,
+                                reply_markup=markup, parse_mode='Markdown')
+    await bot.answer_callback_query(call.id)
+
+@router.action('search')
+async def search_products_prompt(message):
+    session = get_user_session(message.from_user.id)
+    set_state(session, SEARCHING)
+    await bot.reply_to(message, "🔍 What product are you looking for? Type the product name:")
+
+@router.state(SEARCHING)
+async def search_products(message):
+    session = get_user_session(message.from_user.id)
+    search_term = message.text.strip()
+    
+    if len(search_term) < 2:
+        await bot.reply_to(message, "Please enter at least 2 characters to search.")
+        return
+    
+    page = listings.page(SEARCH, search_term)
+    set_state(session, MAIN_MENU)
+    
+    if page:
+        response, markup, page_count = page
+        
+        await bot.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
+    else:
+        await bot.reply_to(message, f"❌ No products found for '{search_term}'. Try different keywords!")
+
+@router.action('popular')
+async def show_popular_products(message):
+    page = await popular_page()
+    
+    if page:
+        response, markup, page_count = page
+        
+        await bot.reply_to(message, response, reply_markup=markup, parse_mode='Markdown')
+    else:
+        await bot.reply_to(message, "No popular products data available yet.")
+
+@router.action('contact')
+async def contact_info(message):
+    await bot.reply_to(message, contact_text(), parse_mode='Markdown')
+
+@router.action('main_menu')
+async def back_to_main_menu(message):
+    session = get_user_session(message.from_user.id)
+    set_state(session, MAIN_MENU)
+    await bot.reply_to(message, "Back to main menu!", reply_markup=keyboards.get(menus.MAIN))
+
+@router.action('clear_cart')
+async def clear_cart(message):
+    session = get_user_session(message.from_user.id)
+    session.cart = {}
+    reservations.release(message.from_user.id)
+    await bot.reply_to(message, "Cart cleared! 🗑️", reply_markup=keyboards.get(menus.MAIN))
+
+# Error handler
+@router.fallback
+async def handle_unknown_message(message):
+    await bot.reply_to(message, "Sorry, I didn't understand that. Please use the menu buttons below.", 
+                       reply_markup=keyboards.get(menus.MAIN))
+
+@bot.message_handler(content_types=['text'])
+async def dispatch_message(message):
+    await router.dispatch(message)
+
+async def main():
+    global db
+    if Config.DB_BACKEND != 'mysql':
+        raise SystemExit(f"async_bot.py runs on MySQL only; run Bot.py for DB_BACKEND={Config.DB_BACKEND}")
+    db = await get_async_db()
+    db.add_order_listener(order_history.invalidate)
+    order_ids.resume_after(await db.get_latest_order_id(order_ids.resume_ceiling()))
+    await asyncio.to_thread(catalog.sync)
+    refresher = asyncio.create_task(refresh_catalog())
+    metrics_server = None
+    if metrics is not None:
+        instrument(db, metrics.histogram(*DB_CALL_SECONDS), db.NONE_RESULTS, db.UNTIMED)
+        metrics_server = MetricsServer(metrics).start()
+    
+    logger.info("Starting Grocery Store Bot (asyncio runtime)...")
+    try:
+        await bot.delete_webhook()
+        await bot.polling(non_stop=True)
+    finally:
+        refresher.cancel()
+        if metrics_server is not None:
+            metrics_server.stop()
+        logger.info(f"Session store stats: {user_sessions.stats()}")
+        await asyncio.to_thread(user_sessions.close)
+        await db.close()
+        await bot.close_session()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        logger.error(f"Bot error: {e}")
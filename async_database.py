@@ -0,0 +1,427 @@
+"""
+Asyncio database layer for Grocery Store Bot
+Mirrors the Storage methods the bot's handlers use on an aiomysql connection
+pool, for handlers running on AsyncTeleBot
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from config import Config
+from database import DatabaseManager, CONNECTION_LOST_ERRORS, can_retry, returns_rows
+from slowlog import get_slow_log
+from storage import Storage
+from transactions import run_async, run_reads_async, order_lines, rollup_days, first_rollup_day
+import transactions
+import queries
+
+try:
+    import aiomysql
+    import pymysql
+except ImportError:
+    aiomysql = None
+
+logger = logging.getLogger(__name__)
+
+# Storage methods that only admin.py, catalog sync and exports call. They run on
+# the blocking manager from storage.get_storage(), never on the event loop.
+SYNC_ONLY_METHODS = frozenset({'find_products', 'add_product', 'set_product_stock', 'delete_product',
+                               'get_products_by_keys', 'upsert_products', 'iter_products',
+                               'get_recent_orders', 'iter_orders', 'iter_order_items'})
+
+class AsyncDatabaseManager:
+    """Async counterpart of DatabaseManager; every query method is a coroutine.
+    
+    Implements every Storage method the bot's handlers use, i.e. all but
+    SYNC_ONLY_METHODS. Create it with ``await AsyncDatabaseManager.create()``
+    or call ``connect()`` before use.
+    """
+    
+    # Methods for which None is a normal result rather than a logged error, for metrics
+    NONE_RESULTS = DatabaseManager.NONE_RESULTS
+    UNTIMED = DatabaseManager.UNTIMED
+    
+    def __init__(self, pool_size=None):
+        if aiomysql is None:
+            raise ImportError("aiomysql is required for the async database layer: "
+                              "pip install -r requirements-async.txt")
+        storage_methods = {name for name, value in vars(Storage).items() if callable(value) and not name.startswith('_')}
+        missing = storage_methods - SYNC_ONLY_METHODS - set(dir(type(self)))
+        if missing:
+            raise TypeError(f"AsyncDatabaseManager lacks Storage methods: {', '.join(sorted(missing))}")
+        self.pool = None
+        self.pool_size = pool_size or Config.DB_POOL_SIZE
+        self.slow_log = get_slow_log()
+        self._order_listeners = []
+        
+        # Wait-time statistics for sizing the pool
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    @classmethod
+    async def create(cls, pool_size=None):
+        manager = cls(pool_size)
+        await manager.connect()
+        return manager
+    
+    async def connect(self):
+        """Create the connection pool"""
+        try:
+            db_config = Config.get_db_config()
+            self.pool = await aiomysql.create_pool(
+                minsize=1, maxsize=self.pool_size,
+                host=db_config['host'], port=db_config['port'],
+                user=db_config['user'], password=db_config['password'],
+                db=db_config['database'], charset=db_config['charset'],
+                autocommit=db_config['autocommit'],
+            )
+            logger.info(f"Successfully connected to MySQL database (async pool size {self.pool_size})")
+            return True
+        except (pymysql.err.Error, OSError) as e:
+            logger.error(f"Error connecting to MySQL database: {e}")
+            return False
+    
+    async def reconnect(self):
+        """Close idle pooled connections so they are re-established on next use"""
+        if self.pool is not None:
+            await self.pool.clear()
+        return await self.is_connected()
+    
+    def __getattr__(self, name):
+        if name in SYNC_ONLY_METHODS:
+            raise AttributeError(f"{name} is not available on the event loop; "
+                                 f"call it on storage.get_storage() from a thread")
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+    
+    async def is_connected(self):
+        """Check that a pooled connection can reach the server"""
+        try:
+            async with self.connection() as conn:
+                await conn.ping(reconnect=False)
+                return True
+        except Exception:
+            return False
+    
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a pooled connection, waiting up to DB_POOL_TIMEOUT seconds"""
+        if self.pool is None and not await self.connect():
+            raise ConnectionError("Database pool is not available")
+        started = time.perf_counter()
+        waited = self.pool.freesize == 0
+        try:
+            conn = await asyncio.wait_for(self.pool.acquire(), Config.DB_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        wait = time.perf_counter() - started
+        self.checkouts += 1
+        if waited:
+            self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        
+        try:
+            yield conn
+        except pymysql.err.Error as e:
+            # Broken sockets are closed so the pool replaces them
+            if e.args and e.args[0] in CONNECTION_LOST_ERRORS:
+                conn.close()
+            raise
+        finally:
+            self.pool.release(conn)
+    
+    def get_pool_stats(self):
+        """Get connection pool usage and wait-time statistics"""
+        size = self.pool.size if self.pool else 0
+        free = self.pool.freesize if self.pool else 0
+        return {
+            'size': self.pool_size,
+            'open': size,
+            'in_use': size - free,
+            'checkouts': self.checkouts,
+            'waited': self.waited,
+            'timeouts': self.timeouts,
+            'reconnects': self.reconnects,
+            'avg_wait_ms': (self.total_wait / self.waited * 1000) if self.waited else 0.0,
+            'max_wait_ms': self.max_wait * 1000,
+        }
+    
+    def get_replica_stats(self):
+        """Reads all go to the primary here, so there are no replica statistics"""
+        return None
+    
+    def add_order_listener(self, callback):
+        """Register callback(customer_id), called after a customer's order is placed or changes status"""
+        self._order_listeners.append(callback)
+    
+    def _orders_changed(self, customer_id):
+        for callback in self._order_listeners:
+            try:
+                callback(customer_id)
+            except Exception as e:
+                logger.error(f"Order listener error: {e}")
+    
+    async def _execute(self, conn, query, params):
+        rows = getattr(query, 'returns_rows', None)
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params or None)
+            if returns_rows(query) if rows is None else rows:
+                return await cursor.fetchall()
+            return cursor.rowcount
+    
+    async def _timed_execute(self, conn, query, params):
+        """Run one statement, passing it to the slow-query log when one is configured"""
+        started = time.perf_counter()
+        result = await self._execute(conn, query, params)
+        if self.slow_log is not None:
+            await self._record_slow(conn, query, params, time.perf_counter() - started)
+        return result
+    
+    async def _record_slow(self, conn, query, params, seconds):
+        try:
+            entry = self.slow_log.entry(query, params, seconds)
+            if entry is None:
+                return
+            plan = error = None
+            if self.slow_log.needs_plan(entry):
+                try:
+                    async with conn.cursor(aiomysql.DictCursor) as cursor:
+                        await cursor.execute("EXPLAIN " + query, params or None)
+                        plan = await cursor.fetchall()
+                except Exception as e:
+                    error = str(e)
+            self.slow_log.write(entry, plan, error)
+        except Exception as e:
+            logger.warning(f"Could not record slow query: {e}")
+    
+    async def execute_query(self, query, params=None):
+        """Execute a query and return results.
+        
+        Like DatabaseManager, a read or a write that never reached the server
+        is retried once after a lost connection; other writes are not.
+        """
+        try:
+            try:
+                async with self.connection() as conn:
+                    return await self._timed_execute(conn, query, params)
+            except pymysql.err.OperationalError as e:
+                if not e.args or not can_retry(query, e.args[0]):
+                    raise
+                logger.warning(f"Lost database connection ({e}), reconnecting")
+                self.reconnects += 1
+                async with self.connection() as conn:
+                    return await self._timed_execute(conn, query, params)
+        
+        except pymysql.err.Error as e:
+            logger.error(f"Database query error: {e}")
+            logger.error(f"Query: {query}")
+            logger.error(f"Params: {params}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error in execute_query: {e}")
+            return None
+    
+    async def read_query(self, query, params=None, customer_id=None):
+        """Run a read; without replicas, the same as execute_query"""
+        return await self.execute_query(query, params)
+    
+    @asynccontextmanager
+    async def transaction(self):
+        """Run several statements on one pooled connection as a single transaction"""
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                await conn.begin()
+                try:
+                    yield conn, cursor
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+    
+    async def _transact(self, steps):
+        """Run transactions.py steps as one transaction; returns what they return"""
+        async with self.transaction() as (conn, cursor):
+            return await run_async(steps, conn, cursor)
+    
+    async def get_products_by_category(self, category):
+        """Get all products in a specific category"""
+        return await self.execute_query(queries.GET_PRODUCTS_BY_CATEGORY, (category,))
+    
+    async def get_product_by_id(self, product_id):
+        """Get product details by ID"""
+        result = await self.execute_query(queries.GET_PRODUCT_BY_ID, (product_id,))
+        return result[0] if result else None
+    
+    async def get_products_changed_since(self, since=None):
+        """Get full product rows updated at or after a timestamp (all rows when None)"""
+        if since is None:
+            return await self.execute_query(queries.GET_ALL_PRODUCTS)
+        return await self.execute_query(queries.GET_PRODUCTS_CHANGED_SINCE, (since,))
+    
+    async def get_catalog_summary(self):
+        """Get product row count and newest update time"""
+        return await self.execute_query(queries.GET_CATALOG_SUMMARY)
+    
+    async def get_product_ids(self):
+        """Get the ids of every product"""
+        return await self.execute_query(queries.GET_PRODUCT_IDS)
+    
+    async def get_all_categories(self):
+        """Get all product categories"""
+        return await self.execute_query(queries.GET_ALL_CATEGORIES)
+    
+    async def register_customer(self, telegram_id, first_name, last_name, username):
+        """Register a new customer or update existing one"""
+        params = (telegram_id, first_name or '', last_name or '', username or '', datetime.now())
+        return await self.execute_query(queries.REGISTER_CUSTOMER, params)
+    
+    async def create_order(self, order_data):
+        """Create a new order"""
+        return await self.execute_query(queries.CREATE_ORDER, order_data)
+    
+    async def add_order_items(self, order_id, cart_items):
+        """Add items to order_items table"""
+        _, item_rows = order_lines(order_id, cart_items)
+        for params in item_rows:
+            await self.execute_query(queries.ADD_ORDER_ITEM, params)
+    
+    async def update_product_stock(self, product_id, quantity_sold):
+        """Update product stock after sale"""
+        return await self.execute_query(queries.UPDATE_PRODUCT_STOCK, (quantity_sold, product_id, quantity_sold))
+    
+    async def place_order(self, order_data, cart_items):
+        """Create an order with its items and stock decrements in one transaction.
+        
+        Same results as DatabaseManager.place_order.
+        """
+        try:
+            placed, short_items = await self._transact(transactions.place_order(queries, order_data, cart_items))
+        
+        except pymysql.err.Error as e:
+            logger.error(f"Error placing order {order_data[0]}: {e}")
+            return False, []
+        except Exception as e:
+            logger.error(f"Unexpected error in place_order: {e}")
+            return False, []
+        if placed:
+            self._orders_changed(order_data[1])
+        return placed, short_items
+    
+    async def get_customer_orders(self, telegram_id, limit=10, before=None):
+        """Get customer's order history newest first, starting after the (order_date, id) cursor before"""
+        if before is None:
+            return await self.execute_query(queries.GET_CUSTOMER_ORDERS, (telegram_id, limit))
+        order_date, row_id = before
+        return await self.execute_query(queries.GET_CUSTOMER_ORDERS_BEFORE,
+                                        (telegram_id, order_date, order_date, row_id, limit))
+    
+    async def get_latest_order_id(self, ceiling):
+        """Get the greatest order ID as long as ceiling and not above it, or None"""
+        result = await self.execute_query(queries.GET_LATEST_ORDER_ID, (ceiling, len(ceiling)))
+        return result[0][0] if result else None
+    
+    async def get_order_details(self, order_id):
+        """Get detailed order information"""
+        result = await self.execute_query(queries.GET_ORDER_DETAILS, (order_id,))
+        return result[0] if result else None
+    
+    async def update_order_status(self, order_id, status):
+        """Update order status, reversing popularity and sales when an order is cancelled"""
+        try:
+            affected_rows, customer_id = await self._transact(transactions.update_order_status(queries, order_id, status))
+        
+        except pymysql.err.Error as e:
+            logger.error(f"Error updating status of order {order_id}: {e}")
+            return None
+        if customer_id is not None:
+            self._orders_changed(customer_id)
+        return affected_rows
+    
+    async def get_low_stock_products(self, threshold=10):
+        """Get products with low stock"""
+        return await self.execute_query(queries.GET_LOW_STOCK_PRODUCTS, (threshold,))
+    
+    async def get_daily_sales_report(self, date=None):
+        """Get daily sales report from the daily rollup"""
+        if date is None:
+            date = datetime.now().date()
+        return await self.execute_query(queries.GET_DAILY_SALES_REPORT, (date,))
+    
+    async def get_sales_summary(self, start, end=None):
+        """Get (orders, revenue) for the hours in [start, end); end defaults to now"""
+        end = end or datetime.now()
+        return await self.execute_query(queries.GET_SALES_SUMMARY, (start, end))
+    
+    async def get_customer_stats(self, active_days=30, top=5):
+        """Get (total customers, customers active in the last active_days, top customers by spend)"""
+        return await run_reads_async(transactions.customer_stats(queries, active_days, top), self.read_query)
+    
+    async def search_products(self, search_term):
+        """Search products by name or description"""
+        search_pattern = f"%{search_term}%"
+        return await self.execute_query(queries.SEARCH_PRODUCTS, (search_pattern, search_pattern))
+    
+    async def get_popular_products(self, limit=10, days=None):
+        """Get most popular products from the popularity aggregates, optionally for the last N days"""
+        if days is None:
+            return await self.execute_query(queries.GET_POPULAR_PRODUCTS, (limit,))
+        since = datetime.now().date() - timedelta(days=days - 1)
+        return await self.execute_query(queries.GET_POPULAR_PRODUCTS_SINCE, (since, limit))
+    
+    async def rebuild_popularity(self):
+        """Recompute the popularity aggregates from the full order history"""
+        try:
+            return await self._transact(transactions.rebuild_popularity(queries))
+        
+        except pymysql.err.Error as e:
+            logger.error(f"Error rebuilding popularity aggregates: {e}")
+            return None
+    
+    async def rebuild_sales(self, since=None):
+        """Recompute the sales rollups and customer totals; same results as DatabaseManager.rebuild_sales"""
+        if since is None:
+            since = first_rollup_day(await self.execute_query(queries.GET_FIRST_ORDER_DATE))
+        
+        days = 0
+        try:
+            for day, start, end in rollup_days(since, datetime.now().date()):
+                await self._transact(transactions.rebuild_sales_day(queries, day, start, end))
+                days += 1
+            return days, await self._transact(transactions.rebuild_customer_totals(queries))
+        
+        except pymysql.err.Error as e:
+            logger.error(f"Error rebuilding sales rollups after {days} days: {e}")
+            return None
+    
+    async def add_customer_address(self, telegram_id, address_data):
+        """Add customer delivery address"""
+        return await self.execute_query(queries.ADD_CUSTOMER_ADDRESS, (telegram_id, *address_data))
+    
+    async def get_customer_addresses(self, telegram_id):
+        """Get customer's saved addresses"""
+        return await self.execute_query(queries.GET_CUSTOMER_ADDRESSES, (telegram_id,))
+    
+    async def close(self):
+        """Close all pooled database connections"""
+        if self.pool is not None:
+            logger.info(f"Async connection pool stats: {self.get_pool_stats()}")
+            self.pool.close()
+            await self.pool.wait_closed()
+            logger.info("MySQL connections closed")
+
+# Singleton instance
+_async_db_instance = None
+
+async def get_async_db():
+    """Get singleton async database instance"""
+    global _async_db_instance
+    if _async_db_instance is None:
+        _async_db_instance = await AsyncDatabaseManager.create()
+    return _async_db_instance
@@ -0,0 +1,1608 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for Grocery Store Bot
+Synthetic workloads for comparing hot paths before and after a change
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+ADJECTIVES = ['Fresh', 'Organic', 'Frozen', 'Sweet', 'Spicy', 'Smoked', 'Whole', 'Low Fat',
+              'Crunchy', 'Premium', 'Wild', 'Roasted', 'Sliced', 'Natural', 'Classic']
+NOUNS = ['Apples', 'Bananas', 'Carrots', 'Tomatoes', 'Spinach', 'Milk', 'Eggs', 'Cheese',
+         'Yogurt', 'Beef', 'Chicken', 'Salmon', 'Bread', 'Croissants', 'Rice', 'Pasta',
+         'Olive Oil', 'Juice', 'Water', 'Chips', 'Nuts', 'Pizza', 'Ice Cream', 'Shampoo',
+         'Toothpaste', 'Soap', 'Towels', 'Coffee', 'Tea', 'Honey', 'Butter', 'Cereal']
+SIZES = ['(1 lb)', '(2 lb)', '(500ml)', '(1 gallon)', '(dozen)', '(12 pack)', '(8 oz)', '(family size)']
+CATEGORIES = ['Fruits & Vegetables', 'Dairy & Eggs', 'Meat & Seafood', 'Bakery', 'Pantry Staples',
+              'Beverages', 'Snacks', 'Frozen Foods', 'Personal Care', 'Household']
+BRANDS = [f"Brand{i:04d}" for i in range(2000)]
+
+def synthetic_products(count, seed=42):
+    """Generate catalog rows (id, name, category, price, stock, description, image_url)"""
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        noun = rng.choice(NOUNS)
+        name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {noun} {rng.choice(SIZES)}"
+        description = f"{rng.choice(ADJECTIVES)} {noun.lower()} from {rng.choice(BRANDS)}"
+        yield (product_id, name, rng.choice(CATEGORIES), round(rng.uniform(0.5, 50), 2),
+               rng.randint(0, 100), description, None)
+
+def add_typo(word, rng):
+    """Swap two adjacent letters, the most common typing mistake"""
+    if len(word) < 4:
+        return word
+    i = rng.randint(1, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def report(label, samples):
+    """Print latency summary of samples in seconds"""
+    print(f"  {label:<24} mean {statistics.mean(samples) * 1000:9.3f} ms | "
+          f"p50 {percentile(samples, 50) * 1000:9.3f} ms | p95 {percentile(samples, 95) * 1000:9.3f} ms")
+
+def like_scan(rows, term):
+    """Python equivalent of the LIKE '%term%' path: test every row"""
+    needle = term.lower()
+    return sorted(
+        ((row[0], row[1], row[2], row[3], row[4], row[5]) for row in rows
+         if row[4] > 0 and (needle in row[1].lower() or (row[5] and needle in row[5].lower()))),
+        key=lambda row: row[1]
+    )
+
+def like_mysql(rows, queries):
+    """Load rows into a scratch table and time the real LIKE query"""
+    from database import get_db
+    db = get_db()
+    with db.pool.connection() as cnx:
+        cursor = cnx.cursor()
+        cursor.execute("DROP TABLE IF EXISTS bench_products")
+        cursor.execute("CREATE TABLE bench_products LIKE products")
+        insert = """
+            INSERT INTO bench_products (id, name, category, price, stock, description)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        for start in range(0, len(rows), 5000):
+            cursor.executemany(insert, [row[:6] for row in rows[start:start + 5000]])
+        cnx.commit()
+        
+        samples = []
+        for term in queries:
+            pattern = f"%{term}%"
+            started = time.perf_counter()
+            cursor.execute("""
+                SELECT id, name, category, price, stock, description
+                FROM bench_products 
+                WHERE (name LIKE %s OR description LIKE %s) AND stock > 0
+                ORDER BY name
+            """, (pattern, pattern))
+            cursor.fetchall()
+            samples.append(time.perf_counter() - started)
+        cursor.execute("DROP TABLE bench_products")
+        cursor.close()
+    return samples
+
+def bench_search(args):
+    """Compare the inverted index with the LIKE '%term%' path"""
+    from search import SearchIndex
+    rng = random.Random(7)
+    
+    for size in args.sizes:
+        rows = list(synthetic_products(size))
+        queries = [rng.choice(NOUNS).split()[0].lower() for _ in range(args.queries)]
+        typo_queries = [add_typo(query, rng) for query in queries]
+        
+        print(f"\n{size:,} products, {args.queries} queries")
+        index = SearchIndex()
+        started = time.perf_counter()
+        index.build(rows)
+        print(f"  index build              {time.perf_counter() - started:.2f} s")
+        
+        report("index (exact)", timed(lambda term: index.search(term), queries))
+        report("index (typo)", timed(lambda term: index.search(term), typo_queries))
+        report("index (incremental upd)", timed(
+            lambda row: index.apply_changes([row], []), rng.sample(rows, min(len(rows), args.queries))))
+        
+        if args.mysql:
+            report("MySQL LIKE", like_mysql(rows, queries))
+        else:
+            report("LIKE scan (in-process)", timed(lambda term: like_scan(rows, term), queries))
+
+def bench_dispatch(args):
+    """Compare per-message dispatch cost of the router with a linear predicate chain"""
+    from types import SimpleNamespace
+    from router import Router
+    
+    states = {}
+    def handler(message):
+        return None
+    
+    for items in args.menu_items:
+        buttons = [f"Menu item {i}" for i in range(items)]
+        
+        # The old layout: one telebot predicate per handler, checked in order
+        predicates = [(lambda message, text=text: message.text == text) for text in buttons]
+        predicates.insert(len(predicates) // 2, lambda message: message.text.startswith("📂 "))
+        for state in ("checkout", "phone_input", "searching"):
+            predicates.insert(len(predicates) // 2,
+                              lambda message, state=state: states.get(message.from_user.id) == state)
+        predicates.append(lambda message: True)
+        
+        def linear_dispatch(message):
+            for predicate in predicates:
+                if predicate(message):
+                    return handler(message)
+        
+        router = Router(states.get)
+        router.text(*buttons)(handler)
+        router.prefix("📂 ")(handler)
+        router.state("checkout", "phone_input", "searching")(handler)
+        router.fallback(handler)
+        
+        user = SimpleNamespace(id=1)
+        messages = {
+            'first button': SimpleNamespace(text=buttons[0], from_user=user),
+            'last button': SimpleNamespace(text=buttons[-1], from_user=user),
+            'unknown text': SimpleNamespace(text="hello there", from_user=user),
+        }
+        print(f"\n{items} menu items, {args.iterations:,} messages each")
+        for label, message in messages.items():
+            for name, dispatch in (("linear", linear_dispatch), ("router", router.dispatch)):
+                started = time.perf_counter()
+                for _ in range(args.iterations):
+                    dispatch(message)
+                elapsed = time.perf_counter() - started
+                print(f"  {label:<13} {name:<7} {elapsed / args.iterations * 1e9:9.0f} ns/message")
+
+def synthetic_update(update_id, user_id, text):
+    """Build a Telegram Update dict for a private text message"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'username': f"user{user_id}"}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+            'from': user,
+            'text': text,
+        },
+    }
+
+def load_updates(path, count):
+    """Read recorded updates (one JSON object per line) or synthesize them"""
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    menu = ["🛒 Browse Products", "🛍️ View Cart", "📋 My Orders", "📞 Contact", "hello"]
+    return [synthetic_update(i + 1, 1000 + i % 50, menu[i % len(menu)]) for i in range(count)]
+
+class _FakeAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+class FakeBotAPI:
+    """Local stand-in for the Telegram Bot API.
+    
+    Serves queued updates to getUpdates and records every other call, so a
+    bot pointed at it (TELEGRAM_API_URL / apihelper.API_URL) runs offline.
+    With global_rate / chat_rate set, sends beyond that many per second are
+    answered with 429 and retry_after like the real API.
+    """
+    
+    def __init__(self, port=0, global_rate=None, chat_rate=None, retry_after=1):
+        self.updates = []
+        self.sent = []
+        self.rate_limited = 0
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.retry_after = retry_after
+        self._window = deque()
+        self._chat_windows = {}
+        self._cond = threading.Condition()
+        self._message_id = 0
+        api = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._reply()
+            
+            def do_POST(self):
+                self._reply()
+            
+            def _reply(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit('/', 1)[-1]
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length', 0))
+                if length:
+                    params.update(parse_qsl(self.rfile.read(length).decode()))
+                status, payload = api.handle(method, params)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self._server = _FakeAPIServer(('127.0.0.1', port), Handler)
+        self.port = self._server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}/bot{{0}}/{{1}}"
+    
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def push_updates(self, updates):
+        with self._cond:
+            self.updates.extend(updates)
+            self._cond.notify_all()
+    
+    def wait_for_sent(self, count, timeout=60):
+        """Block until at least count outbound calls were recorded"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self.sent) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+    
+    def handle(self, method, params):
+        """Answer one Bot API call with (HTTP status, JSON payload)"""
+        if method == 'getUpdates':
+            offset = int(params.get('offset', 0))
+            limit = int(params.get('limit', 100))
+            with self._cond:
+                pending = [u for u in self.updates if u['update_id'] >= offset]
+                if not pending:
+                    self._cond.wait(min(float(params.get('timeout', 0)), 0.5))
+                    pending = [u for u in self.updates if u['update_id'] >= offset]
+            return 200, {'ok': True, 'result': pending[:limit]}
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 123456, 'is_bot': True,
+                                                'first_name': 'Bench', 'username': 'bench_bot'}}
+        if method in ('deleteWebhook', 'setWebhook', 'answerCallbackQuery'):
+            return 200, {'ok': True, 'result': True}
+        
+        with self._cond:
+            chat_id = int(params.get('chat_id', 0) or 0)
+            if self._over_limit(chat_id):
+                self.rate_limited += 1
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f"Too Many Requests: retry after {self.retry_after}",
+                             'parameters': {'retry_after': self.retry_after}}
+            self._message_id += 1
+            self.sent.append((time.perf_counter(), method, params))
+            self._cond.notify_all()
+            return 200, {'ok': True, 'result': {
+                'message_id': self._message_id, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', ''),
+            }}
+    
+    def _over_limit(self, chat_id):
+        """Sliding one-second windows, overall and per chat"""
+        now = time.monotonic()
+        windows = []
+        if self.global_rate:
+            windows.append((self._window, self.global_rate))
+        if self.chat_rate:
+            windows.append((self._chat_windows.setdefault(chat_id, deque()), self.chat_rate))
+        for window, limit in windows:
+            while window and now - window[0] >= 1:
+                window.popleft()
+            if len(window) >= limit:
+                return True
+        for window, limit in windows:
+            window.append(now)
+        return False
+
+def bench_webhook(args):
+    """Compare update throughput of webhook mode with long polling, against a fake Bot API"""
+    import asyncio
+    import http.client
+    import telebot
+    from webhook import WebhookServer
+    
+    updates = load_updates(args.updates, args.count)
+    
+    def make_bot(fake):
+        telebot.apihelper.API_URL = fake.url
+        bot = telebot.TeleBot('123456:BENCH', threaded=True, num_threads=args.workers)
+        
+        @bot.message_handler(content_types=['text'])
+        def echo(message):
+            bot.send_message(message.chat.id, message.text)
+        return bot
+    
+    # Long polling: the fake server hands out batches to getUpdates
+    fake = FakeBotAPI().start()
+    bot = make_bot(fake)
+    fake.push_updates(updates)
+    started = time.perf_counter()
+    poller = threading.Thread(target=bot.polling, kwargs={'non_stop': True, 'interval': 0, 'timeout': 1},
+                              daemon=True)
+    poller.start()
+    fake.wait_for_sent(len(updates))
+    polling_elapsed = time.perf_counter() - started
+    bot.stop_polling()
+    fake.stop()
+    
+    # Webhook: updates are POSTed to a local server by concurrent clients,
+    # like Telegram does up to max_connections
+    fake = FakeBotAPI().start()
+    bot = make_bot(fake)
+    server = WebhookServer(bot, host='127.0.0.1', port=0, path='/webhook', secret_token='bench',
+                           workers=args.workers, queue_size=len(updates))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    
+    bodies = [json.dumps(update).encode() for update in updates]
+    statuses = []
+    def post_all(chunk):
+        connection = http.client.HTTPConnection('127.0.0.1', server.port)
+        for body in chunk:
+            connection.request('POST', '/webhook', body, {
+                'Content-Type': 'application/json',
+                'X-Telegram-Bot-Api-Secret-Token': 'bench',
+            })
+            response = connection.getresponse()
+            response.read()
+            statuses.append(response.status)
+        connection.close()
+    
+    started = time.perf_counter()
+    clients = [threading.Thread(target=post_all, args=(bodies[i::args.connections],))
+               for i in range(args.connections)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    fake.wait_for_sent(len(updates))
+    webhook_elapsed = time.perf_counter() - started
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    fake.stop()
+    
+    print(f"\n{len(updates):,} updates, {args.workers} handler threads")
+    print(f"  polling  {len(updates) / polling_elapsed:9.0f} updates/s")
+    print(f"  webhook  {len(updates) / webhook_elapsed:9.0f} updates/s "
+          f"({args.connections} connections, {statuses.count(200)} accepted, "
+          f"{len(statuses) - statuses.count(200)} rejected)")
+
+def bench_async_db(args):
+    """Compare concurrent-user capacity of the threaded DatabaseManager with AsyncDatabaseManager (needs MySQL)"""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from config import Config
+    from database import DatabaseManager
+    from async_database import AsyncDatabaseManager
+    
+    Config.DB_POOL_SIZE = args.pool_size
+    sync_db = DatabaseManager()
+    product_ids = [row[0] for row in sync_db.get_product_ids() or []]
+    if not product_ids:
+        raise SystemExit("No products found; load database_schema.sql into a local MySQL first")
+    customer_ids = [1000 + user for user in range(max(args.users))]
+    
+    # The same read mix the bot issues: order history, popular items, product lookups
+    def sync_request(user, i):
+        if i % 3 == 0:
+            return sync_db.get_customer_orders(customer_ids[user], 10)
+        if i % 3 == 1:
+            return sync_db.get_popular_products(10)
+        return sync_db.get_product_by_id(product_ids[(user + i) % len(product_ids)])
+    
+    def async_request(async_db, user, i):
+        if i % 3 == 0:
+            return async_db.get_customer_orders(customer_ids[user], 10)
+        if i % 3 == 1:
+            return async_db.get_popular_products(10)
+        return async_db.get_product_by_id(product_ids[(user + i) % len(product_ids)])
+    
+    async def run_users(users, call):
+        samples = []
+        async def user_loop(user):
+            for i in range(args.requests):
+                started = time.perf_counter()
+                await call(user, i)
+                samples.append(time.perf_counter() - started)
+                if args.think:
+                    await asyncio.sleep(args.think / 1000)
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop(user) for user in range(users)))
+        return samples, time.perf_counter() - started
+    
+    async def run_threaded(users):
+        # Users wait on a fixed pool of handler threads, like TeleBot's workers
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            return await run_users(users, lambda user, i: loop.run_in_executor(executor, sync_request, user, i))
+    
+    async def run_async(users):
+        async_db = await AsyncDatabaseManager.create(args.pool_size)
+        try:
+            return await run_users(users, lambda user, i: async_request(async_db, user, i))
+        finally:
+            await async_db.close()
+    
+    print(f"{args.requests} requests per user, {args.think} ms think time, "
+          f"{args.workers} handler threads (sync), pool size {args.pool_size}")
+    for users in args.users:
+        print(f"\n{users} concurrent users")
+        for label, runner in (("threaded sync", run_threaded), ("asyncio", run_async)):
+            samples, elapsed = asyncio.run(runner(users))
+            report(label, samples)
+            print(f"  {'':<24} {len(samples) / elapsed:9.0f} requests/s")
+    sync_db.close()
+
+def bench_statements(args):
+    """Compare queries/s of the text protocol and cached prepared statements for the bot's hottest statements (needs MySQL)"""
+    from datetime import datetime, timedelta
+    from config import Config
+    from database import DatabaseManager
+    import queries
+    
+    Config.DB_POOL_SIZE = 1
+    Config.DB_STATEMENT_CACHE = 0
+    text_db = DatabaseManager()
+    product_ids = [row[0] for row in text_db.get_product_ids() or []]
+    if not product_ids:
+        raise SystemExit("No products found; load database_schema.sql into a local MySQL first")
+    categories = [row[0] for row in text_db.get_all_categories() or []] or ['Dairy & Eggs']
+    customer_ids = [row[0] for row in text_db.execute_query("SELECT telegram_id FROM customers LIMIT 100") or []] or [1]
+    order_ids = [row[0] for row in text_db.execute_query(
+        "SELECT order_id FROM orders ORDER BY order_date DESC LIMIT 100") or []] or ['NONE']
+    recent = datetime.now() - timedelta(seconds=20)
+    
+    # The statements the bot issues most, with parameters drawn like live traffic
+    hottest = [
+        ('product by id', queries.GET_PRODUCT_BY_ID, lambda i: (product_ids[i % len(product_ids)],)),
+        ('products by category', queries.GET_PRODUCTS_BY_CATEGORY, lambda i: (categories[i % len(categories)],)),
+        ('catalog delta', queries.GET_PRODUCTS_CHANGED_SINCE, lambda i: (recent,)),
+        ('catalog summary', queries.GET_CATALOG_SUMMARY, lambda i: None),
+        ('product ids', queries.GET_PRODUCT_IDS, lambda i: None),
+        ('categories', queries.GET_ALL_CATEGORIES, lambda i: None),
+        ('customer orders', queries.GET_CUSTOMER_ORDERS, lambda i: (customer_ids[i % len(customer_ids)], 10)),
+        ('order details', queries.GET_ORDER_DETAILS, lambda i: (order_ids[i % len(order_ids)],)),
+        ('popular products', queries.GET_POPULAR_PRODUCTS, lambda i: (30,)),
+        ('low stock', queries.GET_LOW_STOCK_PRODUCTS, lambda i: (10,)),
+    ]
+    
+    Config.DB_STATEMENT_CACHE = args.cache_size
+    prepared_db = DatabaseManager()
+    
+    def queries_per_second(db, statement, params):
+        for i in range(min(args.iterations, 50)):
+            db.execute_query(statement, params(i))
+        started = time.perf_counter()
+        for i in range(args.iterations):
+            db.execute_query(statement, params(i))
+        return args.iterations / (time.perf_counter() - started)
+    
+    print(f"\n{args.iterations:,} executions per statement on one connection; prepared cache of {args.cache_size}")
+    print(f"  {'statement':<22} {'text q/s':>10} {'prepared q/s':>13} {'change':>8}")
+    totals = [0.0, 0.0]
+    for label, statement, params in hottest:
+        text = queries_per_second(text_db, statement, params)
+        prepared = queries_per_second(prepared_db, statement, params)
+        totals[0] += 1 / text
+        totals[1] += 1 / prepared
+        print(f"  {label:<22} {text:10,.0f} {prepared:13,.0f} {(prepared / text - 1) * 100:+7.1f}%")
+    text, prepared = len(hottest) / totals[0], len(hottest) / totals[1]
+    print(f"  {'mix':<22} {text:10,.0f} {prepared:13,.0f} {(prepared / text - 1) * 100:+7.1f}%")
+    print(f"  pool: {prepared_db.get_pool_stats()}")
+    text_db.close()
+    prepared_db.close()
+
+def bench_send(args):
+    """Compare direct sends from handler threads with the rate-limited send queue, against a rate-limited fake Bot API"""
+    from concurrent.futures import ThreadPoolExecutor
+    import telebot
+    from telebot.apihelper import ApiTelegramException
+    from outbox import SendQueue, PRIORITY_HIGH, PRIORITY_LOW
+    
+    rng = random.Random(3)
+    # Bursts per chat, like a listing followed by a menu; one in ten is an order confirmation
+    messages = [(rng.randrange(args.chats), PRIORITY_HIGH if rng.random() < 0.1 else PRIORITY_LOW)
+                for _ in range(args.messages)]
+    
+    def run(label, handle):
+        fake = FakeBotAPI(global_rate=args.global_rate, chat_rate=args.chat_rate,
+                          retry_after=args.retry_after).start()
+        telebot.apihelper.API_URL = fake.url
+        bot = telebot.TeleBot('123456:BENCH')
+        if hasattr(handle, 'start'):
+            handle.start(bot)
+        handler_times = []
+        latencies = {PRIORITY_HIGH: [], PRIORITY_LOW: []}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as handlers:
+            for chat_id, priority in messages:
+                # Latency counts from the update's arrival, including the wait for a handler thread
+                handlers.submit(handle, bot, chat_id, priority, time.perf_counter(), handler_times, latencies)
+        result = handle.finish() if hasattr(handle, 'finish') else None
+        fake.wait_for_sent(len(messages), timeout=300)
+        elapsed = time.perf_counter() - started
+        fake.stop()
+        
+        print(f"\n{label}: {len(fake.sent)}/{len(messages)} delivered in {elapsed:.1f} s, "
+              f"{fake.rate_limited} answered 429")
+        report("handler time", handler_times)
+        report("confirmation latency", latencies[PRIORITY_HIGH])
+        report("listing latency", latencies[PRIORITY_LOW])
+        return result
+    
+    def direct(bot, chat_id, priority, arrived, handler_times, latencies):
+        # The old path: the handler thread sends and sleeps out any 429
+        started = time.perf_counter()
+        while True:
+            try:
+                bot.send_message(chat_id + 1, "x")
+                break
+            except ApiTelegramException as e:
+                if e.error_code != 429:
+                    raise
+                time.sleep(e.result_json['parameters']['retry_after'])
+        handler_times.append(time.perf_counter() - started)
+        latencies[priority].append(time.perf_counter() - arrived)
+    
+    class Queued:
+        def start(self, bot):
+            # Stay under the fake's windows: a bucket can spend its burst and its rate in one second
+            self.send_queue = SendQueue(bot, global_rate=args.global_rate * 0.9, chat_rate=args.chat_rate * 0.9,
+                                        chat_burst=1, workers=args.send_workers)
+        
+        def __call__(self, bot, chat_id, priority, arrived, handler_times, latencies):
+            started = time.perf_counter()
+            future = self.send_queue.send_message(chat_id + 1, "x", priority)
+            handler_times.append(time.perf_counter() - started)
+            future.add_done_callback(lambda _: latencies[priority].append(time.perf_counter() - arrived))
+        
+        def finish(self):
+            self.send_queue.close(timeout=300)
+            return self.send_queue.stats()
+    
+    print(f"{args.messages} messages to {args.chats} chats, fake API limits {args.global_rate}/s overall "
+          f"and {args.chat_rate}/s per chat, {args.workers} handler threads")
+    run("direct", direct)
+    print(f"  send queue stats: {run('send queue', Queued())}")
+
+class _SyntheticCatalogSource:
+    """Serves synthetic product rows through the DatabaseManager methods the catalog replica syncs from"""
+    
+    def __init__(self, rows):
+        from datetime import datetime
+        self.updated_at = datetime.now()
+        self.rows = [row + (self.updated_at,) for row in rows]
+    
+    def get_products_changed_since(self, since=None):
+        return self.rows
+    
+    def get_catalog_summary(self):
+        return [(len(self.rows), self.updated_at)]
+    
+    def get_product_ids(self):
+        return [(row[0],) for row in self.rows]
+
+def bench_listings(args):
+    """Compare paging through a large category with cached pages against rendering the whole listing per tap"""
+    import telebot
+    from catalog import CatalogReplica
+    from listings import ListingCache, CATEGORY
+    from views import category_entry, add_to_cart_button
+    
+    category = CATEGORIES[0]
+    rows = [row[:2] + (category,) + row[3:4] + (max(row[4], 1),) + row[5:]
+            for row in synthetic_products(args.products)]
+    catalog = CatalogReplica(db=_SyntheticCatalogSource(rows), max_staleness=float('inf'))
+    catalog.sync()
+    cache = ListingCache(catalog, page_size=args.page_size)
+    
+    def whole_listing(_):
+        # The old handler: one message and one button per product, rebuilt on every tap
+        products = catalog.get_products_by_category(category)
+        response = f"🏷️ **{category}** Products:\n\n" + "".join(category_entry(product) for product in products)
+        markup = telebot.types.InlineKeyboardMarkup()
+        for product in products:
+            markup.add(add_to_cart_button(product[0], product[1]))
+        return response, markup.to_json()
+    
+    page_count = cache.page(CATEGORY, category)[2]
+    pages = list(range(page_count))
+    print(f"\n{args.products:,} products in one category, {args.page_size} per page ({page_count} pages)")
+    report("whole listing per tap", timed(whole_listing, pages[:args.taps]))
+    report("page, first visit", timed(lambda page: cache.page(CATEGORY, category, page), pages[1:]))
+    report("page, revisited", timed(lambda page: cache.page(CATEGORY, category, page), pages))
+    print(f"  whole listing length     {len(whole_listing(0)[0]):,} characters")
+    print(f"  cache stats              {cache.stats()}")
+
+def bench_keyboards(args):
+    """Compare building reply keyboards per message with the prebuilt keyboard registry"""
+    import telebot
+    from catalog import CatalogReplica
+    from keyboards import KeyboardRegistry
+    import menus
+    
+    catalog = CatalogReplica(db=_SyntheticCatalogSource(list(synthetic_products(1000))), max_staleness=float('inf'))
+    catalog.sync()
+    registry = KeyboardRegistry(catalog)
+    
+    def main_menu_per_message(_):
+        # The old create_main_menu_keyboard(), serialized when the reply is sent
+        markup = telebot.types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
+        markup.add("🛒 Browse Products", "🛍️ View Cart")
+        markup.add("📦 Order Type", "📋 My Orders")
+        markup.add("ℹ️ Help", "📞 Contact")
+        return markup.to_json()
+    
+    def categories_per_message(_):
+        markup = telebot.types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
+        for category in catalog.get_all_categories():
+            markup.add(f"📂 {category[0]}")
+        markup.add("🔍 Search Products", "⭐ Popular Items")
+        markup.add("🔙 Back to Main Menu")
+        return markup.to_json()
+    
+    messages = range(args.iterations)
+    print(f"\n{args.iterations:,} messages each ({len(catalog.get_all_categories())} categories in memory; "
+          f"the old category keyboard also ran a query per message)")
+    report("main menu, per message", timed(main_menu_per_message, messages))
+    report("main menu, registry", timed(lambda _: registry.get(menus.MAIN), messages))
+    report("categories, per message", timed(categories_per_message, messages))
+    report("categories, registry", timed(lambda _: registry.categories(), messages))
+    print(f"  category keyboard builds {registry.category_builds}")
+
+class _SyntheticOrderSource:
+    """Generates order and order item rows on demand through Storage.iter_orders and iter_order_items"""
+    
+    def __init__(self, orders, items_per_order=3, seed=42):
+        self.orders = orders
+        self.items_per_order = items_per_order
+        self.seed = seed
+    
+    def iter_orders(self, start, end, batch_size=None):
+        return self._rows(False, batch_size)
+    
+    def iter_order_items(self, start, end, batch_size=None):
+        return self._rows(True, batch_size)
+    
+    def _rows(self, with_items, batch_size):
+        from datetime import datetime, timedelta
+        from decimal import Decimal
+        batch_size = batch_size or 1000
+        rng = random.Random(self.seed)
+        start = datetime(2024, 1, 1)
+        batch = []
+        for n in range(self.orders):
+            order_id = f"{n:012d}"
+            order_date = start + timedelta(seconds=n * 7)
+            if with_items:
+                for product_id in rng.sample(range(1, 5000), self.items_per_order):
+                    price = Decimal(rng.randint(99, 2999)) / 100
+                    batch.append((order_id, product_id, 2, price, price * 2, order_date))
+            else:
+                subtotal = Decimal(rng.randint(1000, 20000)) / 100
+                batch.append((order_id, 100000 + n % 50000, subtotal, Decimal('5.00'), subtotal + 5, 'delivery',
+                              '1 Main Street', '+15550100', 'delivered', order_date, None))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def bench_export(args):
+    """Export synthetic orders through the streaming exporter and track peak memory as the export grows"""
+    import os
+    import resource
+    import tempfile
+    import exports
+    
+    def peak_mb():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    
+    print(f"\nbaseline peak RSS {peak_mb():.0f} MB, batches of {args.batch_size} rows")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.orders:
+            for suffix in args.formats:
+                orders_path = os.path.join(directory, f"orders.{suffix}")
+                items_path = os.path.join(directory, f"order_items.{suffix}")
+                started = time.perf_counter()
+                orders, items = exports.export_orders(_SyntheticOrderSource(count), None, None, orders_path,
+                                                      items_path, batch_size=args.batch_size)
+                elapsed = time.perf_counter() - started
+                size = (os.path.getsize(orders_path) + os.path.getsize(items_path)) / 2 ** 20
+                print(f"  {count:>10,} orders  {suffix:<9} {orders + items:>11,} rows  {elapsed:7.1f}s  "
+                      f"{(orders + items) / elapsed:>9,.0f} rows/s  {size:8.1f} MB written  "
+                      f"peak RSS {peak_mb():.0f} MB")
+                os.remove(orders_path)
+                os.remove(items_path)
+
+def bench_import(args):
+    """Time importing a synthetic catalog with malformed lines into SQLite, per file format"""
+    import os
+    import tempfile
+    import catalog_io
+    from config import Config
+    from sqlite_database import SQLiteDatabaseManager
+    
+    def write_catalog(path, fmt, count):
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            if fmt == 'csv':
+                stream.write(','.join(catalog_io.PRODUCT_FIELDS) + '\n')
+            for row in synthetic_products(count):
+                product_id, name, category, price, stock, description, _ = row
+                if args.bad_every and product_id % args.bad_every == 0:
+                    # Broken JSON, or a CSV row whose price is not a number
+                    stream.write('{"sku": "BAD", "name": \n' if fmt == 'jsonl'
+                                 else f",BAD{product_id},x,Bakery,abc,1,,\n")
+                    continue
+                record = {'id': None, 'sku': f"SKU{product_id:08d}", 'name': name, 'category': category,
+                          'price': price, 'stock': stock, 'description': description, 'image_url': None}
+                if fmt == 'jsonl':
+                    stream.write(json.dumps(record) + '\n')
+                else:
+                    stream.write(','.join(f'"{record[field]}"' if record[field] is not None else ''
+                                          for field in catalog_io.PRODUCT_FIELDS) + '\n')
+    
+    print(f"\n{args.rows:,} rows per file, every {args.bad_every}th malformed, chunks of {args.chunk_size}")
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in ('csv', 'jsonl'):
+            Config.SQLITE_PATH = os.path.join(directory, f"import_{fmt}.db")
+            db = SQLiteDatabaseManager()
+            path = os.path.join(directory, f"catalog.{fmt}")
+            write_catalog(path, fmt, args.rows)
+            
+            # The same loop as admin.py import-products
+            errors = []
+            inserted = 0
+            started = time.perf_counter()
+            with open(path, newline='', encoding='utf-8') as stream:
+                for chunk in catalog_io.chunked(catalog_io.read_products(stream, fmt, errors), args.chunk_size):
+                    inserted += db.upsert_products(chunk)[0]
+            elapsed = time.perf_counter() - started
+            
+            print(f"  {fmt:<6} {inserted:>9,} imported  {len(errors):>6,} reported  {elapsed:6.2f}s  "
+                  f"{args.rows / elapsed:>9,.0f} rows/s")
+            db.close()
+
+class _RecordingBot:
+    """Stands in for TeleBot in the load benchmark: every Bot API call is counted and answered at once"""
+    
+    def __init__(self):
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._message_id = 0
+    
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            from types import SimpleNamespace
+            with self._lock:
+                self.calls[method] = self.calls.get(method, 0) + 1
+                self._message_id += 1
+                return SimpleNamespace(message_id=self._message_id)
+        return call
+
+class _MemoryStore:
+    """In-process stand-in for the DatabaseManager methods the bot's handlers and catalog call"""
+    
+    NONE_RESULTS = frozenset({'close'})
+    UNTIMED = frozenset()
+    
+    def __init__(self, products, latency=0.0):
+        from datetime import datetime
+        self.latency = latency
+        self._lock = threading.Lock()
+        now = datetime.now()
+        self.products = {row[0]: list(row[:4]) + [10 ** 9] + list(row[5:]) + [now] for row in products}
+        self.customers = {}
+        self.orders = {}
+        self.order_count = 0
+        self._order_listeners = []
+    
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def get_products_changed_since(self, since=None):
+        self._round_trip()
+        with self._lock:
+            return [tuple(row) for row in self.products.values() if since is None or row[7] >= since]
+    
+    def get_catalog_summary(self):
+        with self._lock:
+            return [(len(self.products), max(row[7] for row in self.products.values()))]
+    
+    def get_product_ids(self):
+        with self._lock:
+            return [(product_id,) for product_id in self.products]
+    
+    def register_customer(self, telegram_id, first_name, last_name, username):
+        self._round_trip()
+        with self._lock:
+            self.customers[telegram_id] = (first_name, last_name, username)
+        return 1
+    
+    def place_order(self, order_data, cart_items):
+        from datetime import datetime
+        self._round_trip()
+        with self._lock:
+            short = [(product_id, item.quantity, self.products[product_id][4])
+                     for product_id, item in cart_items.items() if self.products[product_id][4] < item.quantity]
+            if short:
+                return False, short
+            now = datetime.now()
+            for product_id, item in cart_items.items():
+                self.products[product_id][4] -= item.quantity
+                self.products[product_id][7] = now
+            self.order_count += 1
+            self.orders.setdefault(order_data[1], []).append(
+                (order_data[0], order_data[5], order_data[9], order_data[10].replace(microsecond=0),
+                 order_data[6], order_data[7], self.order_count))
+        for callback in self._order_listeners:
+            callback(order_data[1])
+        return True, []
+    
+    def add_order_listener(self, callback):
+        self._order_listeners.append(callback)
+    
+    def get_customer_orders(self, telegram_id, limit=10, before=None):
+        self._round_trip()
+        with self._lock:
+            orders = self.orders.get(telegram_id, [])
+            if before is not None:
+                orders = [order for order in orders if (order[3], order[6]) < before]
+            return list(reversed(orders[-limit:]))
+    
+    def get_popular_products(self, limit=10, days=None):
+        self._round_trip()
+        return []
+    
+    def get_latest_order_id(self, ceiling):
+        return None
+    
+    def get_pool_stats(self):
+        return {}
+    
+    def close(self):
+        pass
+
+def shopper_script(user_id, category, product_ids, rng):
+    """One shopper's visit as ('message', text) and ('callback', data) steps, in order"""
+    steps = [('message', "/start"), ('message', "🛒 Browse Products"), ('message', f"📂 {category}")]
+    steps += [('callback', f"add_to_cart_{product_id}") for product_id in rng.sample(product_ids, 3)]
+    steps += [('message', "🛍️ View Cart"), ('message', "📦 Order Type"), ('message', "🚚 Home Delivery"),
+              ('message', "🛒 Checkout"), ('message', f"{user_id} Benchmark Street"),
+              ('message', f"+1555{user_id % 10 ** 7:07d}"), ('message', "📋 My Orders")]
+    return steps
+
+def bench_load(args):
+    """Drive shopper sessions through Bot.py's real handlers and report throughput and per-handler latency as JSON"""
+    import asyncio
+    import os
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    
+    os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+    os.environ.setdefault('SESSION_BACKEND', 'memory')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import telebot
+    import database
+    if not args.mysql:
+        database._db_instance = _MemoryStore(synthetic_products(args.products), args.db_latency / 1000)
+    import Bot
+    from outbox import SendQueue
+    
+    # Replies are recorded instead of sent; the send queue keeps its real code path without rate limits
+    recorder = _RecordingBot()
+    Bot.send_queue.close(timeout=0)
+    Bot.send_queue = SendQueue(recorder, global_rate=1e9, chat_rate=1e9, chat_burst=10 ** 9,
+                               max_pending=10 ** 9)
+    Bot.bot = recorder
+    
+    Bot.catalog.sync()
+    categories = [category for (category,) in Bot.catalog.get_all_categories()]
+    if not categories:
+        raise SystemExit("The catalog is empty; load database_schema.sql first")
+    by_category = {category: [row[0] for row in Bot.catalog.get_products_by_category(category)]
+                   for category in categories}
+    categories = [category for category in categories if len(by_category[category]) >= 3]
+    
+    def to_message(update_id, user_id, text):
+        return telebot.types.Update.de_json(synthetic_update(update_id, user_id, text)).message
+    
+    def to_callback(update_id, user_id, data):
+        user = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+        return telebot.types.CallbackQuery.de_json({
+            'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': data,
+            'message': {'message_id': update_id, 'date': int(time.time()), 'text': "listing",
+                        'chat': {'id': user_id, 'type': 'private'}},
+        })
+    
+    def handle(kind, payload):
+        """Run one update on a handler thread; returns (route, error)"""
+        if kind == 'callback':
+            route = "callback:add_to_cart_callback"
+            handler = Bot.add_to_cart_callback
+        else:
+            route, handler = Bot.router.resolve(payload)
+        try:
+            handler(payload)
+            return route, False
+        except Exception:
+            return route, True
+    
+    def run(users, first_user):
+        latencies = {}
+        errors = {}
+        update_ids = iter(range(1, 10 ** 12))
+        
+        async def shopper(executor, user_id):
+            rng = random.Random(user_id)
+            loop = asyncio.get_running_loop()
+            for visit in range(args.visits):
+                category = rng.choice(categories)
+                for kind, value in shopper_script(user_id, category, by_category[category], rng):
+                    if args.think:
+                        await asyncio.sleep(rng.expovariate(1000 / args.think))
+                    update_id = next(update_ids)
+                    payload = (to_callback if kind == 'callback' else to_message)(update_id, user_id, value)
+                    started = time.perf_counter()
+                    route, failed = await loop.run_in_executor(executor, handle, kind, payload)
+                    latencies.setdefault(route, []).append(time.perf_counter() - started)
+                    errors[route] = errors.get(route, 0) + failed
+        
+        async def main():
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                started = time.perf_counter()
+                await asyncio.gather(*(shopper(executor, first_user + user) for user in range(users)))
+                return time.perf_counter() - started
+        
+        orders_before = getattr(database.get_db(), 'order_count', None)
+        elapsed = asyncio.run(main())
+        count = sum(len(samples) for samples in latencies.values())
+        def ms(samples, pct):
+            return round(percentile(samples, pct) * 1000, 3)
+        result = {
+            'users': users,
+            'messages': count,
+            'elapsed_s': round(elapsed, 3),
+            'messages_per_s': round(count / elapsed, 1),
+            'p50_ms': ms([sample for samples in latencies.values() for sample in samples], 50),
+            'p95_ms': ms([sample for samples in latencies.values() for sample in samples], 95),
+            'p99_ms': ms([sample for samples in latencies.values() for sample in samples], 99),
+            'handlers': {
+                route: {'count': len(samples), 'errors': errors[route], 'p50_ms': ms(samples, 50),
+                        'p95_ms': ms(samples, 95), 'p99_ms': ms(samples, 99)}
+                for route, samples in sorted(latencies.items())
+            },
+        }
+        if orders_before is not None:
+            result['orders'] = database.get_db().order_count - orders_before
+        return result
+    
+    report_json = {
+        'benchmark': 'load',
+        'database': 'mysql' if args.mysql else 'memory',
+        'workers': args.workers,
+        'think_ms': args.think,
+        'visits_per_user': args.visits,
+        'db_latency_ms': 0 if args.mysql else args.db_latency,
+        'runs': [],
+    }
+    first_user = 10 ** 9
+    for users in args.users:
+        result = run(users, first_user)
+        first_user += users
+        report_json['runs'].append(result)
+        print(f"{users:>6} users  {result['messages']:>8,} messages  {result['messages_per_s']:>9,.1f} msg/s  "
+              f"p50 {result['p50_ms']:8.3f} ms  p95 {result['p95_ms']:8.3f} ms  p99 {result['p99_ms']:8.3f} ms",
+              file=sys.stderr)
+    Bot.send_queue.close()
+    report_json['outbound_calls'] = dict(sorted(recorder.calls.items()))
+    
+    output = json.dumps(report_json, indent=2, sort_keys=True)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+def _shard_worker_setup(products):
+    """Worker setup for the shards benchmark: the in-memory store and recorded Bot API calls"""
+    import database
+    database._db_instance = _MemoryStore(synthetic_products(products))
+    _record_bot_calls()
+
+def _record_bot_calls():
+    """Record a supervisor worker's Bot API calls instead of sending them"""
+    import Bot
+    from outbox import SendQueue
+    
+    recorder = _RecordingBot()
+    Bot.send_queue.close(timeout=0)
+    Bot.send_queue = SendQueue(recorder, global_rate=1e9, chat_rate=1e9, chat_burst=10 ** 9,
+                               max_pending=10 ** 9)
+    # The worker dispatches through the real TeleBot; only its direct API calls are recorded
+    for method in ('answer_callback_query', 'edit_message_text'):
+        setattr(Bot.bot, method, getattr(recorder, method))
+    Bot.catalog.sync()
+
+def synthetic_callback(update_id, user_id, data):
+    """Build a Telegram Update dict for an inline button press"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': data,
+            'message': {'message_id': update_id, 'date': int(time.time()), 'text': "listing",
+                        'chat': {'id': user_id, 'type': 'private'}},
+        },
+    }
+
+def interleave(scripts):
+    """Turn (user_id, steps) scripts into updates, one step of each user in turn, as concurrent shoppers arrive"""
+    updates = []
+    for position in range(max(len(steps) for _, steps in scripts)):
+        for user_id, steps in scripts:
+            if position < len(steps):
+                kind, value = steps[position]
+                build = synthetic_callback if kind == 'callback' else synthetic_update
+                updates.append(build(len(updates) + 1, user_id, value))
+    return updates
+
+def bench_shards(args):
+    """Feed shopper sessions through supervisor.py to 1..N worker processes and report updates per second"""
+    import os
+    from functools import partial
+    
+    os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+    os.environ.setdefault('SESSION_BACKEND', 'memory')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from supervisor import Supervisor
+    
+    products = list(synthetic_products(args.products))
+    by_category = {}
+    for row in products:
+        by_category.setdefault(row[2], []).append(row[0])
+    categories = sorted(category for category, ids in by_category.items() if len(ids) >= 3)
+    
+    scripts = []
+    for user in range(args.users):
+        user_id = 10 ** 9 + user
+        rng = random.Random(user_id)
+        steps = []
+        for visit in range(args.visits):
+            category = rng.choice(categories)
+            steps += shopper_script(user_id, category, by_category[category], rng)
+        scripts.append((user_id, steps))
+    updates = interleave(scripts)
+    
+    print(f"{len(updates):,} updates from {args.users} users; {os.cpu_count()} CPUs")
+    baseline = None
+    for workers in args.workers:
+        supervisor = Supervisor(workers, setup=partial(_shard_worker_setup, args.products),
+                                queue_size=len(updates) + 1).start()
+        try:
+            if not supervisor.wait_ready(120):
+                raise SystemExit(f"Workers did not start: {supervisor.stats()}")
+            started = time.perf_counter()
+            for update in updates:
+                supervisor.dispatch(update)
+            while supervisor.processed() < len(updates):
+                time.sleep(0.005)
+            elapsed = time.perf_counter() - started
+        finally:
+            supervisor.stop()
+        rate = len(updates) / elapsed
+        baseline = baseline or rate
+        print(f"  {workers:>3} workers  {elapsed:7.2f}s  {rate:>10,.0f} updates/s  {rate / baseline:5.2f}x")
+
+class _StockSimulation:
+    """MySQL stock with place_order's guarded decrement, and a lagging catalog replica of it"""
+    
+    def __init__(self, products, stock):
+        self.lock = threading.Lock()
+        self.stock = {product_id: stock for product_id in range(1, products + 1)}
+        self.replica = dict(self.stock)
+        self.sync_started = 0.0
+        self.listeners = []
+        self.orders = 0
+        self.short_orders = 0
+        self.units_sold = 0
+    
+    # Catalog replica interface used by ReservationEngine
+    def get_all_products(self):
+        return [(product_id, '', '', 1.0, stock, '', None) for product_id, stock in self.replica.items()]
+    
+    def get_product_by_id(self, product_id):
+        stock = self.replica.get(product_id)
+        return None if stock is None else (product_id, '', '', 1.0, stock, '')
+    
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+    
+    def place_order(self, cart):
+        with self.lock:
+            if any(self.stock[product_id] < quantity for product_id, quantity in cart.items()):
+                self.short_orders += 1
+                return False
+            for product_id, quantity in cart.items():
+                self.stock[product_id] -= quantity
+                self.units_sold += quantity
+            self.orders += 1
+            return True
+    
+    def sync(self, rng, query_seconds, restock):
+        """One catalog sync: read MySQL, take a while, then deliver changed rows"""
+        self.sync_started = time.monotonic()
+        with self.lock:
+            for product_id, stock in self.stock.items():
+                if stock == 0 and rng.random() < 0.2:
+                    self.stock[product_id] = restock
+            snapshot = dict(self.stock)
+        time.sleep(query_seconds)
+        changed = [(product_id, '', '', 1.0, stock, '', None) for product_id, stock in snapshot.items()
+                   if self.replica.get(product_id) != stock]
+        self.replica.update(snapshot)
+        if changed:
+            for callback in self.listeners:
+                callback(changed, [])
+
+def _reservation_worker_setup(placed, refused):
+    """Worker setup for the supervised reservations run: count orders the shared database placed and refused"""
+    _record_bot_calls()
+    import Bot
+    place_order = Bot.db.place_order
+    
+    def counted(order_data, cart_items):
+        result = place_order(order_data, cart_items)
+        counter = placed if result[0] else refused
+        with counter.get_lock():
+            counter.value += 1
+        return result
+    Bot.db.place_order = counted
+
+def bench_reservations(args):
+    """Stress add-to-cart and checkout from many threads and count checkouts MySQL had to refuse"""
+    from types import SimpleNamespace
+    from reservations import ReservationEngine
+    
+    def run(reserved):
+        simulation = _StockSimulation(args.products, args.stock)
+        engine = ReservationEngine(simulation, ttl=args.ttl) if reserved else None
+        stop = threading.Event()
+        operations = [0] * args.threads
+        refused_adds = [0] * args.threads
+        
+        def syncer():
+            rng = random.Random(0)
+            while not stop.is_set():
+                simulation.sync(rng, args.sync_ms / 2000, args.stock)
+                stop.wait(args.sync_ms / 2000)
+        
+        def shopper(index):
+            rng = random.Random(index + 1)
+            # Each thread owns its users, as a session is only touched by its own updates
+            carts = {user_id: {} for user_id in range(index * args.users, (index + 1) * args.users)}
+            while not stop.is_set():
+                user_id = rng.randrange(index * args.users, (index + 1) * args.users)
+                cart = carts[user_id]
+                roll = rng.random()
+                if roll < 0.75:
+                    product_id = rng.randint(1, args.products)
+                    quantity = cart.get(product_id, 0) + 1
+                    if engine is not None:
+                        held, available = engine.hold(user_id, product_id, quantity)
+                    else:
+                        # The old check: this cart against the catalog's stock, ignoring other carts
+                        product = simulation.get_product_by_id(product_id)
+                        held = product is not None and quantity <= product[4]
+                    if held:
+                        cart[product_id] = quantity
+                    else:
+                        refused_adds[index] += 1
+                elif roll < 0.95 and cart:
+                    lines = {product_id: SimpleNamespace(quantity=quantity) for product_id, quantity in cart.items()}
+                    if engine is None or not engine.hold_cart(user_id, lines):
+                        if simulation.place_order(cart) and engine is not None:
+                            engine.confirm(user_id)
+                    cart.clear()
+                    if engine is not None:
+                        engine.release(user_id)
+                else:
+                    cart.clear()
+                    if engine is not None:
+                        engine.release(user_id)
+                operations[index] += 1
+        
+        threads = [threading.Thread(target=shopper, args=(index,)) for index in range(args.threads)]
+        sync_thread = threading.Thread(target=syncer)
+        started = time.perf_counter()
+        sync_thread.start()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        sync_thread.join()
+        elapsed = time.perf_counter() - started
+        
+        negative = sum(1 for stock in simulation.stock.values() if stock < 0)
+        label = "reservations" if reserved else "catalog check"
+        print(f"  {label:14} {sum(operations) / elapsed:>10,.0f} ops/s  {simulation.orders:>7,} orders  "
+              f"{simulation.units_sold:>8,} units  {simulation.short_orders:>6,} refused by MySQL  "
+              f"{sum(refused_adds):>8,} adds refused  {negative} negative stock")
+    
+    def run_supervised(workers, scripts):
+        """The same shoppers as Telegram updates through supervisor.py, every worker ordering from one SQLite file"""
+        import multiprocessing
+        import os
+        import tempfile
+        from decimal import Decimal
+        from functools import partial
+        from sqlite_database import SQLiteDatabaseManager
+        from supervisor import Supervisor
+        
+        path = os.path.join(tempfile.mkdtemp(), 'reservations.db')
+        db = SQLiteDatabaseManager(path)
+        # Only the synthetic products, so the shoppers' product IDs are 1..products
+        for (product_id,) in db.get_product_ids():
+            db.delete_product(product_id)
+        db.upsert_products([
+            {'id': row[0], 'sku': f"BENCH-{row[0]}", 'name': row[1], 'category': row[2],
+             'price': Decimal(str(row[3])), 'stock': args.stock, 'description': row[5], 'image_url': row[6]}
+            for row in synthetic_products(args.products)])
+        # Workers are spawned, so they read their settings from the environment
+        os.environ.update({'DB_BACKEND': 'sqlite', 'SQLITE_PATH': path, 'MIN_ORDER_AMOUNT': '0'})
+        
+        context = multiprocessing.get_context('spawn')
+        placed, refused = context.Value('q', 0), context.Value('q', 0)
+        updates = interleave(scripts)
+        supervisor = Supervisor(workers, setup=partial(_reservation_worker_setup, placed, refused),
+                                queue_size=len(updates) + 1).start()
+        try:
+            if not supervisor.wait_ready(120):
+                raise SystemExit(f"Workers did not start: {supervisor.stats()}")
+            started = time.perf_counter()
+            for update in updates:
+                supervisor.dispatch(update)
+            while supervisor.processed() < len(updates):
+                time.sleep(0.005)
+            elapsed = time.perf_counter() - started
+        finally:
+            supervisor.stop()
+        
+        stock = [db.get_product_by_id(product_id)[4] for (product_id,) in db.get_product_ids()]
+        db.close()
+        negative = sum(1 for units in stock if units < 0)
+        print(f"  {workers:>3} workers    {len(updates) / elapsed:>10,.0f} updates/s  {placed.value:>7,} orders  "
+              f"{args.products * args.stock - sum(stock):>8,} units  {refused.value:>6,} refused by SQLite  "
+              f"{negative} negative stock")
+    
+    print(f"\n{args.threads} threads x {args.users} users, {args.products} products x {args.stock} units, "
+          f"catalog sync every {args.sync_ms:g} ms, {args.seconds:g}s per run")
+    run(False)
+    run(True)
+    
+    if args.workers:
+        import os
+        os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+        os.environ.setdefault('SESSION_BACKEND', 'memory')
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        # Holds are per worker: users on different workers can hold the same last units,
+        # so checkouts refused by the database measure what the per-worker engines miss
+        scripts = []
+        for user in range(args.threads * args.users):
+            user_id = 10 ** 9 + user
+            rng = random.Random(user_id)
+            steps = [('message', "/start")]
+            steps += [('callback', f"add_to_cart_{rng.randint(1, args.products)}") for _ in range(rng.randint(1, 3))]
+            steps += [('message', "📦 Order Type"), ('message', "🏪 Take Away"), ('message', "🛒 Checkout"),
+                      ('message', f"+1555{user_id % 10 ** 7:07d}")]
+            scripts.append((user_id, steps))
+        print(f"\n{len(scripts)} shoppers through supervisor.py, {args.products} products x {args.stock} units in SQLite")
+        for workers in args.workers:
+            run_supervised(workers, scripts)
+
+def bench_order_ids(args):
+    """Measure order ID allocation rate for one thread and for several workers' threads"""
+    import math
+    import uuid
+    from order_ids import OrderIdAllocator
+    
+    allocator = OrderIdAllocator(worker_id=0)
+    started = time.perf_counter()
+    ids = [allocator.next_id() for _ in range(args.count)]
+    elapsed = time.perf_counter() - started
+    print(f"\n  1 thread        {args.count / elapsed:>12,.0f} IDs/s  "
+          f"borrowed ms: {allocator.stats()['borrowed_ms']}  e.g. {ids[-1]}")
+    started = time.perf_counter()
+    for _ in range(args.count):
+        str(uuid.uuid4())[:8].upper()
+    print(f"  uuid4 prefix    {args.count / (time.perf_counter() - started):>12,.0f} IDs/s (previous scheme)")
+    
+    # Several workers, as separate bot processes would be, each shared by handler threads
+    allocators = [OrderIdAllocator(worker_id=worker) for worker in range(args.workers)]
+    results = [[] for _ in range(args.workers * args.threads)]
+    
+    def allocate(index):
+        next_id = allocators[index % args.workers].next_id
+        results[index] = [next_id() for _ in range(args.count // args.threads)]
+    
+    threads = [threading.Thread(target=allocate, args=(index,)) for index in range(len(results))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = sum(len(batch) for batch in results)
+    print(f"  {args.workers} workers x {args.threads} threads {total / elapsed:>9,.0f} IDs/s")
+    
+    def collision_odds(orders):
+        # Birthday bound for the old 32-bit random IDs
+        return 1 - math.exp(-orders * (orders - 1) / (2 * 2 ** 32))
+    
+    for per_day in (1000, 10000, 100000):
+        print(f"  uuid4[:8] at {per_day:>7,} orders/day: {collision_odds(per_day):7.2%} odds of a collision in a day, "
+              f"{collision_odds(per_day * 365):7.2%} in a year")
+
+def bench_metrics(args):
+    """Measure the per-event cost of handler and database call instrumentation"""
+    from types import SimpleNamespace
+    from metrics import MetricsRegistry, instrument, HANDLER_SECONDS, DB_CALL_SECONDS
+    from router import Router
+    
+    class Manager:
+        def get_product_by_id(self, product_id):
+            return (product_id,)
+    
+    def handler(message):
+        return None
+    
+    registry = MetricsRegistry()
+    bare_router = Router(lambda user_id: None)
+    timed_router = Router(lambda user_id: None, metrics=registry)
+    for router in (bare_router, timed_router):
+        router.text("🛍️ View Cart")(handler)
+        router.fallback(handler)
+    bare_manager = Manager()
+    timed_manager = Manager()
+    instrument(timed_manager, registry.histogram(*DB_CALL_SECONDS))
+    histogram = registry.histogram(*HANDLER_SECONDS)
+    message = SimpleNamespace(text="🛍️ View Cart", from_user=SimpleNamespace(id=1))
+    
+    def per_call(func, arg):
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            func(arg)
+        return (time.perf_counter() - started) / args.iterations * 1e9
+    
+    print(f"\n{args.iterations:,} events each")
+    bare = per_call(bare_router.dispatch, message)
+    timed = per_call(timed_router.dispatch, message)
+    print(f"  router dispatch          {bare:7.0f} ns bare | {timed:7.0f} ns timed | {timed - bare:5.0f} ns overhead")
+    bare = per_call(bare_manager.get_product_by_id, 1)
+    timed = per_call(timed_manager.get_product_by_id, 1)
+    print(f"  database method          {bare:7.0f} ns bare | {timed:7.0f} ns timed | {timed - bare:5.0f} ns overhead")
+    print(f"  histogram observe        {per_call(lambda seconds: histogram.observe('route', seconds), 0.003):7.0f} ns")
+    started = time.perf_counter()
+    body = registry.render()
+    print(f"  render                   {(time.perf_counter() - started) * 1000:7.3f} ms for {len(body):,} bytes")
+
+def bench_storage(args):
+    """Compare per-request latency of the storage backends (MySQL optional)"""
+    import os
+    import tempfile
+    from datetime import datetime
+    from decimal import Decimal
+    from config import Config
+    from sessions import CartItem
+    
+    def open_backend(name):
+        if name == 'mysql':
+            from database import DatabaseManager
+            db = DatabaseManager()
+            if not db.is_connected():
+                print("  MySQL unreachable; skipped")
+                return None
+            return db
+        from sqlite_database import SQLiteDatabaseManager
+        Config.SQLITE_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        db = SQLiteDatabaseManager()
+        db.upsert_products([
+            {'id': None, 'sku': f"BENCH-{row[0]}", 'name': row[1], 'category': row[2], 'price': Decimal(str(row[3])),
+             'stock': 1_000_000, 'description': row[5], 'image_url': row[6]}
+            for row in synthetic_products(args.products)])
+        return db
+    
+    def new_order(db, customer_id, product):
+        order_id = f"BENCH-{random.getrandbits(48):012x}"
+        cart = {product[0]: CartItem(product[1], product[3], 1)}
+        subtotal = product[3]
+        order_data = (order_id, customer_id, json.dumps({}), subtotal, Decimal('5.00'), subtotal + Decimal('5.00'),
+                      'delivery', 'Benchmark address', '555-0100', 'pending', datetime.now())
+        return order_id, db.place_order(order_data, cart)
+    
+    customer_base = 900_000_000
+    print(f"{args.requests} requests per type, {args.products:,} synthetic products (SQLite)")
+    for name in args.backends:
+        print(f"\n{name}")
+        db = open_backend(name)
+        if db is None:
+            continue
+        products = [db.get_product_by_id(product_id) for product_id in
+                    [row[0] for row in db.get_product_ids() or []][:100]]
+        products = [product for product in products if product is not None]
+        customer_ids = [customer_base + i for i in range(10)]
+        for customer_id in customer_ids:
+            db.register_customer(customer_id, 'Bench', 'User', 'bench')
+        
+        order_ids = []
+        requests = [
+            ('product by id', lambda i: db.get_product_by_id(products[i % len(products)][0])),
+            ('products by category', lambda i: db.get_products_by_category(CATEGORIES[i % len(CATEGORIES)])),
+            ('search', lambda i: db.search_products(NOUNS[i % len(NOUNS)].lower())),
+            ('popular products', lambda i: db.get_popular_products(10)),
+            ('order history page', lambda i: db.get_customer_orders(customer_ids[i % len(customer_ids)], 10)),
+            ('place order', lambda i: new_order(db, customer_ids[i % len(customer_ids)], products[i % len(products)])),
+            ('update order status', lambda i: db.update_order_status(order_ids[i % len(order_ids)], 'confirmed')),
+        ]
+        for label, request in requests:
+            samples = timed(request, range(args.requests))
+            if label == 'place order':
+                order_ids = [row[0] for row in db.get_customer_orders(customer_ids[0], 100) or []] or ['BENCH-missing']
+            report(label, samples)
+        db.close()
+
+def timed(func, inputs):
+    """Call func once per input and collect wall-clock durations"""
+    samples = []
+    for value in inputs:
+        started = time.perf_counter()
+        func(value)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    
+    search_parser = subcommands.add_parser('search', help=bench_search.__doc__)
+    search_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    search_parser.add_argument('--queries', type=int, default=50)
+    search_parser.add_argument('--mysql', action='store_true',
+                               help="time LIKE against a scratch MySQL table instead of an in-process scan")
+    search_parser.set_defaults(func=bench_search)
+    
+    dispatch_parser = subcommands.add_parser('dispatch', help=bench_dispatch.__doc__)
+    dispatch_parser.add_argument('--menu-items', type=int, nargs='+', default=[20, 100, 500])
+    dispatch_parser.add_argument('--iterations', type=int, default=100_000)
+    dispatch_parser.set_defaults(func=bench_dispatch)
+    
+    webhook_parser = subcommands.add_parser('webhook', help=bench_webhook.__doc__)
+    webhook_parser.add_argument('--updates', help="JSONL file of recorded updates to replay")
+    webhook_parser.add_argument('--count', type=int, default=2000, help="synthetic updates when no file is given")
+    webhook_parser.add_argument('--workers', type=int, default=8)
+    webhook_parser.add_argument('--connections', type=int, default=8)
+    webhook_parser.set_defaults(func=bench_webhook)
+    
+    listings_parser = subcommands.add_parser('listings', help=bench_listings.__doc__)
+    listings_parser.add_argument('--products', type=int, default=2000)
+    listings_parser.add_argument('--page-size', type=int, default=8)
+    listings_parser.add_argument('--taps', type=int, default=50, help="whole-listing renders to time")
+    listings_parser.set_defaults(func=bench_listings)
+    
+    keyboards_parser = subcommands.add_parser('keyboards', help=bench_keyboards.__doc__)
+    keyboards_parser.add_argument('--iterations', type=int, default=10_000)
+    keyboards_parser.set_defaults(func=bench_keyboards)
+    
+    send_parser = subcommands.add_parser('send', help=bench_send.__doc__)
+    send_parser.add_argument('--messages', type=int, default=1000)
+    send_parser.add_argument('--chats', type=int, default=200)
+    send_parser.add_argument('--global-rate', type=float, default=100, help="fake API messages per second")
+    send_parser.add_argument('--chat-rate', type=float, default=2, help="fake API messages per second per chat")
+    send_parser.add_argument('--retry-after', type=float, default=1)
+    send_parser.add_argument('--workers', type=int, default=8, help="handler threads")
+    send_parser.add_argument('--send-workers', type=int, default=4)
+    send_parser.set_defaults(func=bench_send)
+    
+    async_db_parser = subcommands.add_parser('async-db', help=bench_async_db.__doc__)
+    async_db_parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 1000])
+    async_db_parser.add_argument('--requests', type=int, default=30, help="requests per user")
+    async_db_parser.add_argument('--think', type=float, default=0, help="milliseconds between a user's requests")
+    async_db_parser.add_argument('--workers', type=int, default=8, help="handler threads for the sync manager")
+    async_db_parser.add_argument('--pool-size', type=int, default=8, help="pooled connections for both managers")
+    async_db_parser.set_defaults(func=bench_async_db)
+    
+    statements_parser = subcommands.add_parser('statements', help=bench_statements.__doc__)
+    statements_parser.add_argument('--iterations', type=int, default=2000, help="executions per statement and mode")
+    statements_parser.add_argument('--cache-size', type=int, default=32, help="prepared statements kept per connection")
+    statements_parser.set_defaults(func=bench_statements)
+    
+    storage_parser = subcommands.add_parser('storage', help=bench_storage.__doc__)
+    storage_parser.add_argument('--backends', nargs='+', choices=['sqlite', 'mysql'], default=['sqlite'],
+                                help="backends to time; mysql writes BENCH- orders to the configured database")
+    storage_parser.add_argument('--requests', type=int, default=2000, help="timed requests per request type")
+    storage_parser.add_argument('--products', type=int, default=5000, help="synthetic catalog size for SQLite")
+    storage_parser.set_defaults(func=bench_storage)
+    
+    import_parser = subcommands.add_parser('import', help=bench_import.__doc__)
+    import_parser.add_argument('--rows', type=int, default=100_000, help="products per file")
+    import_parser.add_argument('--bad-every', type=int, default=1000, help="make every Nth line malformed; 0 for none")
+    import_parser.add_argument('--chunk-size', type=int, default=1000, help="products per transaction")
+    import_parser.set_defaults(func=bench_import)
+    
+    load_parser = subcommands.add_parser('load', help=bench_load.__doc__)
+    load_parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 1000], help="concurrent shoppers per run")
+    load_parser.add_argument('--visits', type=int, default=1, help="shopping visits per user")
+    load_parser.add_argument('--think', type=float, default=0, help="mean milliseconds between a user's messages")
+    load_parser.add_argument('--workers', type=int, default=2, help="handler threads (TeleBot's default is 2)")
+    load_parser.add_argument('--products', type=int, default=2000, help="synthetic catalog size for the in-memory store")
+    load_parser.add_argument('--db-latency', type=float, default=0.5,
+                             help="milliseconds added to each in-memory store query to mimic a round trip")
+    load_parser.add_argument('--mysql', action='store_true', help="use the configured MySQL database instead")
+    load_parser.add_argument('--json', help="write the JSON report here instead of stdout")
+    load_parser.set_defaults(func=bench_load)
+    
+    shards_parser = subcommands.add_parser('shards', help=bench_shards.__doc__)
+    shards_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="worker processes per run")
+    shards_parser.add_argument('--users', type=int, default=500)
+    shards_parser.add_argument('--visits', type=int, default=2, help="shopping visits per user")
+    shards_parser.add_argument('--products', type=int, default=2000, help="synthetic catalog size")
+    shards_parser.set_defaults(func=bench_shards)
+    
+    reservations_parser = subcommands.add_parser('reservations', help=bench_reservations.__doc__)
+    reservations_parser.add_argument('--threads', type=int, default=8, help="shopper threads")
+    reservations_parser.add_argument('--users', type=int, default=50, help="users per thread")
+    reservations_parser.add_argument('--products', type=int, default=20, help="products competed for")
+    reservations_parser.add_argument('--stock', type=int, default=5, help="units per product (and per restock)")
+    reservations_parser.add_argument('--sync-ms', type=float, default=20, help="catalog sync interval, half of it spent querying")
+    reservations_parser.add_argument('--ttl', type=float, default=900, help="reservation TTL in seconds")
+    reservations_parser.add_argument('--seconds', type=float, default=3, help="duration of each run")
+    reservations_parser.add_argument('--workers', type=int, nargs='*', default=[],
+                                     help="also run the shoppers through supervisor.py with these worker counts")
+    reservations_parser.set_defaults(func=bench_reservations)
+    
+    order_ids_parser = subcommands.add_parser('order-ids', help=bench_order_ids.__doc__)
+    order_ids_parser.add_argument('--count', type=int, default=200000, help="IDs per run")
+    order_ids_parser.add_argument('--workers', type=int, default=4, help="worker IDs (bot processes)")
+    order_ids_parser.add_argument('--threads', type=int, default=4, help="threads per worker")
+    order_ids_parser.set_defaults(func=bench_order_ids)
+    
+    metrics_parser = subcommands.add_parser('metrics', help=bench_metrics.__doc__)
+    metrics_parser.add_argument('--iterations', type=int, default=200_000)
+    metrics_parser.set_defaults(func=bench_metrics)
+    
+    export_parser = subcommands.add_parser('export', help=bench_export.__doc__)
+    export_parser.add_argument('--orders', type=int, nargs='+', default=[100_000, 1_000_000])
+    export_parser.add_argument('--formats', nargs='+', default=['csv', 'jsonl.gz'], help="file suffixes to export to")
+    export_parser.add_argument('--batch-size', type=int, default=1000)
+    export_parser.set_defaults(func=bench_export)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
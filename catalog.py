@@ -0,0 +1,186 @@
+"""
+In-memory catalog replica for Grocery Store Bot
+Serves product and category reads from process memory and keeps them fresh
+by polling products.updated_at for changed rows
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+from config import Config
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Rows updated within this window before the watermark are fetched again, so a
+# transaction that committed late with an older updated_at is not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+class CatalogReplica:
+    """Process-local copy of the products table with id and category indexes.
+    
+    Rows are stored as compact tuples of
+    (id, name, category, price, stock, description, image_url). Index lists
+    are replaced rather than mutated, so readers never need the sync lock.
+    """
+    
+    def __init__(self, db=None, max_staleness=None):
+        self.db = db or get_storage()
+        self.max_staleness = Config.CATALOG_MAX_STALENESS if max_staleness is None else max_staleness
+        self._sync_lock = threading.Lock()
+        self._products = {}
+        self._by_category = {}
+        self._categories = ()
+        self._watermark = None
+        self._last_sync = 0.0
+        # Monotonic time the current or last sync started reading; rows it
+        # delivers reflect every transaction committed before then
+        self.sync_started = 0.0
+        self._listeners = []
+        self.version = 0
+        self.loaded = False
+    
+    def add_listener(self, callback):
+        """Register callback(changed_rows, deleted_ids), called after each applied delta"""
+        self._listeners.append(callback)
+    
+    def invalidate(self):
+        """Force a sync on the next read (e.g. after checkout changed stock)"""
+        self._last_sync = 0.0
+    
+    def refresh(self):
+        """Sync now if the replica is older than the staleness bound"""
+        self._ensure_fresh()
+    
+    def _ensure_fresh(self):
+        """Sync if the replica is older than the staleness bound"""
+        if time.monotonic() - self._last_sync <= self.max_staleness:
+            return
+        # Only one thread syncs; others keep reading the current snapshot
+        # unless nothing has been loaded yet
+        if self._sync_lock.acquire(blocking=not self.loaded):
+            try:
+                if time.monotonic() - self._last_sync > self.max_staleness:
+                    self._sync()
+            finally:
+                self._sync_lock.release()
+    
+    def sync(self):
+        """Pull changed rows from the database now"""
+        with self._sync_lock:
+            return self._sync()
+    
+    def _sync(self):
+        self.sync_started = time.monotonic()
+        since = self._watermark - SYNC_OVERLAP if self._watermark else None
+        rows = self.db.get_products_changed_since(since)
+        summary = self.db.get_catalog_summary()
+        if rows is None or not summary:
+            logger.warning("Catalog sync failed, serving previous snapshot")
+            return False
+        
+        changed = []
+        for row in rows:
+            product = (row[0], row[1], row[2], float(row[3]), row[4], row[5], row[6])
+            if self._products.get(product[0]) != product:
+                changed.append(product)
+            if self._watermark is None or row[7] > self._watermark:
+                self._watermark = row[7]
+        
+        # Deleted rows never show up in the delta, so reconcile ids when the
+        # row count no longer matches
+        deleted = []
+        total_rows = summary[0][0]
+        known = set(self._products)
+        known.update(product[0] for product in changed)
+        if total_rows != len(known):
+            ids = self.db.get_product_ids()
+            if ids is not None:
+                live = {row[0] for row in ids}
+                deleted = [product_id for product_id in known if product_id not in live]
+        
+        if changed or deleted:
+            self._apply(changed, deleted)
+            for callback in self._listeners:
+                try:
+                    callback(changed, deleted)
+                except Exception as e:
+                    logger.error(f"Catalog listener error: {e}")
+        
+        self.loaded = True
+        self._last_sync = time.monotonic()
+        return True
+    
+    def _apply(self, changed, deleted):
+        """Update the id index and rebuild only the affected category lists"""
+        affected = set()
+        for product_id in deleted:
+            old = self._products.pop(product_id, None)
+            if old:
+                affected.add(old[2])
+        for product in changed:
+            old = self._products.get(product[0])
+            if old:
+                affected.add(old[2])
+            affected.add(product[2])
+            self._products[product[0]] = product
+        
+        members = {category: [] for category in affected}
+        for product in self._products.values():
+            if product[2] in members:
+                members[product[2]].append(product)
+        
+        for category, products in members.items():
+            if products:
+                products.sort(key=lambda product: product[1])
+                self._by_category[category] = tuple(product[0] for product in products)
+            else:
+                self._by_category.pop(category, None)
+        
+        self._categories = tuple(sorted(
+            category for category, ids in self._by_category.items()
+            if any(self._products[product_id][4] > 0 for product_id in ids)
+        ))
+        self.version += 1
+        logger.info(f"Catalog replica updated: {len(changed)} changed, {len(deleted)} deleted "
+                    f"(version {self.version}, {len(self._products)} products)")
+    
+    def get_all_categories(self):
+        """Get categories with products in stock, shaped like DatabaseManager.get_all_categories"""
+        self._ensure_fresh()
+        return [(category,) for category in self._categories]
+    
+    def get_products_by_category(self, category):
+        """Get in-stock products of a category, sorted by name"""
+        self._ensure_fresh()
+        products = self._products
+        result = []
+        for product_id in self._by_category.get(category, ()):
+            product = products.get(product_id)
+            if product and product[4] > 0:
+                result.append((product[0], product[1], product[3], product[4], product[5], product[6]))
+        return result
+    
+    def get_product_by_id(self, product_id):
+        """Get product details by ID, shaped like DatabaseManager.get_product_by_id"""
+        self._ensure_fresh()
+        product = self._products.get(product_id)
+        if product is None:
+            return None
+        return product[:6]
+    
+    def get_all_products(self):
+        """Get every product row currently in the replica"""
+        self._ensure_fresh()
+        return list(self._products.values())
+
+# Singleton instance
+_catalog_instance = None
+
+def get_catalog():
+    """Get singleton catalog replica"""
+    global _catalog_instance
+    if _catalog_instance is None:
+        _catalog_instance = CatalogReplica()
+    return _catalog_instance
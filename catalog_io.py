@@ -0,0 +1,138 @@
+"""
+Bulk catalog import and export for Grocery Store Bot
+Reads and writes product rows as CSV or JSONL one record at a time, so
+supplier catalogs of any size stream through in bounded memory
+"""
+
+import csv
+import gzip
+import json
+from decimal import Decimal, InvalidOperation
+
+# Column order of exported files; imports accept any order
+PRODUCT_FIELDS = ('id', 'sku', 'name', 'category', 'price', 'stock', 'description', 'image_url')
+# Fields compared by the dry-run diff
+DIFF_FIELDS = ('name', 'category', 'price', 'stock', 'description', 'image_url')
+
+class InvalidProduct(ValueError):
+    """A product record that cannot be imported"""
+    
+    def __init__(self, line, reason):
+        super().__init__(f"line {line}: {reason}")
+        self.line = line
+
+def open_catalog(path):
+    """Open a catalog file for reading text, through gzip when it ends in .gz like exports"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    return open(path, newline='', encoding='utf-8')
+
+def read_records(stream, fmt):
+    """Yield (line, record dict, error) from a CSV or JSONL text stream.
+    
+    A malformed JSONL line yields (line, None, InvalidProduct) so the caller
+    can report it and go on; error is None for every other record.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield line, None, InvalidProduct(line, f"invalid JSON ({e})")
+            continue
+        if not isinstance(record, dict):
+            yield line, None, InvalidProduct(line, "expected a JSON object")
+            continue
+        yield line, record, None
+
+def _text(record, field, limit=None):
+    value = record.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    if limit and len(value) > limit:
+        raise ValueError(f"{field} is longer than {limit} characters")
+    return value or None
+
+def parse_product(line, record):
+    """Validate a record into a dict of PRODUCT_FIELDS; raises InvalidProduct"""
+    try:
+        product_id = _text(record, 'id')
+        price = _text(record, 'price')
+        if price is None:
+            raise ValueError("price is required")
+        product = {
+            'id': int(product_id) if product_id else None,
+            'sku': _text(record, 'sku', 64),
+            'name': _text(record, 'name', 200),
+            'category': _text(record, 'category', 100),
+            'price': Decimal(price).quantize(Decimal('0.01')),
+            'stock': int(_text(record, 'stock') or 0),
+            'description': _text(record, 'description'),
+            'image_url': _text(record, 'image_url', 500),
+        }
+    except InvalidOperation:
+        raise InvalidProduct(line, f"invalid price {price!r}")
+    except ValueError as e:
+        raise InvalidProduct(line, str(e))
+    
+    if product['sku'] is None and product['id'] is None:
+        raise InvalidProduct(line, "needs a sku or an id")
+    if not product['name'] or not product['category']:
+        raise InvalidProduct(line, "name and category are required")
+    if not product['price'].is_finite():
+        raise InvalidProduct(line, "price must be a number")
+    if product['price'] < 0 or product['stock'] < 0:
+        raise InvalidProduct(line, "price and stock cannot be negative")
+    return product
+
+def read_products(stream, fmt, errors=None):
+    """Yield valid products from a stream; invalid records go to errors (a list) or raise"""
+    for line, record, error in read_records(stream, fmt):
+        try:
+            if error is not None:
+                raise error
+            yield parse_product(line, record)
+        except InvalidProduct as e:
+            if errors is None:
+                raise
+            errors.append(e)
+
+def chunked(items, size):
+    """Yield lists of up to size items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def product_key(product):
+    """Match key of an import row: its sku, or its id when it has no sku"""
+    return ('sku', product['sku']) if product['sku'] else ('id', product['id'])
+
+def index_existing(rows):
+    """Map both ('sku', sku) and ('id', id) to existing rows shaped like PRODUCT_FIELDS"""
+    existing = {}
+    for row in rows:
+        product = dict(zip(PRODUCT_FIELDS, row))
+        existing[('id', product['id'])] = product
+        if product['sku']:
+            existing[('sku', product['sku'])] = product
+    return existing
+
+def diff_product(current, product):
+    """Get {field: (old, new)} for the fields an import would change"""
+    return {
+        field: (current[field], product[field])
+        for field in DIFF_FIELDS
+        if current[field] != product[field]
+    }
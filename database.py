@@ -1,226 +1,658 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, InterfaceError, OperationalError, errorcode
 import logging
-import json
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime, timedelta
 from config import Config
+from slowlog import get_slow_log
+from replicas import Replica, ReplicaSet, parse_replica_dsns
+from storage import Storage
+import queries
 
 logger = logging.getLogger(__name__)
 
-class DatabaseManager:
+# Client errors meaning the socket is gone; the connection is discarded or
+# reconnected instead of pinging before every query
+CONNECTION_LOST_ERRORS = (
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+    errorcode.CR_CONN_HOST_ERROR,
+)
+
+# Lost-connection errors raised before the statement reached the server, e.g.
+# on a stale idle connection; only these make a write safe to send again
+NOT_SENT_ERRORS = (errorcode.CR_SERVER_GONE_ERROR,)
+
+@lru_cache(maxsize=256)
+def returns_rows(query):
+    """Read/write classification of SQL text, for ad-hoc statements not declared in queries"""
+    return query.lstrip()[:4].lower() in ('sele', 'show')
+
+def is_read(query):
+    """Whether a statement only reads, so running it twice is harmless"""
+    rows = getattr(query, 'returns_rows', None)
+    return returns_rows(query) if rows is None else rows
+
+def can_retry(query, errno):
+    """Whether a statement that failed with a lost connection may be sent again.
+    
+    Reads always may. A write may only when the error came before it was
+    sent; after CR_SERVER_LOST the server may already have applied it.
+    """
+    return errno in CONNECTION_LOST_ERRORS and (errno in NOT_SENT_ERRORS or is_read(query))
+
+class StatementCache:
+    """LRU of prepared-statement cursors on one connection, keyed by SQL text.
+    
+    A cursor re-prepares whenever it is given a different string object, so
+    callers should pass the statement constants from queries unchanged.
+    """
+    
+    def __init__(self, cnx, size):
+        self.cnx = cnx
+        self.size = size
+        self._cursors = OrderedDict()
+        self.hits = 0
+        self.prepared = 0
+        self.evicted = 0
+    
+    def cursor(self, statement):
+        cursor = self._cursors.get(statement)
+        if cursor is not None:
+            self._cursors.move_to_end(statement)
+            self.hits += 1
+            return cursor
+        cursor = self.cnx.cursor(prepared=True)
+        self._cursors[statement] = cursor
+        self.prepared += 1
+        while len(self._cursors) > self.size:
+            self._close(self._cursors.popitem(last=False)[1])
+            self.evicted += 1
+        return cursor
+    
+    def discard(self, statement):
+        """Close a statement's cursor after an error left it in an unknown state"""
+        cursor = self._cursors.pop(statement, None)
+        if cursor is not None:
+            self._close(cursor)
+    
+    def _close(self, cursor):
+        try:
+            cursor.close()
+        except Error:
+            pass
+    
+    def __len__(self):
+        return len(self._cursors)
+
+class PoolTimeout(Error):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT"""
+
+# Connection-level failures that send a replica read to the primary; SQL and
+# parameter errors are the query's fault and are reported as on the primary
+REPLICA_FAILOVER_ERRORS = (InterfaceError, OperationalError, PoolTimeout)
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections with checkout wait-time stats.
+    
+    Connections are opened lazily up to ``size`` and handed out without a
+    liveness ping; a connection is only reconnected after a query on it fails.
+    """
+    
+    def __init__(self, size, timeout, statement_cache_size=0, **db_config):
+        self.size = size
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self._db_config = db_config
+        self._idle = []
+        self._lock = threading.Lock()
+        # Notified whenever a connection is returned or a slot is freed
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self._statements = {}
+        
+        # Wait-time statistics for sizing the pool
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0
+    
+    def _open(self):
+        """Open a new connection in a slot already reserved by acquire"""
+        try:
+            return mysql.connector.connect(**self._db_config)
+        except Exception:
+            self._free_slot()
+            raise
+    
+    def _free_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+    
+    def acquire(self):
+        """Check out a connection, waiting up to ``timeout`` seconds.
+        
+        Waiters take the next returned connection, or open a new one as soon
+        as a broken connection's slot is freed.
+        """
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waited = False
+        with self._available:
+            while True:
+                if self._idle:
+                    cnx = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    cnx = None
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(msg=f"No database connection available after {self.timeout}s "
+                                          f"(pool size {self.size})")
+                waited = True
+                self._available.wait(remaining)
+        if cnx is None:
+            cnx = self._open()
+        
+        wait = time.perf_counter() - start
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if waited:
+                self.waited += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+        return cnx
+    
+    def statements(self, cnx):
+        """Prepared-statement cache of a checked-out connection"""
+        cache = self._statements.get(id(cnx))
+        if cache is None or cache.cnx is not cnx:
+            cache = StatementCache(cnx, self.statement_cache_size)
+            with self._lock:
+                self._statements[id(cnx)] = cache
+        return cache
+    
+    def _forget(self, cnx):
+        """Drop a connection's prepared statements; the server frees them with the session"""
+        with self._lock:
+            self._statements.pop(id(cnx), None)
+    
+    def release(self, cnx, broken=False):
+        """Return a connection to the pool, discarding it if it is broken"""
+        with self._lock:
+            self.in_use -= 1
+        if broken:
+            self._forget(cnx)
+            try:
+                cnx.close()
+            except Exception:
+                pass
+            self._free_slot()
+        else:
+            with self._available:
+                self._idle.append(cnx)
+                self._available.notify()
+    
+    def reconnect(self, cnx):
+        """Re-establish a connection whose last query failed"""
+        with self._lock:
+            self.reconnects += 1
+        self._forget(cnx)
+        cnx.reconnect(attempts=1)
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of one call"""
+        cnx = self.acquire()
+        broken = False
+        try:
+            yield cnx
+        except Error as e:
+            broken = e.errno in CONNECTION_LOST_ERRORS
+            raise
+        finally:
+            self.release(cnx, broken)
+    
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                cnx = self._idle.pop()
+            self._forget(cnx)
+            try:
+                cnx.close()
+            except Exception:
+                pass
+            self._free_slot()
+    
+    def stats(self):
+        """Snapshot of pool usage, checkout wait times and prepared-statement reuse"""
+        with self._lock:
+            caches = list(self._statements.values())
+            return {
+                'size': self.size,
+                'open': self._created,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'checkouts': self.checkouts,
+                'waited': self.waited,
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+                'avg_wait_ms': (self.total_wait / self.waited * 1000) if self.waited else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+                'statements_cached': sum(len(cache) for cache in caches),
+                'statements_prepared': sum(cache.prepared for cache in caches),
+                'statement_hits': sum(cache.hits for cache in caches),
+                'statements_evicted': sum(cache.evicted for cache in caches),
+            }
+
+class DatabaseManager(Storage):
+    """Storage on MySQL through a pool of mysql.connector connections"""
+    
+    queries = queries
+    ERRORS = (Error,)
+    
     def __init__(self):
-        self.connection = None
+        self.pool = ConnectionPool(Config.DB_POOL_SIZE, Config.DB_POOL_TIMEOUT, Config.DB_STATEMENT_CACHE,
+                                   **Config.get_db_config())
+        self.slow_log = get_slow_log()
+        self._order_listeners = []
+        self.replicas = None
         self.connect()
+        if Config.DB_REPLICAS:
+            self._start_replicas()
+    
+    def _start_replicas(self):
+        replicas = []
+        for config in parse_replica_dsns(Config.DB_REPLICAS, Config.get_db_config()):
+            name = f"{config['host']}:{config['port']}"
+            replicas.append(Replica(name, ConnectionPool(Config.DB_POOL_SIZE, Config.DB_POOL_TIMEOUT,
+                                                         Config.DB_STATEMENT_CACHE, **config)))
+        self.replicas = ReplicaSet(replicas).start()
+        healthy = sum(replica.healthy for replica in self.replicas.replicas)
+        logger.info(f"Routing reads to {healthy} of {len(replicas)} replicas")
     
     def connect(self):
-        """Establish database connection"""
+        """Open the first pooled connection to verify the database is reachable"""
         try:
-            self.connection = mysql.connector.connect(**Config.get_db_config())
-            if self.connection.is_connected():
-                logger.info("Successfully connected to MySQL database")
-                return True
+            with self.pool.connection():
+                pass
+            logger.info(f"Successfully connected to MySQL database (pool size {Config.DB_POOL_SIZE})")
+            return True
         except Error as e:
             logger.error(f"Error connecting to MySQL database: {e}")
             return False
     
     def reconnect(self):
-        """Reconnect to database if connection is lost"""
-        if self.connection:
-            self.connection.close()
+        """Drop idle pooled connections so they are re-established on next use"""
+        self.pool.close_all()
+        if self.replicas is not None:
+            for replica in self.replicas.replicas:
+                replica.pool.close_all()
         return self.connect()
     
-    def execute_query(self, query, params=None):
-        """Execute a query and return results"""
+    def is_connected(self):
+        """Check that a pooled connection can reach the server"""
+        try:
+            with self.pool.connection() as cnx:
+                return cnx.is_connected()
+        except Error:
+            return False
+    
+    def get_pool_stats(self):
+        """Get connection pool usage and wait-time statistics"""
+        return self.pool.stats()
+    
+    def get_replica_stats(self):
+        """Get replica health, lag and read routing statistics, or None without replicas"""
+        return self.replicas.stats() if self.replicas is not None else None
+    
+    def add_order_listener(self, callback):
+        """Register callback(customer_id), called after a customer's order is placed or changes status"""
+        self._order_listeners.append(callback)
+    
+    def _customer_wrote(self, customer_id):
+        if self.replicas is not None:
+            self.replicas.note_write(customer_id)
+    
+    def _orders_changed(self, customer_id):
+        self._customer_wrote(customer_id)
+        for callback in self._order_listeners:
+            try:
+                callback(customer_id)
+            except Exception as e:
+                logger.error(f"Order listener error: {e}")
+    
+    def _execute(self, pool, cnx, query, params):
+        """Run one statement on a checked-out connection.
+        
+        Statements declared in queries run as prepared statements, cached
+        per connection; ad-hoc SQL uses a plain text-protocol cursor.
+        """
+        rows = getattr(query, 'returns_rows', None)
+        if rows is not None and pool.statement_cache_size:
+            statements = pool.statements(cnx)
+            cursor = statements.cursor(query)
+            try:
+                cursor.execute(query, params or ())
+                if rows:
+                    return cursor.fetchall()
+                if cnx.in_transaction:
+                    cnx.commit()
+                return cursor.rowcount
+            except Error:
+                statements.discard(query)
+                raise
+        
+        cursor = cnx.cursor()
         try:
-            if not self.connection.is_connected():
-                self.reconnect()
-            
-            cursor = self.connection.cursor()
-            
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             
-            if query.strip().lower().startswith('select') or query.strip().lower().startswith('show'):
-                result = cursor.fetchall()
-                cursor.close()
-                return result
+            if is_read(query):
+                return cursor.fetchall()
             else:
-                self.connection.commit()
-                affected_rows = cursor.rowcount
-                cursor.close()
-                return affected_rows
-                
-        except Error as e:
-            logger.error(f"Database query error: {e}")
+                if cnx.in_transaction:
+                    cnx.commit()
+                return cursor.rowcount
+        finally:
+            cursor.close()
+    
+    def _explain(self, cnx, query, params):
+        """EXPLAIN a statement on a checked-out connection; returns the plan rows as dicts"""
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + query, params or None)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+    
+    def _run(self, pool, query, params):
+        """Run one statement on a connection from pool.
+        
+        A read, or a write that never reached the server, is retried once on
+        a reconnected connection if the connection was lost; other write
+        failures are raised to the caller.
+        """
+        with pool.connection() as cnx:
+            started = time.perf_counter()
+            try:
+                result = self._execute(pool, cnx, query, params)
+            except Error as e:
+                if not can_retry(query, e.errno):
+                    raise
+                logger.warning(f"Lost database connection ({e}), reconnecting")
+                pool.reconnect(cnx)
+                started = time.perf_counter()
+                result = self._execute(pool, cnx, query, params)
+            if self.slow_log is not None:
+                self.slow_log.record(query, params, time.perf_counter() - started,
+                                     lambda: self._explain(cnx, query, params))
+            return result
+    
+    def read_query(self, query, params=None, customer_id=None):
+        """Execute a SELECT on a healthy replica, or on the primary when there is none.
+        
+        Pass customer_id for reads of a customer's own rows, so they stay on
+        the primary while replicas may not have their latest write yet. A
+        read that fails on a replica is retried on the primary.
+        """
+        replica = self.replicas.choose(customer_id) if self.replicas is not None else None
+        if replica is not None:
+            try:
+                return self._run(replica.pool, query, params)
+            except REPLICA_FAILOVER_ERRORS as e:
+                self.replicas.failed(replica, e)
+                logger.warning(f"Read on replica {replica.name} failed ({e}), using the primary")
+            except Exception as e:
+                # A bad query fails the same way on the primary; the replica stays in rotation
+                return self._query_failed(query, params, e)
+        return self.execute_query(query, params)
+    
+    def execute_query(self, query, params=None):
+        """Execute a query on the primary and return results"""
+        try:
+            return self._run(self.pool, query, params)
+        except Exception as e:
+            return self._query_failed(query, params, e)
+    
+    def _query_failed(self, query, params, error):
+        if isinstance(error, Error):
+            logger.error(f"Database query error: {error}")
             logger.error(f"Query: {query}")
             logger.error(f"Params: {params}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error in execute_query: {e}")
-            return None
+        else:
+            logger.error(f"Unexpected error in execute_query: {error}")
+        return None
+    
+    def stream_query(self, query, params=None, batch_size=None, replica=False):
+        """Yield a SELECT's rows in lists of up to batch_size without holding the result set.
+        
+        Rows are read off an unbuffered cursor with fetchmany as the caller
+        consumes them, so memory stays flat however many rows match. The
+        pooled connection is held until the generator finishes; one left
+        mid-result is closed rather than drained back into the pool. With
+        replica=True the rows come from a replica when one is healthy,
+        falling back to the primary if its connection fails before the first batch.
+        """
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        chosen = self.replicas.choose() if replica and self.replicas is not None else None
+        if chosen is not None:
+            batches = self._stream(chosen.pool, query, params, batch_size)
+            try:
+                first = next(batches, None)
+            except REPLICA_FAILOVER_ERRORS as e:
+                self.replicas.failed(chosen, e)
+                logger.warning(f"Streaming from replica {chosen.name} failed ({e}), using the primary")
+            else:
+                if first is not None:
+                    yield first
+                    yield from batches
+                return
+        yield from self._stream(self.pool, query, params, batch_size)
+    
+    def _stream(self, pool, query, params, batch_size):
+        cnx = pool.acquire()
+        finished = False
+        try:
+            cursor = cnx.cursor(buffered=False)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+            finished = True
+        except Error as e:
+            logger.error(f"Streaming query error: {e}")
+            logger.error(f"Query: {query}")
+            raise
+        finally:
+            pool.release(cnx, broken=not finished)
+    
+    @contextmanager
+    def transaction(self):
+        """Run several statements on one pooled connection as a single transaction.
+        
+        Yields (connection, cursor); commits on normal exit unless the caller
+        already committed or rolled back, and rolls back on any exception.
+        """
+        with self.pool.connection() as cnx:
+            cursor = cnx.cursor()
+            try:
+                cnx.start_transaction()
+                yield cnx, cursor
+                if cnx.in_transaction:
+                    cnx.commit()
+            except Exception:
+                if cnx.in_transaction:
+                    cnx.rollback()
+                raise
+            finally:
+                cursor.close()
     
     def get_products_by_category(self, category):
         """Get all products in a specific category"""
-        query = """
-            SELECT id, name, price, stock, description, image_url 
-            FROM products 
-            WHERE category = %s AND stock > 0
-            ORDER BY name
-        """
-        return self.execute_query(query, (category,))
+        return self.read_query(queries.GET_PRODUCTS_BY_CATEGORY, (category,))
     
     def get_product_by_id(self, product_id):
         """Get product details by ID"""
-        query = "SELECT id, name, category, price, stock, description FROM products WHERE id = %s"
-        result = self.execute_query(query, (product_id,))
+        result = self.read_query(queries.GET_PRODUCT_BY_ID, (product_id,))
         return result[0] if result else None
     
+    def get_products_changed_since(self, since=None):
+        """Get full product rows updated at or after a timestamp (all rows when None)"""
+        if since is None:
+            return self.execute_query(queries.GET_ALL_PRODUCTS)
+        return self.execute_query(queries.GET_PRODUCTS_CHANGED_SINCE, (since,))
+    
+    def get_catalog_summary(self):
+        """Get product row count and newest update time"""
+        return self.execute_query(queries.GET_CATALOG_SUMMARY)
+    
+    def get_product_ids(self):
+        """Get the ids of every product"""
+        return self.execute_query(queries.GET_PRODUCT_IDS)
+    
     def get_all_categories(self):
         """Get all product categories"""
-        query = "SELECT DISTINCT category FROM products WHERE stock > 0 ORDER BY category"
-        return self.execute_query(query)
+        return self.read_query(queries.GET_ALL_CATEGORIES)
+    
+    def find_products(self, search):
+        """Get (id, name, category, price, stock) for a product ID or products whose name contains search"""
+        if search.isdigit():
+            return self.execute_query(queries.FIND_PRODUCT_BY_ID, (int(search),))
+        return self.execute_query(queries.FIND_PRODUCTS_BY_NAME, (f"%{search}%",))
+    
+    def delete_product(self, product_id):
+        """Delete a product; returns the number of rows deleted"""
+        return self.execute_query(queries.DELETE_PRODUCT, (product_id,))
     
     def register_customer(self, telegram_id, first_name, last_name, username):
         """Register a new customer or update existing one"""
-        query = """
-            INSERT INTO customers (telegram_id, first_name, last_name, username, registration_date)
-            VALUES (%s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            first_name = VALUES(first_name),
-            last_name = VALUES(last_name),
-            username = VALUES(username),
-            last_active = CURRENT_TIMESTAMP
-        """
         params = (telegram_id, first_name or '', last_name or '', username or '', datetime.now())
-        return self.execute_query(query, params)
+        return self.execute_query(queries.REGISTER_CUSTOMER, params)
     
     def create_order(self, order_data):
         """Create a new order"""
-        query = """
-            INSERT INTO orders (order_id, customer_id, items, subtotal, delivery_fee, 
-                              total, order_type, delivery_address, phone, status, order_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        return self.execute_query(query, order_data)
+        return self.execute_query(queries.CREATE_ORDER, order_data)
     
     def add_order_items(self, order_id, cart_items):
         """Add items to order_items table"""
-        query = """
-            INSERT INTO order_items (order_id, product_id, quantity, unit_price, subtotal)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        
         for product_id, item in cart_items.items():
-            subtotal = item['price'] * item['quantity']
-            params = (order_id, product_id, item['quantity'], item['price'], subtotal)
-            self.execute_query(query, params)
+            subtotal = item.price * item.quantity
+            params = (order_id, product_id, item.quantity, item.price, subtotal)
+            self.execute_query(queries.ADD_ORDER_ITEM, params)
     
     def update_product_stock(self, product_id, quantity_sold):
         """Update product stock after sale"""
-        query = "UPDATE products SET stock = stock - %s WHERE id = %s AND stock >= %s"
-        return self.execute_query(query, (quantity_sold, product_id, quantity_sold))
-    
-    def get_customer_orders(self, telegram_id, limit=10):
-        """Get customer's order history"""
-        query = """
-            SELECT order_id, total, status, order_date, order_type, delivery_address
-            FROM orders 
-            WHERE customer_id = %s 
-            ORDER BY order_date DESC 
-            LIMIT %s
-        """
-        return self.execute_query(query, (telegram_id, limit))
+        return self.execute_query(queries.UPDATE_PRODUCT_STOCK, (quantity_sold, product_id, quantity_sold))
+    
+    def get_products_by_keys(self, skus, ids):
+        """Get products by sku or id, as rows in PRODUCT_FIELDS order"""
+        if not skus and not ids:
+            return []
+        return self.execute_query(queries.get_products_by_keys(len(skus), len(ids)), [*skus, *ids])
+    
+    def iter_products(self, batch_size=None):
+        """Yield lists of up to batch_size products in id order"""
+        return self.stream_query(queries.GET_PRODUCTS_FOR_EXPORT, batch_size=batch_size, replica=True)
+    
+    def get_customer_orders(self, telegram_id, limit=10, before=None):
+        """Get customer's order history newest first, starting after the (order_date, id) cursor before"""
+        if before is None:
+            return self.read_query(queries.GET_CUSTOMER_ORDERS, (telegram_id, limit), customer_id=telegram_id)
+        order_date, row_id = before
+        return self.read_query(queries.GET_CUSTOMER_ORDERS_BEFORE,
+                               (telegram_id, order_date, order_date, row_id, limit), customer_id=telegram_id)
+    
+    def get_recent_orders(self, limit=10):
+        """Get the newest orders of all customers with the customer's name"""
+        return self.read_query(queries.GET_RECENT_ORDERS, (limit,))
+    
+    def iter_orders(self, start, end, batch_size=None):
+        """Yield lists of orders placed in [start, end), in EXPORT_ORDERS column order"""
+        return self.stream_query(queries.EXPORT_ORDERS, (start, end), batch_size, replica=True)
+    
+    def iter_order_items(self, start, end, batch_size=None):
+        """Yield lists of the items of orders placed in [start, end), in EXPORT_ORDER_ITEMS column order"""
+        return self.stream_query(queries.EXPORT_ORDER_ITEMS, (start, end), batch_size, replica=True)
+    
+    def get_latest_order_id(self, ceiling):
+        """Get the greatest order ID as long as ceiling and not above it, or None"""
+        result = self.execute_query(queries.GET_LATEST_ORDER_ID, (ceiling, len(ceiling)))
+        return result[0][0] if result else None
     
     def get_order_details(self, order_id):
         """Get detailed order information"""
-        query = """
-            SELECT o.order_id, o.customer_id, o.items, o.subtotal, o.delivery_fee, 
-                   o.total, o.order_type, o.delivery_address, o.phone, o.status, 
-                   o.order_date, c.first_name, c.last_name
-            FROM orders o
-            JOIN customers c ON o.customer_id = c.telegram_id
-            WHERE o.order_id = %s
-        """
-        result = self.execute_query(query, (order_id,))
+        result = self.execute_query(queries.GET_ORDER_DETAILS, (order_id,))
         return result[0] if result else None
     
-    def update_order_status(self, order_id, status):
-        """Update order status"""
-        query = "UPDATE orders SET status = %s WHERE order_id = %s"
-        return self.execute_query(query, (status, order_id))
-    
     def get_low_stock_products(self, threshold=10):
         """Get products with low stock"""
-        query = "SELECT id, name, category, stock FROM products WHERE stock <= %s ORDER BY stock ASC"
-        return self.execute_query(query, (threshold,))
+        return self.read_query(queries.GET_LOW_STOCK_PRODUCTS, (threshold,))
     
     def get_daily_sales_report(self, date=None):
-        """Get daily sales report"""
+        """Get daily sales report from the daily rollup"""
         if date is None:
             date = datetime.now().date()
-        
-        query = """
-            SELECT COUNT(*) as total_orders, 
-                   COALESCE(SUM(total), 0) as total_revenue,
-                   COALESCE(AVG(total), 0) as average_order_value
-            FROM orders 
-            WHERE DATE(order_date) = %s AND status NOT IN ('cancelled')
-        """
-        return self.execute_query(query, (date,))
+        return self.read_query(queries.GET_DAILY_SALES_REPORT, (date,))
+    
+    def get_sales_summary(self, start, end=None):
+        """Get (orders, revenue) for the hours in [start, end); end defaults to now"""
+        end = end or datetime.now()
+        return self.read_query(queries.GET_SALES_SUMMARY, (start, end))
     
     def search_products(self, search_term):
         """Search products by name or description"""
-        query = """
-            SELECT id, name, category, price, stock, description
-            FROM products 
-            WHERE (name LIKE %s OR description LIKE %s) AND stock > 0
-            ORDER BY name
-        """
         search_pattern = f"%{search_term}%"
-        return self.execute_query(query, (search_pattern, search_pattern))
-    
-    def get_popular_products(self, limit=10):
-        """Get most popular products based on order frequency"""
-        query = """
-            SELECT p.id, p.name, p.category, p.price, p.stock,
-                   COUNT(oi.product_id) as order_count,
-                   SUM(oi.quantity) as total_sold
-            FROM products p
-            JOIN order_items oi ON p.id = oi.product_id
-            JOIN orders o ON oi.order_id = o.order_id
-            WHERE o.status NOT IN ('cancelled')
-            GROUP BY p.id
-            ORDER BY order_count DESC, total_sold DESC
-            LIMIT %s
-        """
-        return self.execute_query(query, (limit,))
+        return self.read_query(queries.SEARCH_PRODUCTS, (search_pattern, search_pattern))
+    
+    def get_popular_products(self, limit=10, days=None):
+        """Get most popular products from the popularity aggregates, optionally for the last N days"""
+        if days is None:
+            return self.read_query(queries.GET_POPULAR_PRODUCTS, (limit,))
+        since = datetime.now().date() - timedelta(days=days - 1)
+        return self.read_query(queries.GET_POPULAR_PRODUCTS_SINCE, (since, limit))
     
     def add_customer_address(self, telegram_id, address_data):
         """Add customer delivery address"""
-        query = """
-            INSERT INTO customer_addresses (customer_id, address_type, street_address, 
-                                          city, state, postal_code, is_default)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        return self.execute_query(query, (telegram_id, *address_data))
+        result = self.execute_query(queries.ADD_CUSTOMER_ADDRESS, (telegram_id, *address_data))
+        self._customer_wrote(telegram_id)
+        return result
     
     def get_customer_addresses(self, telegram_id):
         """Get customer's saved addresses"""
-        query = """
-            SELECT id, address_type, street_address, city, state, postal_code, is_default
-            FROM customer_addresses 
-            WHERE customer_id = %s
-            ORDER BY is_default DESC, id ASC
-        """
-        return self.execute_query(query, (telegram_id,))
+        return self.read_query(queries.GET_CUSTOMER_ADDRESSES, (telegram_id,), customer_id=telegram_id)
     
     def close(self):
-        """Close database connection"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logger.info("MySQL connection closed")
+        """Close all pooled database connections"""
+        logger.info(f"Connection pool stats: {self.pool.stats()}")
+        self.pool.close_all()
+        if self.replicas is not None:
+            logger.info(f"Replica stats: {self.replicas.stats()}")
+            self.replicas.close()
+        logger.info("MySQL connections closed")
 
 # Singleton instance
 _db_instance = None
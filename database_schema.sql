@@ -27,6 +27,7 @@ CREATE TABLE IF NOT EXISTS categories (
 -- Products table
 CREATE TABLE IF NOT EXISTS products (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    sku VARCHAR(64),
     name VARCHAR(200) NOT NULL,
     category VARCHAR(100) NOT NULL,
     price DECIMAL(10, 2) NOT NULL,
@@ -35,6 +36,7 @@ CREATE TABLE IF NOT EXISTS products (
     image_url VARCHAR(500),
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE INDEX idx_products_sku (sku),
     INDEX idx_category (category),
     INDEX idx_stock (stock)
 );
@@ -56,7 +58,7 @@ CREATE TABLE IF NOT EXISTS orders (
     delivery_date DATETIME,
     notes TEXT,
     FOREIGN KEY (customer_id) REFERENCES customers(telegram_id) ON DELETE CASCADE,
-    INDEX idx_customer (customer_id),
+    INDEX idx_orders_customer_date (customer_id, order_date),
     INDEX idx_status (status),
     INDEX idx_order_date (order_date)
 );
@@ -114,6 +116,50 @@ CREATE TABLE IF NOT EXISTS customer_addresses (
     FOREIGN KEY (customer_id) REFERENCES customers(telegram_id) ON DELETE CASCADE
 );
 
+-- Popularity aggregate, maintained at checkout and reversed on cancellation
+CREATE TABLE IF NOT EXISTS product_popularity (
+    product_id INT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    total_sold INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    INDEX idx_popularity_rank (order_count, total_sold)
+);
+
+-- Per-day popularity for windowed rankings (last 7 / 30 days)
+CREATE TABLE IF NOT EXISTS product_popularity_daily (
+    sale_date DATE NOT NULL,
+    product_id INT NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    total_sold INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, product_id),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- Sales rollups, maintained at checkout and adjusted on cancellation
+CREATE TABLE IF NOT EXISTS sales_hourly (
+    sale_hour DATETIME PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    sale_date DATE PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00
+);
+
+-- Per-customer order totals for customer statistics
+CREATE TABLE IF NOT EXISTS customer_totals (
+    customer_id BIGINT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    total_spent DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+    last_order_date DATETIME NOT NULL,
+    FOREIGN KEY (customer_id) REFERENCES customers(telegram_id) ON DELETE CASCADE,
+    INDEX idx_customer_totals_spent (total_spent),
+    INDEX idx_customer_totals_last_order (last_order_date)
+);
+
 -- Promotions table
 CREATE TABLE IF NOT EXISTS promotions (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -195,19 +241,19 @@ INSERT INTO products (name, category, price, stock, description) VALUES
 
 -- Create indexes for better performance
 CREATE INDEX idx_products_name ON products(name);
+CREATE INDEX idx_products_updated_at ON products(updated_at);
 CREATE INDEX idx_orders_date ON orders(order_date);
 CREATE INDEX idx_customers_telegram ON customers(telegram_id);
 
 -- Views for analytics
 CREATE VIEW daily_sales AS
 SELECT 
-    DATE(order_date) as sale_date,
-    COUNT(*) as total_orders,
-    SUM(total) as total_revenue,
-    AVG(total) as average_order_value
-FROM orders 
-WHERE status NOT IN ('cancelled') 
-GROUP BY DATE(order_date);
+    sale_date,
+    order_count as total_orders,
+    revenue as total_revenue,
+    revenue / order_count as average_order_value
+FROM sales_daily
+WHERE order_count > 0;
 
 CREATE VIEW popular_products AS
 SELECT 
@@ -0,0 +1,82 @@
+"""
+Streaming data exports for Grocery Store Bot
+Writes query results batch by batch to CSV or JSONL, gzip-compressed when the
+file name ends in .gz, so an export of any size runs in constant memory
+"""
+
+import csv
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+ORDER_FIELDS = ('order_id', 'customer_id', 'subtotal', 'delivery_fee', 'total', 'order_type',
+                'delivery_address', 'phone', 'status', 'order_date', 'delivery_date')
+ORDER_ITEM_FIELDS = ('order_id', 'product_id', 'quantity', 'unit_price', 'subtotal', 'order_date')
+
+FORMATS = ('csv', 'jsonl')
+GZIP_LEVEL = 6
+
+def export_format(path, fmt=None):
+    """Get 'csv' or 'jsonl' from an explicit format or the file extension, ignoring .gz"""
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    raise ValueError(f"Cannot tell the format of {path}; pass --format csv or --format jsonl")
+
+def open_export(path):
+    """Open path for writing text, through gzip when it ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', compresslevel=GZIP_LEVEL, newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+class RowWriter:
+    """Writes row tuples in fields order as CSV (with a header) or JSONL"""
+    
+    def __init__(self, stream, fmt, fields):
+        self.stream = stream
+        self.fmt = fmt
+        self.fields = fields
+        self.count = 0
+        if fmt == 'csv':
+            self._csv = csv.writer(stream)
+            self._csv.writerow(fields)
+    
+    def write_rows(self, rows):
+        if self.fmt == 'csv':
+            self._csv.writerows(rows)
+        else:
+            dumps = json.dumps
+            self.stream.write(''.join(
+                dumps(dict(zip(self.fields, map(_json_value, row))), ensure_ascii=False) + '\n'
+                for row in rows
+            ))
+        self.count += len(rows)
+
+def export_batches(batches, path, fields, fmt=None):
+    """Write batches of rows to path; returns the row count"""
+    fmt = export_format(path, fmt)
+    with open_export(path) as stream:
+        writer = RowWriter(stream, fmt, fields)
+        for rows in batches:
+            writer.write_rows(rows)
+    return writer.count
+
+def export_orders(db, start, end, orders_path, items_path=None, fmt=None, batch_size=None):
+    """Export orders placed in [start, end), and optionally their items; returns (orders, items)"""
+    orders = export_batches(db.iter_orders(start, end, batch_size), orders_path, ORDER_FIELDS, fmt)
+    items = 0
+    if items_path:
+        items = export_batches(db.iter_order_items(start, end, batch_size), items_path, ORDER_ITEM_FIELDS, fmt)
+    return orders, items
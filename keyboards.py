@@ -0,0 +1,62 @@
+"""
+Reply keyboard registry for Grocery Store Bot
+Builds each keyboard in menus.KEYBOARDS once and keeps it as serialized
+JSON, ready to pass as reply_markup
+"""
+
+import threading
+import telebot
+from catalog import get_catalog
+import menus
+
+def build_keyboard(rows, leading_rows=()):
+    """Serialize a ReplyKeyboardMarkup of rows of (label, action) pairs"""
+    markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
+    for labels in leading_rows:
+        markup.row(*labels)
+    for row in rows:
+        markup.row(*(label for label, action in row))
+    return markup.to_json()
+
+class KeyboardRegistry:
+    """Prebuilt keyboards; the category keyboard is rebuilt only when the set of categories changes"""
+    
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._keyboards = {name: build_keyboard(rows) for name, rows in menus.KEYBOARDS.items()}
+        self._lock = threading.Lock()
+        self._categories = None
+        self._category_keyboard = None
+        self._catalog_version = None
+        self.category_builds = 0
+    
+    def get(self, name):
+        """Get the serialized keyboard for a menus.KEYBOARDS entry"""
+        return self._keyboards[name]
+    
+    def categories(self):
+        """Get the category keyboard for the categories currently in stock"""
+        self.catalog.refresh()
+        version = self.catalog.version
+        with self._lock:
+            if version != self._catalog_version:
+                categories = tuple(category for (category,) in self.catalog.get_all_categories())
+                if categories != self._categories:
+                    self._category_keyboard = build_keyboard(
+                        menus.KEYBOARDS[menus.CATEGORY_FOOTER],
+                        [(f"{menus.CATEGORY_PREFIX}{category}",) for category in categories]
+                    )
+                    self._categories = categories
+                    self.category_builds += 1
+                self._catalog_version = version
+            return self._category_keyboard
+
+# Singleton instance
+_registry = None
+
+def get_keyboards():
+    """Get singleton keyboard registry"""
+    global _registry
+    if _registry is None:
+        _registry = KeyboardRegistry(get_catalog())
+    return _registry
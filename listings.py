@@ -0,0 +1,180 @@
+"""
+Paginated product listings for Grocery Store Bot
+Renders category, search and popular listings one page at a time and caches
+both the listing rows and the rendered pages per catalog version
+"""
+
+import logging
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from config import Config
+from catalog import get_catalog
+import search
+import views
+
+logger = logging.getLogger(__name__)
+
+CATEGORY = 'c'
+SEARCH = 's'
+POPULAR = 'p'
+
+PAGE_CALLBACK_PREFIX = "page:"
+SEARCH_RESULT_LIMIT = 200
+POPULAR_LIMIT = 30
+# Popularity moves with orders rather than catalog edits, so it also expires by age
+POPULAR_TTL = 60
+
+def key_token(key):
+    """Short stable token for a category or search term, to fit in 64 bytes of callback data"""
+    return format(zlib.crc32(key.encode()), '08x')
+
+def page_callback(kind, token, page):
+    return f"{PAGE_CALLBACK_PREFIX}{kind}:{token}:{page}"
+
+def parse_page_callback(data):
+    """Get (kind, token, page) from page callback data"""
+    kind, token, page = data[len(PAGE_CALLBACK_PREFIX):].split(':')
+    return kind, token, int(page)
+
+class ListingCache:
+    """LRU of listing rows and rendered pages.
+    
+    Keys carry the catalog version, so a catalog change makes every cached
+    page unreachable; a catalog listener then drops them. Rendered pages
+    keep their keyboard as serialized JSON, ready to send.
+    """
+    
+    def __init__(self, catalog=None, page_size=None, max_pages=None):
+        self.catalog = catalog or get_catalog()
+        self.page_size = page_size or Config.LISTING_PAGE_SIZE
+        self.max_pages = max_pages or Config.LISTING_CACHE_PAGES
+        self._lock = threading.Lock()
+        # Keyed by token for page callbacks; the key is stored and compared, since tokens can collide
+        self._rows = OrderedDict()     # (kind, token) -> (version, key, rows)
+        self._pages = OrderedDict()    # (kind, key, page, version) -> (text, markup_json, page_count)
+        self.catalog.add_listener(self._on_catalog_change)
+        
+        self.hits = 0
+        self.renders = 0
+        self.fetches = 0
+    
+    def _on_catalog_change(self, changed_rows, deleted_ids):
+        with self._lock:
+            self._rows.clear()
+            self._pages.clear()
+    
+    def _version(self, kind):
+        if kind == POPULAR:
+            return (self.catalog.version, int(time.monotonic() // POPULAR_TTL))
+        return self.catalog.version
+    
+    def _fetch(self, kind, key):
+        if kind == CATEGORY:
+            return self.catalog.get_products_by_category(key)
+        if kind == SEARCH:
+            return search.search_products(key, SEARCH_RESULT_LIMIT)
+        raise ValueError(f"No synchronous source for listing kind {kind!r}")
+    
+    def key_for(self, kind, token):
+        """Get the category or search term behind a token, or None once it has been evicted"""
+        with self._lock:
+            entry = self._rows.get((kind, token))
+            if entry:
+                return entry[1]
+        if kind == CATEGORY:
+            # Category names can be recovered from the catalog, e.g. after a restart
+            for (category,) in self.catalog.get_all_categories():
+                if key_token(category) == token:
+                    return category
+        if kind == POPULAR:
+            return ''
+        return None
+    
+    def rows(self, kind, key):
+        """Cached listing rows for the current version, or None"""
+        version = self._version(kind)
+        with self._lock:
+            entry = self._rows.get((kind, key_token(key)))
+            if entry and entry[0] == version and entry[1] == key:
+                return entry[2]
+        return None
+    
+    def put_rows(self, kind, key, rows):
+        """Cache listing rows for the current version"""
+        with self._lock:
+            self._rows[(kind, key_token(key))] = (self._version(kind), key, list(rows or ()))
+            while len(self._rows) > self.max_pages:
+                self._rows.popitem(last=False)
+    
+    def page(self, kind, key, page=0, fetch=None):
+        """Get (text, markup_json, page_count) for one page, or None when the listing is empty.
+        
+        fetch() supplies the rows on a miss; category and search listings
+        default to the catalog and the search index.
+        """
+        if kind != POPULAR:
+            self.catalog.refresh()
+        version = self._version(kind)
+        token = key_token(key)
+        page_key = (kind, key, page, version)
+        with self._lock:
+            cached = self._pages.get(page_key)
+            if cached:
+                self._pages.move_to_end(page_key)
+                self.hits += 1
+                return cached
+        
+        rows = self.rows(kind, key)
+        if rows is None:
+            self.fetches += 1
+            self.put_rows(kind, key, fetch() if fetch else self._fetch(kind, key))
+            rows = self.rows(kind, key) or []
+        if not rows:
+            return None
+        
+        page_count = math.ceil(len(rows) / self.page_size)
+        page = min(max(page, 0), page_count - 1)
+        first = page * self.page_size
+        products = rows[first:first + self.page_size]
+        if kind == CATEGORY:
+            title = f"🏷️ **{key}** Products:"
+            entries = [views.category_entry(product) for product in products]
+        elif kind == SEARCH:
+            title = f"🔍 **Search Results for '{key}':**"
+            entries = [views.search_entry(product) for product in products]
+        else:
+            title = "⭐ **Most Popular Products:**"
+            entries = [views.popular_entry(first + i, product) for i, product in enumerate(products, 1)]
+        text, markup = views.listing_page(title, entries, products, page, page_count,
+                                          lambda number: page_callback(kind, token, number))
+        
+        rendered = (text, markup.to_json(), page_count)
+        self.renders += 1
+        with self._lock:
+            self._pages[(kind, key, page, version)] = rendered
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return rendered
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'pages': len(self._pages),
+                'listings': len(self._rows),
+                'hits': self.hits,
+                'renders': self.renders,
+                'fetches': self.fetches,
+            }
+
+# Singleton instance
+_listing_cache = None
+
+def get_listing_cache():
+    """Get singleton listing cache"""
+    global _listing_cache
+    if _listing_cache is None:
+        _listing_cache = ListingCache()
+    return _listing_cache
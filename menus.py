@@ -0,0 +1,47 @@
+"""
+Menu definitions for Grocery Store Bot
+One declarative table of reply keyboards and the action behind every button;
+the keyboard registry builds markups from it and the router dispatches on it
+"""
+
+MAIN = 'main'
+ORDER_TYPE = 'order_type'
+CART = 'cart'
+CATEGORY_FOOTER = 'category_footer'
+
+# keyboard -> rows of (button label, action); an action of None is shown but not routed
+KEYBOARDS = {
+    MAIN: (
+        (("🛒 Browse Products", 'browse'), ("🛍️ View Cart", 'view_cart')),
+        (("📦 Order Type", 'order_type'), ("📋 My Orders", 'my_orders')),
+        (("ℹ️ Help", 'help'), ("📞 Contact", 'contact')),
+    ),
+    ORDER_TYPE: (
+        (("🚚 Home Delivery", 'home_delivery'), ("🏪 Take Away", 'take_away')),
+        (("🔙 Back to Main Menu", 'main_menu'),),
+    ),
+    CART: (
+        (("➕ Add More Items", 'browse'), ("➖ Remove Items", None)),
+        (("🛒 Checkout", 'checkout'), ("🗑️ Clear Cart", 'clear_cart')),
+        (("🔙 Back to Main Menu", 'main_menu'),),
+    ),
+    # Shown under the category buttons, which are built from the catalog
+    CATEGORY_FOOTER: (
+        (("🔍 Search Products", 'search'), ("⭐ Popular Items", 'popular')),
+        (("🔙 Back to Main Menu", 'main_menu'),),
+    ),
+}
+
+CATEGORY_PREFIX = "📂 "
+
+def button_actions():
+    """Map every routed button label to its action"""
+    actions = {}
+    for rows in KEYBOARDS.values():
+        for row in rows:
+            for label, action in row:
+                if action is not None:
+                    actions[label] = action
+    return actions
+
+BUTTON_ACTIONS = button_actions()
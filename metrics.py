@@ -0,0 +1,248 @@
+"""
+Latency metrics for Grocery Store Bot
+Histograms and error counts for bot handlers and database calls, plus gauges
+read from the session store, connection pool and send queue, served in the
+Prometheus text format on a local HTTP endpoint
+"""
+
+import functools
+import inspect
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, help, label) of the instrumented histograms
+HANDLER_SECONDS = ('grocery_handler_seconds', "Bot handler latency by dispatch route", 'route')
+DB_CALL_SECONDS = ('grocery_db_call_seconds', "Database manager call latency by method", 'method')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Series:
+    __slots__ = ('counts', 'total', 'errors')
+    
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.errors = 0
+
+class Histogram:
+    """Latency histogram and error count per label value"""
+    
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, key, seconds, error=False):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets) + 1)
+            series.counts[index] += 1
+            series.total += seconds
+            if error:
+                series.errors += 1
+    
+    def call(self, key, func, *args, **kwargs):
+        """Run func and record its latency under key; coroutines are timed until they finish"""
+        start = perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.observe(key, perf_counter() - start, True)
+            raise
+        if inspect.iscoroutine(result):
+            return self._await(key, result, start)
+        self.observe(key, perf_counter() - start)
+        return result
+    
+    async def _await(self, key, coroutine, start):
+        try:
+            result = await coroutine
+        except Exception:
+            self.observe(key, perf_counter() - start, True)
+            raise
+        self.observe(key, perf_counter() - start)
+        return result
+    
+    def snapshot(self):
+        """Get {key: (bucket counts, sum, errors)}"""
+        with self._lock:
+            return {key: (list(series.counts), series.total, series.errors) for key, series in self._series.items()}
+    
+    def render(self, lines):
+        base = self.name[:-len('_seconds')] if self.name.endswith('_seconds') else self.name
+        series = sorted(self.snapshot().items())
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for key, (counts, total, errors) in series:
+            label = f'{self.label}="{_escape(key)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total!r}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        lines.append(f"# HELP {base}_errors_total Errors by {self.label}")
+        lines.append(f"# TYPE {base}_errors_total counter")
+        for key, (counts, total, errors) in series:
+            lines.append(f'{base}_errors_total{{{self.label}="{_escape(key)}"}} {errors}')
+
+class MetricsRegistry:
+    """Histograms recorded as events happen and gauges read when scraped"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._gauges = []
+    
+    def histogram(self, name, help, label, buckets=LATENCY_BUCKETS):
+        """Get or create a histogram"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(name, help, label, buckets)
+            return histogram
+    
+    def gauge(self, name, help, callback, label='stat'):
+        """Register a gauge read from callback() on each scrape.
+        
+        callback returns a number, or a stats dict whose numeric values
+        become one series each, labelled by key.
+        """
+        with self._lock:
+            self._gauges.append((name, help, callback, label))
+    
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        lines = []
+        with self._lock:
+            histograms = list(self._histograms.values())
+            gauges = list(self._gauges)
+        for histogram in histograms:
+            histogram.render(lines)
+        for name, help, callback, label in gauges:
+            try:
+                value = callback()
+            except Exception as e:
+                logger.warning(f"Metrics gauge {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for key, item in sorted(value.items()):
+                    if isinstance(item, (int, float)):
+                        lines.append(f'{name}{{{label}="{_escape(key)}"}} {_number(item)}')
+            else:
+                lines.append(f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+def instrument(obj, histogram, none_ok=(), skip=()):
+    """Time every public method of obj in histogram, keyed by method name.
+    
+    Methods are replaced on the instance, so calls between them are timed
+    too; list the inner primitives they are built on in skip to count each
+    call once. Raised exceptions count as errors, and so does a None result
+    from methods not listed in none_ok, since the database managers log and
+    swallow their errors. Generators and context managers are left alone.
+    """
+    for name, method in inspect.getmembers(type(obj), inspect.isfunction):
+        target = inspect.unwrap(method)
+        if (name.startswith('_') or name in skip or inspect.isgeneratorfunction(target)
+                or inspect.isasyncgenfunction(target)):
+            continue
+        setattr(obj, name, _timed(histogram, name, getattr(obj, name), name not in none_ok))
+
+def _timed(histogram, key, method, none_is_error):
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def timed_coroutine(*args, **kwargs):
+            start = perf_counter()
+            try:
+                result = await method(*args, **kwargs)
+            except Exception:
+                histogram.observe(key, perf_counter() - start, True)
+                raise
+            histogram.observe(key, perf_counter() - start, none_is_error and result is None)
+            return result
+        return timed_coroutine
+    
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            histogram.observe(key, perf_counter() - start, True)
+            raise
+        histogram.observe(key, perf_counter() - start, none_is_error and result is None)
+        return result
+    return timed
+
+class MetricsServer:
+    """Serves GET /metrics from a registry on a background thread"""
+    
+    def __init__(self, registry, host=None, port=None):
+        self.registry = registry
+        self.host = host or Config.METRICS_HOST
+        self.port = Config.METRICS_PORT if port is None else port
+        self._server = None
+    
+    def start(self):
+        registry = self.registry
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        return self
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# Singleton instance
+_registry = None
+
+def get_metrics():
+    """Get singleton metrics registry, or None when METRICS_PORT is not set"""
+    global _registry
+    if _registry is None and Config.METRICS_PORT:
+        _registry = MetricsRegistry()
+    return _registry
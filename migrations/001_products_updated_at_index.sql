@@ -0,0 +1,5 @@
+-- Index products.updated_at so the in-memory catalog replica can poll for
+-- changed rows without scanning the whole table
+USE grocery_store;
+
+CREATE INDEX idx_products_updated_at ON products(updated_at);
@@ -0,0 +1,22 @@
+-- Popularity aggregates replacing the live GROUP BY over order history.
+-- After applying, fill them from existing orders with:
+--   python admin.py rebuild-popularity
+USE grocery_store;
+
+CREATE TABLE IF NOT EXISTS product_popularity (
+    product_id INT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    total_sold INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    INDEX idx_popularity_rank (order_count, total_sold)
+);
+
+CREATE TABLE IF NOT EXISTS product_popularity_daily (
+    sale_date DATE NOT NULL,
+    product_id INT NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    total_sold INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, product_id),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
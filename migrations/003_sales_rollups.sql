@@ -0,0 +1,35 @@
+-- Sales rollups replacing the scans over orders behind the admin reports.
+-- After applying, fill them from existing orders with:
+--   python admin.py rebuild-sales
+USE grocery_store;
+
+CREATE TABLE IF NOT EXISTS sales_hourly (
+    sale_hour DATETIME PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    sale_date DATE PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00
+);
+
+CREATE TABLE IF NOT EXISTS customer_totals (
+    customer_id BIGINT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    total_spent DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+    last_order_date DATETIME NOT NULL,
+    FOREIGN KEY (customer_id) REFERENCES customers(telegram_id) ON DELETE CASCADE,
+    INDEX idx_customer_totals_spent (total_spent),
+    INDEX idx_customer_totals_last_order (last_order_date)
+);
+
+CREATE OR REPLACE VIEW daily_sales AS
+SELECT 
+    sale_date,
+    order_count as total_orders,
+    revenue as total_revenue,
+    revenue / order_count as average_order_value
+FROM sales_daily
+WHERE order_count > 0;
@@ -0,0 +1,7 @@
+-- Supplier SKU as the natural key for bulk catalog imports
+-- (python admin.py import-products). Existing products keep a NULL sku and
+-- are matched on id until one is assigned.
+USE grocery_store;
+
+ALTER TABLE products ADD COLUMN sku VARCHAR(64) NULL AFTER id;
+CREATE UNIQUE INDEX idx_products_sku ON products(sku);
@@ -0,0 +1,11 @@
+-- Order history reads a customer's orders newest first. With only
+-- idx_customer MySQL fetched every order of the customer and filesorted them;
+-- (customer_id, order_date) returns them already sorted, and InnoDB appends
+-- the primary key id, the tiebreak of the keyset cursor behind "older orders".
+-- delivery_address is TEXT and cannot be indexed, so only the rows of the page
+-- itself are read from the table. The new index also serves the customer
+-- foreign key, which lets idx_customer go.
+USE grocery_store;
+
+CREATE INDEX idx_orders_customer_date ON orders(customer_id, order_date);
+DROP INDEX idx_customer ON orders;
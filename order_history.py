@@ -0,0 +1,137 @@
+"""
+Order history pages for Grocery Store Bot
+Pages through a customer's orders newest first with a keyset cursor, the
+(order_date, id) of the last order shown, so every page is one index range
+read however far back it is; each customer's first page is cached rendered
+until they check out or one of their orders changes status
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from config import Config
+import views
+
+logger = logging.getLogger(__name__)
+
+ORDERS_CALLBACK_PREFIX = "orders:"
+NEWEST = "top"
+CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S'
+
+def orders_callback(cursor=None):
+    """Callback data for the page of orders before cursor, or the newest page"""
+    if cursor is None:
+        return ORDERS_CALLBACK_PREFIX + NEWEST
+    order_date, row_id = cursor
+    return f"{ORDERS_CALLBACK_PREFIX}{order_date.strftime(CURSOR_DATE_FORMAT)}:{row_id}"
+
+def parse_orders_callback(data):
+    """Get the (order_date, id) cursor from callback data; None means the newest page"""
+    value = data[len(ORDERS_CALLBACK_PREFIX):]
+    if value == NEWEST:
+        return None
+    order_date, row_id = value.split(':')
+    return datetime.strptime(order_date, CURSOR_DATE_FORMAT), int(row_id)
+
+def page_cursor(order):
+    """Cursor after an order row (order_id, total, status, order_date, order_type, delivery_address, id)"""
+    return order[3], order[6]
+
+class OrderHistory:
+    """Renders history pages and keeps an LRU of rendered first pages.
+    
+    The database managers report checkouts and status changes through
+    add_order_listener, which drops the customer's page. Changes made by
+    another process, e.g. admin.py, are not seen here, so cached pages
+    also expire after ORDER_HISTORY_TTL seconds.
+    """
+    
+    def __init__(self, page_size=None, max_users=None, ttl=None):
+        self.page_size = page_size or Config.ORDER_HISTORY_PAGE_SIZE
+        self.max_users = max_users or Config.ORDER_HISTORY_CACHE_USERS
+        self.ttl = Config.ORDER_HISTORY_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()    # customer_id -> (expires, text, markup_json)
+        self._changes = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def cached(self, customer_id):
+        """A customer's cached first page as (text, markup_json), or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pages.get(customer_id)
+            if entry is not None and entry[0] > now:
+                self._pages.move_to_end(customer_id)
+                self.hits += 1
+                return entry[1:]
+            if entry is not None:
+                del self._pages[customer_id]
+            self.misses += 1
+            return None
+    
+    def stamp(self):
+        """Invalidation count; pass it to render() so a page fetched across an invalidation is not cached"""
+        with self._lock:
+            return self._changes
+    
+    def render(self, customer_id, orders, before=None, stamp=None):
+        """Get (text, markup_json) for orders fetched with limit page_size + 1, or None if there are none.
+        
+        A first page (before is None) is cached when stamp is still current.
+        """
+        if not orders:
+            return None
+        older = page_cursor(orders[self.page_size - 1]) if len(orders) > self.page_size else None
+        text, markup = views.orders_page(orders[:self.page_size],
+                                         newest_data=orders_callback() if before is not None else None,
+                                         older_data=orders_callback(older) if older is not None else None)
+        rendered = (text, markup.to_json() if markup is not None else None)
+        
+        if before is None and stamp is not None:
+            with self._lock:
+                if stamp == self._changes:
+                    self._pages[customer_id] = (time.monotonic() + self.ttl,) + rendered
+                    self._pages.move_to_end(customer_id)
+                    while len(self._pages) > self.max_users:
+                        self._pages.popitem(last=False)
+        return rendered
+    
+    def page(self, customer_id, fetch, before=None):
+        """Get a rendered page, calling fetch(limit, before) for the orders on a miss"""
+        if before is None:
+            cached = self.cached(customer_id)
+            if cached is not None:
+                return cached
+        stamp = self.stamp()
+        return self.render(customer_id, fetch(self.page_size + 1, before), before, stamp)
+    
+    def invalidate(self, customer_id):
+        """Drop a customer's cached first page after a checkout or status change"""
+        with self._lock:
+            self._changes += 1
+            self.invalidations += 1
+            self._pages.pop(customer_id, None)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'pages': len(self._pages),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+# Singleton instance
+_order_history = None
+
+def get_order_history():
+    """Get singleton order history cache"""
+    global _order_history
+    if _order_history is None:
+        _order_history = OrderHistory()
+    return _order_history
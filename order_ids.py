@@ -0,0 +1,130 @@
+"""
+Order ID allocation for Grocery Store Bot
+Snowflake-style IDs: a millisecond timestamp, the process's worker ID and a
+per-millisecond sequence, written as 12 Crockford base32 characters. IDs are
+unique across processes with distinct ORDER_WORKER_ID values, need no
+database round trip, and sort by creation time, so new orders append to the
+end of the order_id index
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from config import Config
+
+# 0123456789 then letters without I, L, O and U; ascending in ASCII, so
+# fixed-width IDs sort like the numbers they encode
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# Letters customers may read or type in place of a digit
+READ_AS = {'O': '0', 'I': '1', 'L': '1'}
+
+EPOCH_MS = 1704067200000       # 2024-01-01T00:00:00Z
+TIMESTAMP_BITS = 41            # about 69 years of milliseconds
+WORKER_BITS = 8
+SEQUENCE_BITS = 10
+ID_LENGTH = 12                 # 59 bits in 60 bits of base32
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# How far ahead of the clock resume_after looks for IDs issued before a restart
+RESUME_HORIZON_MS = 366 * 24 * 3600 * 1000
+
+def encode(number, width=ID_LENGTH):
+    chars = []
+    for _ in range(width):
+        number, digit = divmod(number, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+def decode(text):
+    number = 0
+    for char in text:
+        number = number * 32 + ALPHABET.index(char)
+    return number
+
+def normalize_order_id(text):
+    """Clean up an order ID as typed or read out: case, dashes, spaces and look-alike letters"""
+    text = text.strip().upper().replace('-', '').replace(' ', '')
+    return ''.join(READ_AS.get(char, char) for char in text)
+
+def format_order_id(order_id):
+    """Group an ID in fours for reading aloud, e.g. 0K3M-9TQ2-04A7"""
+    return '-'.join(order_id[i:i + 4] for i in range(0, len(order_id), 4))
+
+def order_id_time(order_id):
+    """Get the UTC creation time encoded in an allocated order ID"""
+    milliseconds = decode(order_id) >> (WORKER_BITS + SEQUENCE_BITS)
+    return datetime.fromtimestamp((EPOCH_MS + milliseconds) / 1000, tz=timezone.utc)
+
+class OrderIdAllocator:
+    """Thread-safe snowflake allocator for one worker ID.
+    
+    Never waits: after 1024 IDs in one millisecond, or while the clock reads
+    earlier than the last ID, it carries on from the last timestamp, so IDs
+    keep increasing and never repeat.
+    """
+    
+    def __init__(self, worker_id=None, clock=time.time):
+        self.worker_id = Config.ORDER_WORKER_ID if worker_id is None else worker_id
+        if not 0 <= self.worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"ORDER_WORKER_ID must be between 0 and {MAX_WORKER_ID}, got {self.worker_id}")
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        self.allocated = 0
+        self.borrowed = 0
+    
+    def next_id(self):
+        with self._lock:
+            now = int(self._clock() * 1000) - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                # Sequence exhausted: take the next millisecond ahead of the clock
+                self._last_ms += 1
+                self._sequence = 0
+                self.borrowed += 1
+            self.allocated += 1
+            return encode((self._last_ms << (WORKER_BITS + SEQUENCE_BITS))
+                          | (self.worker_id << SEQUENCE_BITS) | self._sequence)
+    
+    def resume_ceiling(self):
+        """Greatest ID worth looking up for resume_after: the clock plus RESUME_HORIZON_MS"""
+        last_ms = min(int(self._clock() * 1000) - EPOCH_MS + RESUME_HORIZON_MS, (1 << TIMESTAMP_BITS) - 1)
+        return encode(((last_ms + 1) << (WORKER_BITS + SEQUENCE_BITS)) - 1)
+    
+    def resume_after(self, order_id):
+        """Carry on after the newest stored order ID, from any worker.
+        
+        The guard against going backwards lives in memory, so without this a
+        restart after borrowing ahead of the clock, or with the clock stepped
+        back, could reissue IDs. Later IDs start after that millisecond.
+        """
+        if not order_id:
+            return
+        try:
+            last_ms = decode(normalize_order_id(order_id)) >> (WORKER_BITS + SEQUENCE_BITS)
+        except ValueError:
+            return
+        with self._lock:
+            if last_ms >= self._last_ms:
+                self._last_ms = last_ms
+                self._sequence = MAX_SEQUENCE
+    
+    def stats(self):
+        return {'worker_id': self.worker_id, 'allocated': self.allocated, 'borrowed_ms': self.borrowed}
+
+# Singleton instance
+_allocator = None
+
+def get_order_ids():
+    """Get singleton order ID allocator"""
+    global _allocator
+    if _allocator is None:
+        _allocator = OrderIdAllocator()
+    return _allocator
@@ -0,0 +1,305 @@
+"""
+Outbound message scheduler for Grocery Store Bot
+Queues replies from handlers and sends them within Telegram's global and
+per-chat rate limits, honouring retry_after on 429 responses
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from telebot.apihelper import ApiTelegramException
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Lower values are sent first
+PRIORITY_HIGH = 0     # order confirmations and checkout steps
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # catalog listings, help and other bulky replies
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.5   # seconds before retrying a network error, doubled per attempt
+LATENCY_SAMPLES = 1024
+BUCKET_SWEEP_INTERVAL = 60
+
+class SendDropped(Exception):
+    """The message was not sent: shed under load, failed permanently or left unsent at shutdown"""
+
+class TokenBucket:
+    """Allows rate sends per second with bursts of up to capacity"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+    
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+    
+    def delay(self, now):
+        """Seconds until a token is available, 0 if one is"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+    
+    def take(self):
+        self.tokens -= 1
+    
+    def is_full(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class _Job:
+    __slots__ = ('method', 'args', 'kwargs', 'priority', 'future', 'enqueued', 'attempts')
+    
+    def __init__(self, method, args, kwargs, priority):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+class SendQueue:
+    """Rate-limited, prioritised sender for Bot API messages.
+    
+    Messages to one chat keep their order; across chats the waiting chat
+    whose next message has the best priority goes first. A dispatcher thread
+    takes a token from the global and the chat's bucket before handing a
+    message to a small pool of sender threads, so handler threads never
+    block on Telegram. Calls return a Future for the sent Message.
+    """
+    
+    def __init__(self, bot, global_rate=None, chat_rate=None, chat_burst=None, workers=None,
+                 max_pending=None):
+        self.bot = bot
+        self.chat_rate = chat_rate or Config.SEND_CHAT_RATE
+        self.chat_burst = chat_burst or Config.SEND_CHAT_BURST
+        self.workers = workers or Config.SEND_WORKERS
+        self.max_pending = max_pending or Config.SEND_MAX_PENDING
+        global_rate = global_rate or Config.SEND_GLOBAL_RATE
+        
+        self._cond = threading.Condition()
+        self._global = TokenBucket(global_rate, max(1, global_rate / 10), time.monotonic())
+        self._buckets = {}
+        self._chats = {}        # chat_id -> deque of jobs; present while the chat is scheduled or sending
+        self._ready = []        # heap of (priority, seq, chat_id)
+        self._delayed = []      # heap of (ready_at, priority, seq, chat_id)
+        self._seq = 0
+        self._pending = 0
+        self._in_flight = 0
+        self._closing = False
+        self._stopped = False
+        self._last_sweep = time.monotonic()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.max_depth = 0
+        
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='send')
+        self._dispatcher = threading.Thread(target=self._run, name='send-dispatcher', daemon=True)
+        self._dispatcher.start()
+    
+    def send_message(self, chat_id, text, priority=PRIORITY_NORMAL, **kwargs):
+        """Queue bot.send_message(chat_id, text, **kwargs)"""
+        return self.enqueue('send_message', chat_id, (chat_id, text), kwargs, priority)
+    
+    def reply_to(self, message, text, priority=PRIORITY_NORMAL, **kwargs):
+        """Queue a reply to message, like bot.reply_to"""
+        return self.send_message(message.chat.id, text, priority,
+                                 reply_to_message_id=message.message_id, **kwargs)
+    
+    def enqueue(self, method, chat_id, args, kwargs, priority=PRIORITY_NORMAL):
+        """Queue getattr(bot, method)(*args, **kwargs) for a chat"""
+        job = _Job(method, args, kwargs, priority)
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("Send queue is closed")
+            if self._pending >= self.max_pending and priority >= PRIORITY_LOW:
+                self.dropped += 1
+                logger.warning(f"Send queue full ({self._pending} pending), dropping {method} to chat {chat_id}")
+                job.future.set_exception(SendDropped("send queue full"))
+                return job.future
+            
+            self._pending += 1
+            self.max_depth = max(self.max_depth, self._pending)
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                self._chats[chat_id] = deque([job])
+                self._schedule(chat_id, priority)
+            else:
+                queue.append(job)
+        return job.future
+    
+    def _schedule(self, chat_id, priority, at=None):
+        self._seq += 1
+        if at is None:
+            heapq.heappush(self._ready, (priority, self._seq, chat_id))
+        else:
+            heapq.heappush(self._delayed, (at, priority, self._seq, chat_id))
+        self._cond.notify_all()
+    
+    def _bucket(self, chat_id, now):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+    
+    def _run(self):
+        """Dispatcher: hand the best ready message to a sender once both buckets allow it"""
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, priority, seq, chat_id = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (priority, seq, chat_id))
+                
+                wait = None
+                if self._ready and self._in_flight < self.workers:
+                    wait = self._global.delay(now)
+                    if wait == 0:
+                        priority, seq, chat_id = heapq.heappop(self._ready)
+                        bucket = self._bucket(chat_id, now)
+                        chat_wait = bucket.delay(now)
+                        if chat_wait > 0:
+                            heapq.heappush(self._delayed, (now + chat_wait, priority, seq, chat_id))
+                            continue
+                        self._global.take()
+                        bucket.take()
+                        job = self._chats[chat_id].popleft()
+                        self._in_flight += 1
+                        self._executor.submit(self._send, chat_id, job)
+                        continue
+                
+                if self._delayed:
+                    until_due = self._delayed[0][0] - now
+                    wait = until_due if wait is None else min(wait, until_due)
+                if now - self._last_sweep > BUCKET_SWEEP_INTERVAL:
+                    self._sweep_buckets(now)
+                self._cond.wait(wait)
+    
+    def _sweep_buckets(self, now):
+        """Forget buckets of idle chats; a full bucket is the same as a new one"""
+        self._last_sweep = now
+        for chat_id in [chat_id for chat_id, bucket in self._buckets.items()
+                        if chat_id not in self._chats and bucket.is_full(now)]:
+            del self._buckets[chat_id]
+    
+    def _send(self, chat_id, job):
+        """Sender thread: make one Bot API call and reschedule the chat"""
+        try:
+            result = getattr(self.bot, job.method)(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                self._retry(chat_id, job, retry_after, rate_limited=True)
+            else:
+                self._finish(chat_id, job, error=e)
+            return
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self._retry(chat_id, job, RETRY_BACKOFF * 2 ** job.attempts, error=e)
+            return
+        except Exception as e:
+            self._finish(chat_id, job, error=e)
+            return
+        self._finish(chat_id, job, result=result)
+    
+    def _retry(self, chat_id, job, delay, rate_limited=False, error=None):
+        with self._cond:
+            job.attempts += 1
+            if rate_limited:
+                self.rate_limited += 1
+            if job.attempts >= MAX_ATTEMPTS or self._stopped:
+                error = error or SendDropped(f"still rate limited after {job.attempts} attempts")
+            else:
+                # Put the message back at the head of its chat so order is kept
+                self.retried += 1
+                self._in_flight -= 1
+                self._chats[chat_id].appendleft(job)
+                self._schedule(chat_id, job.priority, time.monotonic() + delay)
+                logger.warning(f"Retrying {job.method} to chat {chat_id} in {delay:.1f}s "
+                               f"({'rate limited' if rate_limited else error})")
+                return
+        self._finish(chat_id, job, error=error)
+    
+    def _finish(self, chat_id, job, result=None, error=None):
+        with self._cond:
+            self._in_flight -= 1
+            self._pending -= 1
+            if error is None:
+                self.sent += 1
+                self._latencies.append(time.monotonic() - job.enqueued)
+            else:
+                self.failed += 1
+            
+            queue = self._chats[chat_id]
+            if queue:
+                self._schedule(chat_id, queue[0].priority)
+            else:
+                del self._chats[chat_id]
+            self._cond.notify_all()
+        
+        if error is None:
+            job.future.set_result(result)
+        else:
+            logger.error(f"Failed to send {job.method} to chat {chat_id}: {error}")
+            job.future.set_exception(error)
+    
+    def close(self, timeout=None):
+        """Stop accepting messages and send what is queued, for up to timeout seconds"""
+        timeout = Config.SEND_DRAIN_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._closing = True
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            
+            # Whatever is left is abandoned; messages already with a sender finish
+            unsent = [job for queue in self._chats.values() for job in queue]
+            for queue in self._chats.values():
+                queue.clear()
+            self._pending -= len(unsent)
+            self._ready.clear()
+            self._delayed.clear()
+            self._stopped = True
+            self._cond.notify_all()
+        
+        for job in unsent:
+            job.future.set_exception(SendDropped("send queue closed"))
+        if unsent:
+            logger.warning(f"Send queue closed with {len(unsent)} unsent messages")
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+        logger.info(f"Send queue stats: {self.stats()}")
+    
+    def stats(self):
+        """Queue depth, outcome counts and enqueue-to-sent latency"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            def latency(pct):
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))] * 1000
+            return {
+                'queued': self._pending - self._in_flight,
+                'in_flight': self._in_flight,
+                'chats': len(self._chats),
+                'max_depth': self.max_depth,
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'retried': self.retried,
+                'rate_limited': self.rate_limited,
+                'latency_p50_ms': latency(50),
+                'latency_p95_ms': latency(95),
+            }
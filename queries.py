@@ -0,0 +1,389 @@
+"""
+SQL statements for Grocery Store Bot
+Shared by the blocking DatabaseManager and the asyncio AsyncDatabaseManager
+so both run exactly the same queries
+
+Each statement is declared as a read (returns rows) or a write (returns a
+row count) where it is defined, so the database layers never inspect SQL
+text at run time. Statement builders are cached so equal SQL is also the
+same object, which lets prepared statements be reused per connection.
+"""
+
+from functools import lru_cache
+
+class ReadStatement(str):
+    """SQL whose result is a set of rows"""
+    returns_rows = True
+
+class WriteStatement(str):
+    """SQL whose result is an affected row count"""
+    returns_rows = False
+
+def read(sql):
+    return ReadStatement(sql)
+
+def write(sql):
+    return WriteStatement(sql)
+
+GET_PRODUCTS_BY_CATEGORY = read("""
+    SELECT id, name, price, stock, description, image_url 
+    FROM products 
+    WHERE category = %s AND stock > 0
+    ORDER BY name
+""")
+
+GET_PRODUCT_BY_ID = read("SELECT id, name, category, price, stock, description FROM products WHERE id = %s")
+
+GET_ALL_PRODUCTS = read("""
+    SELECT id, name, category, price, stock, description, image_url, updated_at
+    FROM products
+""")
+
+GET_PRODUCTS_CHANGED_SINCE = read(GET_ALL_PRODUCTS + " WHERE updated_at >= %s")
+
+GET_CATALOG_SUMMARY = read("SELECT COUNT(*), MAX(updated_at) FROM products")
+
+GET_PRODUCT_IDS = read("SELECT id FROM products")
+
+GET_ALL_CATEGORIES = read("SELECT DISTINCT category FROM products WHERE stock > 0 ORDER BY category")
+
+REGISTER_CUSTOMER = write("""
+    INSERT INTO customers (telegram_id, first_name, last_name, username, registration_date)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    first_name = VALUES(first_name),
+    last_name = VALUES(last_name),
+    username = VALUES(username),
+    last_active = CURRENT_TIMESTAMP
+""")
+
+CREATE_ORDER = write("""
+    INSERT INTO orders (order_id, customer_id, items, subtotal, delivery_fee, 
+                      total, order_type, delivery_address, phone, status, order_date)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+""")
+
+ADD_ORDER_ITEM = write("""
+    INSERT INTO order_items (order_id, product_id, quantity, unit_price, subtotal)
+    VALUES (%s, %s, %s, %s, %s)
+""")
+
+UPDATE_PRODUCT_STOCK = write("UPDATE products SET stock = stock - %s WHERE id = %s AND stock >= %s")
+
+@lru_cache(maxsize=128)
+def decrement_stock(line_count):
+    """Set-based stock decrement for line_count (id, qty) pairs; short lines are left untouched"""
+    requested = " UNION ALL ".join(["SELECT %s AS id, %s AS qty"] * line_count)
+    return write(f"""
+        UPDATE products p
+        JOIN ({requested}) req ON p.id = req.id
+        SET p.stock = p.stock - req.qty
+        WHERE p.stock >= req.qty
+    """)
+
+@lru_cache(maxsize=128)
+def get_stock_levels(id_count):
+    """Current stock of id_count products"""
+    placeholders = ", ".join(["%s"] * id_count)
+    return read(f"SELECT id, stock FROM products WHERE id IN ({placeholders})")
+
+# Bulk catalog import/export; columns in catalog_io.PRODUCT_FIELDS order
+GET_PRODUCTS_FOR_EXPORT = read("""
+    SELECT id, sku, name, category, price, stock, description, image_url
+    FROM products
+    ORDER BY id
+""")
+
+@lru_cache(maxsize=128)
+def get_products_by_keys(sku_count, id_count):
+    """Products matching any of sku_count skus or id_count ids, skus first in the parameters"""
+    conditions = []
+    if sku_count:
+        conditions.append(f"sku IN ({', '.join(['%s'] * sku_count)})")
+    if id_count:
+        conditions.append(f"id IN ({', '.join(['%s'] * id_count)})")
+    return read(f"""
+        SELECT id, sku, name, category, price, stock, description, image_url
+        FROM products
+        WHERE {' OR '.join(conditions)}
+    """)
+
+@lru_cache(maxsize=128)
+def lock_products_by_keys(sku_count, id_count):
+    """get_products_by_keys, locking the rows for the rest of the transaction"""
+    return read(get_products_by_keys(sku_count, id_count) + " FOR UPDATE")
+
+# ON DUPLICATE KEY UPDATE counts 1 per inserted row and 2 per changed row
+UPSERT_ROWS_PER_UPDATE = 2
+
+UPSERT_PRODUCT = write("""
+    INSERT INTO products (id, sku, name, category, price, stock, description, image_url)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    sku = COALESCE(VALUES(sku), sku),
+    name = VALUES(name),
+    category = VALUES(category),
+    price = VALUES(price),
+    stock = VALUES(stock),
+    description = VALUES(description),
+    image_url = VALUES(image_url)
+""")
+
+ADD_INVENTORY_LOG = write("""
+    INSERT INTO inventory_logs (product_id, action, quantity_change, previous_stock, new_stock, reason)
+    VALUES (%s, %s, %s, %s, %s, %s)
+""")
+
+# Order exports over a half-open order_date range, streamed in index order
+EXPORT_ORDERS = read("""
+    SELECT order_id, customer_id, subtotal, delivery_fee, total, order_type,
+           delivery_address, phone, status, order_date, delivery_date
+    FROM orders
+    WHERE order_date >= %s AND order_date < %s
+    ORDER BY order_date
+""")
+
+EXPORT_ORDER_ITEMS = read("""
+    SELECT oi.order_id, oi.product_id, oi.quantity, oi.unit_price, oi.subtotal, o.order_date
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.order_id
+    WHERE o.order_date >= %s AND o.order_date < %s
+    ORDER BY o.order_date, oi.id
+""")
+
+ADJUST_POPULARITY = write("""
+    INSERT INTO product_popularity (product_id, order_count, total_sold)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    order_count = order_count + VALUES(order_count),
+    total_sold = total_sold + VALUES(total_sold)
+""")
+
+ADJUST_DAILY_POPULARITY = write("""
+    INSERT INTO product_popularity_daily (sale_date, product_id, order_count, total_sold)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    order_count = order_count + VALUES(order_count),
+    total_sold = total_sold + VALUES(total_sold)
+""")
+
+# Order history pages run newest first on idx_orders_customer_date; id breaks
+# order_date ties and, with the date, is the cursor for the next page
+GET_CUSTOMER_ORDERS = read("""
+    SELECT order_id, total, status, order_date, order_type, delivery_address, id
+    FROM orders 
+    WHERE customer_id = %s 
+    ORDER BY order_date DESC, id DESC 
+    LIMIT %s
+""")
+
+GET_CUSTOMER_ORDERS_BEFORE = read("""
+    SELECT order_id, total, status, order_date, order_type, delivery_address, id
+    FROM orders 
+    WHERE customer_id = %s AND (order_date < %s OR (order_date = %s AND id < %s))
+    ORDER BY order_date DESC, id DESC 
+    LIMIT %s
+""")
+
+GET_RECENT_ORDERS = read("""
+    SELECT o.order_id, c.first_name, c.last_name, o.total,
+           o.status, o.order_type, o.order_date
+    FROM orders o
+    JOIN customers c ON o.customer_id = c.telegram_id
+    ORDER BY o.order_date DESC
+    LIMIT %s
+""")
+
+GET_ORDER_DETAILS = read("""
+    SELECT o.order_id, o.customer_id, o.items, o.subtotal, o.delivery_fee, 
+           o.total, o.order_type, o.delivery_address, o.phone, o.status, 
+           o.order_date, c.first_name, c.last_name
+    FROM orders o
+    JOIN customers c ON o.customer_id = c.telegram_id
+    WHERE o.order_id = %s
+""")
+
+# Newest allocator ID (order_ids.py) at or below a ceiling; a backward range scan of the order_id index
+GET_LATEST_ORDER_ID = read("""
+    SELECT order_id FROM orders
+    WHERE order_id <= %s AND CHAR_LENGTH(order_id) = %s
+    ORDER BY order_id DESC
+    LIMIT 1
+""")
+
+LOCK_ORDER_STATUS = read("SELECT status, order_date, customer_id, total FROM orders WHERE order_id = %s FOR UPDATE")
+
+UPDATE_ORDER_STATUS = write("UPDATE orders SET status = %s WHERE order_id = %s")
+
+GET_ORDER_LINES = read("SELECT product_id, quantity FROM order_items WHERE order_id = %s")
+
+# Admin product maintenance
+FIND_PRODUCT_BY_ID = read("SELECT id, name, category, price, stock FROM products WHERE id = %s")
+
+FIND_PRODUCTS_BY_NAME = read("SELECT id, name, category, price, stock FROM products WHERE name LIKE %s")
+
+ADD_PRODUCT = write("""
+    INSERT INTO products (name, category, price, stock, description)
+    VALUES (%s, %s, %s, %s, %s)
+""")
+
+LOCK_PRODUCT_STOCK = read("SELECT stock FROM products WHERE id = %s FOR UPDATE")
+
+SET_PRODUCT_STOCK = write("UPDATE products SET stock = %s WHERE id = %s")
+
+DELETE_PRODUCT = write("DELETE FROM products WHERE id = %s")
+
+GET_LOW_STOCK_PRODUCTS = read("SELECT id, name, category, stock FROM products WHERE stock <= %s ORDER BY stock ASC")
+
+GET_DAILY_SALES_REPORT = read("""
+    SELECT order_count as total_orders,
+           revenue as total_revenue,
+           revenue / order_count as average_order_value
+    FROM sales_daily
+    WHERE sale_date = %s AND order_count > 0
+""")
+
+GET_SALES_SUMMARY = read("""
+    SELECT COALESCE(SUM(order_count), 0) as orders,
+           COALESCE(SUM(revenue), 0) as revenue
+    FROM sales_hourly
+    WHERE sale_hour >= %s AND sale_hour < %s
+""")
+
+COUNT_CUSTOMERS = read("SELECT COUNT(*) FROM customers")
+
+COUNT_ACTIVE_CUSTOMERS = read("SELECT COUNT(*) FROM customer_totals WHERE last_order_date >= %s")
+
+GET_TOP_CUSTOMERS = read("""
+    SELECT c.first_name, c.last_name, t.order_count, t.total_spent
+    FROM customer_totals t
+    JOIN customers c ON c.telegram_id = t.customer_id
+    WHERE t.order_count > 0
+    ORDER BY t.total_spent DESC
+    LIMIT %s
+""")
+
+SEARCH_PRODUCTS = read("""
+    SELECT id, name, category, price, stock, description
+    FROM products 
+    WHERE (name LIKE %s OR description LIKE %s) AND stock > 0
+    ORDER BY name
+""")
+
+GET_POPULAR_PRODUCTS = read("""
+    SELECT p.id, p.name, p.category, p.price, p.stock,
+           pp.order_count, pp.total_sold
+    FROM product_popularity pp
+    JOIN products p ON p.id = pp.product_id
+    WHERE pp.order_count > 0
+    ORDER BY pp.order_count DESC, pp.total_sold DESC
+    LIMIT %s
+""")
+
+GET_POPULAR_PRODUCTS_SINCE = read("""
+    SELECT p.id, p.name, p.category, p.price, p.stock,
+           SUM(d.order_count) as order_count,
+           SUM(d.total_sold) as total_sold
+    FROM product_popularity_daily d
+    JOIN products p ON p.id = d.product_id
+    WHERE d.sale_date >= %s
+    GROUP BY p.id
+    HAVING order_count > 0
+    ORDER BY order_count DESC, total_sold DESC
+    LIMIT %s
+""")
+
+CLEAR_POPULARITY = write("DELETE FROM product_popularity")
+
+REBUILD_POPULARITY = write("""
+    INSERT INTO product_popularity (product_id, order_count, total_sold)
+    SELECT oi.product_id, COUNT(*), SUM(oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    WHERE o.status NOT IN ('cancelled')
+    GROUP BY oi.product_id
+""")
+
+CLEAR_DAILY_POPULARITY = write("DELETE FROM product_popularity_daily")
+
+REBUILD_DAILY_POPULARITY = write("""
+    INSERT INTO product_popularity_daily (sale_date, product_id, order_count, total_sold)
+    SELECT DATE(o.order_date), oi.product_id, COUNT(*), SUM(oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    WHERE o.status NOT IN ('cancelled')
+    GROUP BY DATE(o.order_date), oi.product_id
+""")
+
+ADJUST_SALES_HOURLY = write("""
+    INSERT INTO sales_hourly (sale_hour, order_count, revenue)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    order_count = order_count + VALUES(order_count),
+    revenue = revenue + VALUES(revenue)
+""")
+
+ADJUST_SALES_DAILY = write("""
+    INSERT INTO sales_daily (sale_date, order_count, revenue)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    order_count = order_count + VALUES(order_count),
+    revenue = revenue + VALUES(revenue)
+""")
+
+ADJUST_CUSTOMER_TOTALS = write("""
+    INSERT INTO customer_totals (customer_id, order_count, total_spent, last_order_date)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    order_count = order_count + VALUES(order_count),
+    total_spent = total_spent + VALUES(total_spent),
+    last_order_date = GREATEST(last_order_date, VALUES(last_order_date))
+""")
+
+GET_FIRST_ORDER_DATE = read("SELECT MIN(order_date) FROM orders")
+
+# Rollup rebuilds work on half-open [start, end) ranges so idx_order_date is used
+CLEAR_SALES_HOURLY_RANGE = write("DELETE FROM sales_hourly WHERE sale_hour >= %s AND sale_hour < %s")
+
+REBUILD_SALES_HOURLY_RANGE = write("""
+    INSERT INTO sales_hourly (sale_hour, order_count, revenue)
+    SELECT TIMESTAMP(DATE(order_date), MAKETIME(HOUR(order_date), 0, 0)), COUNT(*), SUM(total)
+    FROM orders
+    WHERE order_date >= %s AND order_date < %s AND status NOT IN ('cancelled')
+    GROUP BY 1
+""")
+
+CLEAR_SALES_DAILY_RANGE = write("DELETE FROM sales_daily WHERE sale_date >= %s AND sale_date < %s")
+
+REBUILD_SALES_DAILY_RANGE = write("""
+    INSERT INTO sales_daily (sale_date, order_count, revenue)
+    SELECT DATE(sale_hour), SUM(order_count), SUM(revenue)
+    FROM sales_hourly
+    WHERE sale_hour >= %s AND sale_hour < %s
+    GROUP BY 1
+""")
+
+CLEAR_CUSTOMER_TOTALS = write("DELETE FROM customer_totals")
+
+REBUILD_CUSTOMER_TOTALS = write("""
+    INSERT INTO customer_totals (customer_id, order_count, total_spent, last_order_date)
+    SELECT customer_id,
+           SUM(status <> 'cancelled'),
+           COALESCE(SUM(CASE WHEN status <> 'cancelled' THEN total END), 0),
+           MAX(order_date)
+    FROM orders
+    GROUP BY customer_id
+""")
+
+ADD_CUSTOMER_ADDRESS = write("""
+    INSERT INTO customer_addresses (customer_id, address_type, street_address, 
+                                  city, state, postal_code, is_default)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+""")
+
+GET_CUSTOMER_ADDRESSES = read("""
+    SELECT id, address_type, street_address, city, state, postal_code, is_default
+    FROM customer_addresses 
+    WHERE customer_id = %s
+    ORDER BY is_default DESC, id ASC
+""")
@@ -0,0 +1,205 @@
+"""
+Stock reservations for Grocery Store Bot
+Holds cart quantities against per-product stock counters in memory, so two
+carts in the same process can never claim the same last units; MySQL stays
+the record of sales and re-checks stock when an order is placed
+"""
+
+import logging
+import threading
+import time
+from config import Config
+from catalog import get_catalog, SYNC_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+class ReservationEngine:
+    """Per-product stock and reserved counters with per-user holds.
+    
+    Stock comes from the catalog replica and follows it through a catalog
+    listener. A user's holds expire RESERVATION_TTL seconds after their last
+    change; carts keep their items, which are held again at checkout.
+    
+    Confirmed sales stay pending, and off the available count, until a
+    catalog sync that started after the confirmation delivers the product's
+    row, since a sync already under way may still carry the old stock.
+    """
+    
+    def __init__(self, catalog=None, ttl=None):
+        self.catalog = catalog or get_catalog()
+        self.ttl = Config.RESERVATION_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._stock = {}       # product_id -> stock on hand
+        self._reserved = {}    # product_id -> quantity held across all users
+        self._holds = {}       # user_id -> ({product_id: quantity}, expires)
+        self._pending = {}     # product_id -> [(confirmed_at, quantity)] not yet seen in a sync
+        self._last_sweep = time.monotonic()
+        # A sale older than this has been through a sync that started after it
+        self.pending_horizon = 2 * Config.CATALOG_MAX_STALENESS + SYNC_OVERLAP.total_seconds()
+        
+        self.held = 0
+        self.refused = 0
+        self.expired = 0
+        self.confirmed = 0
+        
+        with self._lock:
+            for product in self.catalog.get_all_products():
+                self._stock[product[0]] = product[4]
+        self.catalog.add_listener(self._on_catalog_change)
+    
+    def _on_catalog_change(self, changed_rows, deleted_ids):
+        started = self.catalog.sync_started
+        with self._lock:
+            for product in changed_rows:
+                self._stock[product[0]] = product[4]
+                sales = self._pending.get(product[0])
+                if sales:
+                    self._set_pending(product[0], [sale for sale in sales if sale[0] > started])
+            for product_id in deleted_ids:
+                self._stock.pop(product_id, None)
+                self._pending.pop(product_id, None)
+    
+    def _set_pending(self, product_id, sales):
+        if sales:
+            self._pending[product_id] = sales
+        else:
+            self._pending.pop(product_id, None)
+    
+    def _free(self, product_id):
+        free = self._stock.get(product_id, 0) - self._reserved.get(product_id, 0)
+        for confirmed_at, quantity in self._pending.get(product_id, ()):
+            free -= quantity
+        return free
+    
+    def _release_items(self, items):
+        for product_id, quantity in items.items():
+            reserved = self._reserved.get(product_id, 0) - quantity
+            if reserved > 0:
+                self._reserved[product_id] = reserved
+            else:
+                self._reserved.pop(product_id, None)
+    
+    def _sweep(self, now):
+        self._last_sweep = now
+        expired = [user_id for user_id, (items, expires) in self._holds.items() if expires <= now]
+        for user_id in expired:
+            self._release_items(self._holds.pop(user_id)[0])
+        self.expired += len(expired)
+        cutoff = now - self.pending_horizon
+        for product_id, sales in list(self._pending.items()):
+            self._set_pending(product_id, [sale for sale in sales if sale[0] > cutoff])
+    
+    def _user_items(self, user_id, now):
+        """A user's live holds, releasing them first if they expired"""
+        hold = self._holds.get(user_id)
+        if hold is None:
+            return {}
+        items, expires = hold
+        if expires <= now:
+            del self._holds[user_id]
+            self._release_items(items)
+            self.expired += 1
+            return {}
+        return items
+    
+    def hold(self, user_id, product_id, quantity):
+        """Set a user's hold on a product to quantity.
+        
+        Returns (held, available): whether the hold was placed, and how many
+        this user could hold in total right now.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > min(self.ttl, 60):
+                self._sweep(now)
+            items = self._user_items(user_id, now)
+            current = items.get(product_id, 0)
+            available = current + max(self._free(product_id), 0)
+            if quantity > available:
+                self.refused += 1
+                return False, available
+            
+            if quantity > 0:
+                items[product_id] = quantity
+            else:
+                items.pop(product_id, None)
+            self._reserved[product_id] = self._reserved.get(product_id, 0) + quantity - current
+            if not self._reserved[product_id]:
+                del self._reserved[product_id]
+            if items:
+                self._holds[user_id] = (items, now + self.ttl)
+            else:
+                self._holds.pop(user_id, None)
+            self.held += 1
+            return True, available
+    
+    def hold_cart(self, user_id, cart):
+        """Hold every line of a cart and nothing else, e.g. at checkout after holds expired.
+        
+        Returns the lines that could not be held in full as
+        (product_id, requested, available), like DatabaseManager.place_order.
+        """
+        with self._lock:
+            hold = self._holds.get(user_id)
+            if hold is not None:
+                # Lines no longer in the cart must not be sold with it
+                dropped = {product_id: quantity for product_id, quantity in hold[0].items() if product_id not in cart}
+                for product_id in dropped:
+                    del hold[0][product_id]
+                self._release_items(dropped)
+        
+        short = []
+        for product_id, item in cart.items():
+            held, available = self.hold(user_id, product_id, item.quantity)
+            if not held:
+                short.append((product_id, item.quantity, available))
+        return short
+    
+    def release(self, user_id):
+        """Drop all of a user's holds, e.g. when the cart is cleared or the session evicted"""
+        with self._lock:
+            hold = self._holds.pop(user_id, None)
+            if hold is not None:
+                self._release_items(hold[0])
+    
+    def confirm(self, user_id):
+        """Turn a user's holds into sales once their order is placed; returns {product_id: quantity} sold"""
+        now = time.monotonic()
+        with self._lock:
+            hold = self._holds.pop(user_id, None)
+            if hold is None:
+                return {}
+            items = hold[0]
+            self._release_items(items)
+            for product_id, quantity in items.items():
+                self._pending.setdefault(product_id, []).append((now, quantity))
+            self.confirmed += 1
+            return items
+    
+    def available(self, product_id):
+        """Units of a product not held by anyone"""
+        with self._lock:
+            return max(self._free(product_id), 0)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._holds),
+                'products': len(self._reserved),
+                'units': sum(self._reserved.values()),
+                'pending_sales': sum(len(sales) for sales in self._pending.values()),
+                'held': self.held,
+                'refused': self.refused,
+                'expired': self.expired,
+                'confirmed': self.confirmed,
+            }
+
+# Singleton instance
+_reservations = None
+
+def get_reservations():
+    """Get singleton reservation engine"""
+    global _reservations
+    if _reservations is None:
+        _reservations = ReservationEngine()
+    return _reservations
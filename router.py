@@ -0,0 +1,161 @@
+"""
+Message router for Grocery Store Bot
+Dispatches each incoming message with dictionary lookups on command, exact
+button text and conversation state instead of a chain of predicates
+"""
+
+import functools
+import inspect
+import logging
+from metrics import HANDLER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Conversation states
+MAIN_MENU = "main_menu"
+BROWSING = "browsing"
+CHOOSING_ORDER_TYPE = "choosing_order_type"
+CHECKOUT = "checkout"
+PHONE_INPUT = "phone_input"
+SEARCHING = "searching"
+
+# Menu buttons work from any state, so these can always be entered
+ENTRY_STATES = frozenset({MAIN_MENU, BROWSING, CHOOSING_ORDER_TYPE, SEARCHING, CHECKOUT})
+
+# Allowed transitions: checkout asks for an address, then a phone number
+STATE_TRANSITIONS = {
+    MAIN_MENU: ENTRY_STATES,
+    BROWSING: ENTRY_STATES,
+    CHOOSING_ORDER_TYPE: ENTRY_STATES,
+    SEARCHING: ENTRY_STATES,
+    CHECKOUT: ENTRY_STATES | {PHONE_INPUT},
+    PHONE_INPUT: ENTRY_STATES,
+}
+
+def set_state(session, new_state):
+    """Move a session to a new state, falling back to the main menu on an illegal transition"""
+    allowed = STATE_TRANSITIONS.get(session.current_state, ENTRY_STATES)
+    if new_state not in allowed:
+        logger.warning(f"Illegal state transition {session.current_state} -> {new_state} "
+                       f"for user {session.user_id}, resetting to {MAIN_MENU}")
+        session.current_state = MAIN_MENU
+        return False
+    session.current_state = new_state
+    return True
+
+class Router:
+    """Resolves a message to one handler.
+    
+    Precedence: command, exact button text, text prefix, conversation state,
+    then the fallback handler. Each step is a dictionary lookup, so dispatch
+    cost does not grow with the number of menu items. With a metrics
+    registry, every dispatch is timed under its route name.
+    """
+    
+    def __init__(self, state_lookup, button_actions=None, metrics=None):
+        # state_lookup(user_id) returns the user's current state, or None
+        # without creating a session
+        self._state_lookup = state_lookup
+        # action -> button labels, from the menu table (menus.BUTTON_ACTIONS)
+        self._labels = {}
+        for label, action in (button_actions or {}).items():
+            self._labels.setdefault(action, []).append(label)
+        self._commands = {}
+        self._texts = {}
+        self._prefixes = {}
+        self._states = {}
+        self._fallback = None
+        self._latency = metrics.histogram(*HANDLER_SECONDS) if metrics is not None else None
+    
+    def _register(self, table, keys, kind):
+        def decorator(handler):
+            for key in keys:
+                table[key] = (f"{kind}:{handler.__name__}", handler)
+            return handler
+        return decorator
+    
+    def command(self, *commands):
+        """Register a handler for /commands"""
+        return self._register(self._commands, commands, 'command')
+    
+    def text(self, *texts):
+        """Register a handler for exact message texts (menu buttons)"""
+        return self._register(self._texts, texts, 'text')
+    
+    def action(self, *actions):
+        """Register a handler for every menu button mapped to these actions"""
+        labels = [label for action in actions for label in self._labels.get(action, ())]
+        if not labels:
+            raise ValueError(f"No menu buttons for actions {actions}")
+        return self.text(*labels)
+    
+    def state(self, *states):
+        """Register a handler for free text typed while in a conversation state"""
+        return self._register(self._states, states, 'state')
+    
+    def prefix(self, prefix):
+        """Register a handler for texts starting with a fixed prefix"""
+        def decorator(handler):
+            self._prefixes.setdefault(len(prefix), {})[prefix] = (f"prefix:{handler.__name__}", handler)
+            return handler
+        return decorator
+    
+    def callback(self, handler):
+        """Time a callback query handler, which telebot dispatches itself, as route callback:<name>"""
+        if self._latency is None:
+            return handler
+        route_name = f"callback:{handler.__name__}"
+        latency = self._latency
+        
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def timed_coroutine(call):
+                return await latency.call(route_name, handler, call)
+            return timed_coroutine
+        
+        @functools.wraps(handler)
+        def timed(call):
+            return latency.call(route_name, handler, call)
+        return timed
+    
+    def fallback(self, handler):
+        """Register the handler for messages nothing else matched"""
+        self._fallback = ("fallback", handler)
+        return handler
+    
+    def resolve(self, message):
+        """Get the (route, handler) pair for a message"""
+        text = message.text or ''
+        
+        if text.startswith('/'):
+            command = text[1:].split(maxsplit=1)[0].split('@')[0] if len(text) > 1 else ''
+            route = self._commands.get(command)
+            if route:
+                return route
+        
+        route = self._texts.get(text)
+        if route:
+            return route
+        
+        for length, prefixes in self._prefixes.items():
+            route = prefixes.get(text[:length])
+            if route:
+                return route
+        
+        if self._states:
+            state = self._state_lookup(message.from_user.id)
+            route = self._states.get(state)
+            if route:
+                return route
+        
+        return self._fallback
+    
+    def dispatch(self, message):
+        """Run the handler selected for a message"""
+        route = self.resolve(message)
+        if route is None:
+            return None
+        route_name, handler = route
+        if self._latency is None:
+            return handler(message)
+        return self._latency.call(route_name, handler, message)
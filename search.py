@@ -0,0 +1,226 @@
+"""
+Product search engine for Grocery Store Bot
+Tokenized inverted index with prefix and trigram (typo tolerant) matching,
+kept in step with the catalog replica
+"""
+
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import unicodedata
+from catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+def mark_ranges():
+    """Regex class ranges of the combining marks (vowel signs, viramas) that \\w leaves out"""
+    ranges = []
+    for code in range(0x300, 0x20000):
+        if unicodedata.category(chr(code))[0] == 'M':
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    return ''.join(f"\\u{start:04x}-\\u{end:04x}" if end < 0x10000 else f"\\U{start:08x}-\\U{end:08x}"
+                   for start, end in ranges)
+
+# Word characters and marks of any script, so accented and non-Latin names are indexed whole
+TOKEN_RE = re.compile(f"[\\w{mark_ranges()}]+")
+
+# Relative weight of a query token matching a document token
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.6
+
+# Field boosts: a hit in the product name outranks one in category/description
+NAME_BOOST = 2.0
+TEXT_BOOST = 1.0
+
+MAX_PREFIX_EXPANSIONS = 50
+MAX_FUZZY_EXPANSIONS = 10
+MIN_FUZZY_SIMILARITY = 0.3
+
+def tokenize(text):
+    """Split text into case-folded word tokens, composing accents first so "café" is one token however it was typed"""
+    return TOKEN_RE.findall(unicodedata.normalize('NFC', text).casefold()) if text else []
+
+def trigrams(token):
+    """Get the padded character trigrams of a token"""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """Inverted index over product name, category and description.
+    
+    Results are shaped like DatabaseManager.search_products rows:
+    (id, name, category, price, stock, description).
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._products = {}
+        self._name_postings = {}
+        self._text_postings = {}
+        self._doc_tokens = {}
+        self._vocabulary = []
+        self._trigrams = {}
+    
+    def __len__(self):
+        return len(self._products)
+    
+    def build(self, rows):
+        """Index catalog rows (id, name, category, price, stock, description, ...) from scratch"""
+        with self._lock:
+            self.__init__()
+            for row in rows:
+                self._add(row)
+            self._vocabulary.sort()
+        logger.info(f"Search index built: {len(self._products)} products, {len(self._vocabulary)} terms")
+    
+    def apply_changes(self, changed_rows, deleted_ids):
+        """Catalog listener: reindex changed rows and drop deleted ones"""
+        with self._lock:
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            for row in changed_rows:
+                self._remove(row[0])
+                self._add(row, keep_sorted=True)
+    
+    def _add(self, row, keep_sorted=False):
+        product_id, name, category, price, stock, description = row[:6]
+        self._products[product_id] = (product_id, name, category, price, stock, description)
+        
+        name_tokens = set(tokenize(name))
+        text_tokens = set(tokenize(category)) | set(tokenize(description))
+        for token in name_tokens:
+            self._add_posting(self._name_postings, token, product_id, keep_sorted)
+        for token in text_tokens:
+            self._add_posting(self._text_postings, token, product_id, keep_sorted)
+        self._doc_tokens[product_id] = (name_tokens, text_tokens)
+    
+    def _add_posting(self, postings, token, product_id, keep_sorted):
+        ids = postings.get(token)
+        if ids is None:
+            if token not in self._name_postings and token not in self._text_postings:
+                self._add_term(token, keep_sorted)
+            postings[token] = ids = set()
+        ids.add(product_id)
+    
+    def _add_term(self, token, keep_sorted):
+        if keep_sorted:
+            bisect.insort(self._vocabulary, token)
+        else:
+            self._vocabulary.append(token)
+        for gram in trigrams(token):
+            self._trigrams.setdefault(gram, set()).add(token)
+    
+    def _remove(self, product_id):
+        if self._products.pop(product_id, None) is None:
+            return
+        name_tokens, text_tokens = self._doc_tokens.pop(product_id)
+        for postings, tokens in ((self._name_postings, name_tokens), (self._text_postings, text_tokens)):
+            for token in tokens:
+                ids = postings[token]
+                ids.discard(product_id)
+                if not ids:
+                    del postings[token]
+                    if token not in self._name_postings and token not in self._text_postings:
+                        self._remove_term(token)
+    
+    def _remove_term(self, token):
+        position = bisect.bisect_left(self._vocabulary, token)
+        if position < len(self._vocabulary) and self._vocabulary[position] == token:
+            del self._vocabulary[position]
+        for gram in trigrams(token):
+            terms = self._trigrams.get(gram)
+            if terms:
+                terms.discard(token)
+                if not terms:
+                    del self._trigrams[gram]
+    
+    def _expand(self, query_token):
+        """Map a query token to (term, match weight) pairs found in the vocabulary"""
+        matches = {}
+        if query_token in self._name_postings or query_token in self._text_postings:
+            matches[query_token] = EXACT_MATCH
+        
+        if len(query_token) >= 2:
+            position = bisect.bisect_left(self._vocabulary, query_token)
+            for term in self._vocabulary[position:position + MAX_PREFIX_EXPANSIONS]:
+                if not term.startswith(query_token):
+                    break
+                matches.setdefault(term, PREFIX_MATCH)
+        
+        if not matches and len(query_token) >= 3:
+            query_grams = trigrams(query_token)
+            shared = {}
+            for gram in query_grams:
+                for term in self._trigrams.get(gram, ()):
+                    shared[term] = shared.get(term, 0) + 1
+            scored = []
+            for term, count in shared.items():
+                similarity = count / (len(query_grams) + len(trigrams(term)) - count)
+                if similarity >= MIN_FUZZY_SIMILARITY:
+                    scored.append((similarity, term))
+            scored.sort(reverse=True)
+            for similarity, term in scored[:MAX_FUZZY_EXPANSIONS]:
+                matches[term] = FUZZY_MATCH * similarity
+        
+        return matches
+    
+    def search(self, query, limit=50, in_stock_only=True):
+        """Rank products for a free-text query, best matches first"""
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+        
+        with self._lock:
+            total = len(self._products) or 1
+            scores = {}
+            hits = {}
+            for query_token in query_tokens:
+                token_scores = {}
+                for term, match_weight in self._expand(query_token).items():
+                    for postings, boost in ((self._name_postings, NAME_BOOST), (self._text_postings, TEXT_BOOST)):
+                        ids = postings.get(term)
+                        if not ids:
+                            continue
+                        weight = match_weight * boost * math.log(1 + total / len(ids))
+                        for product_id in ids:
+                            if weight > token_scores.get(product_id, 0.0):
+                                token_scores[product_id] = weight
+                for product_id, weight in token_scores.items():
+                    scores[product_id] = scores.get(product_id, 0.0) + weight
+                    hits[product_id] = hits.get(product_id, 0) + 1
+            
+            products = self._products
+            ranked = heapq.nsmallest(
+                limit,
+                (product_id for product_id in scores
+                 if not in_stock_only or products[product_id][4] > 0),
+                key=lambda product_id: (-hits[product_id], -scores[product_id], products[product_id][1])
+            )
+            return [products[product_id] for product_id in ranked]
+
+# Singleton instance
+_search_index = None
+
+def get_search_index():
+    """Get singleton search index, built from and kept in sync with the catalog replica"""
+    global _search_index
+    if _search_index is None:
+        catalog = get_catalog()
+        index = SearchIndex()
+        # Listen before the initial build so no delta is missed in between
+        catalog.add_listener(index.apply_changes)
+        index.build(catalog.get_all_products())
+        _search_index = index
+    return _search_index
+
+def search_products(search_term, limit=50):
+    """Search in-stock products, refreshing the catalog first if it is stale"""
+    get_catalog().refresh()
+    return get_search_index().search(search_term, limit)
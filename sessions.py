@@ -0,0 +1,284 @@
+"""
+User session store for Grocery Store Bot
+Bounded in-memory LRU of compact sessions with idle eviction and an
+on-disk backend, so carts survive eviction and restarts
+"""
+
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class CartItem:
+    """One cart line"""
+    __slots__ = ('name', 'price', 'quantity')
+    
+    def __init__(self, name, price, quantity=1):
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+    
+    def to_dict(self):
+        return {'name': self.name, 'price': float(self.price), 'quantity': self.quantity}
+
+def cart_to_json(cart):
+    """Serialize a cart as {product_id: {name, price, quantity}} JSON"""
+    return json.dumps({product_id: item.to_dict() for product_id, item in cart.items()})
+
+class UserSession:
+    __slots__ = ('user_id', 'cart', 'current_state', 'delivery_type', 'customer_info',
+                 'order_id', 'last_seen')
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.cart = {}
+        self.current_state = "main_menu"
+        self.delivery_type = None
+        self.customer_info = {}
+        self.order_id = None
+        self.last_seen = time.monotonic()
+    
+    def is_blank(self):
+        """True when the session holds nothing worth persisting"""
+        return (not self.cart and self.current_state == "main_menu"
+                and self.delivery_type is None and not self.customer_info)
+    
+    def to_record(self):
+        return json.dumps({
+            'cart': [[product_id, item.name, float(item.price), item.quantity]
+                     for product_id, item in self.cart.items()],
+            'state': self.current_state,
+            'delivery_type': self.delivery_type,
+            'customer_info': self.customer_info,
+            'order_id': self.order_id,
+        })
+    
+    @classmethod
+    def from_record(cls, user_id, record):
+        data = json.loads(record)
+        session = cls(user_id)
+        session.cart = {product_id: CartItem(name, price, quantity)
+                        for product_id, name, price, quantity in data['cart']}
+        session.current_state = data['state']
+        session.delivery_type = data['delivery_type']
+        session.customer_info = data['customer_info']
+        session.order_id = data['order_id']
+        return session
+    
+    def approximate_size(self):
+        """Approximate memory held by this session, in bytes"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.cart) + sys.getsizeof(self.customer_info)
+        for item in self.cart.values():
+            size += sys.getsizeof(item) + sys.getsizeof(item.name)
+        for value in self.customer_info.values():
+            size += sys.getsizeof(value)
+        return size
+
+class SqliteSessionBackend:
+    """Persists serialized sessions in a local SQLite file"""
+    
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._connection.commit()
+    
+    def load(self, user_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+    
+    def save_many(self, records):
+        """Write (user_id, record) pairs; a None record deletes the session"""
+        now = time.time()
+        saved = [(user_id, record, now) for user_id, record in records if record is not None]
+        deleted = [(user_id,) for user_id, record in records if record is None]
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)", saved)
+                self._connection.executemany("DELETE FROM sessions WHERE user_id = ?", deleted)
+    
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+class SessionStore:
+    """Bounded LRU of user sessions with idle-TTL eviction.
+    
+    Sessions handed out by get() may be changed in place by handlers, so they
+    are treated as dirty and written to the backend on the next flush, on
+    eviction and on close. Evicted sessions reload from the backend on demand.
+    """
+    
+    def __init__(self, backend=None, max_sessions=None, idle_ttl=None, flush_interval=None):
+        self.backend = backend
+        self.max_sessions = max_sessions or Config.SESSION_MAX_ACTIVE
+        self.idle_ttl = idle_ttl or Config.SESSION_IDLE_TTL
+        self.flush_interval = flush_interval or Config.SESSION_FLUSH_INTERVAL
+        self._lock = threading.RLock()
+        self._sessions = OrderedDict()
+        self._dirty = set()
+        self._eviction_listeners = []
+        self._last_flush = time.monotonic()
+        self._last_sweep = time.monotonic()
+        
+        self.hits = 0
+        self.loads = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __len__(self):
+        return len(self._sessions)
+    
+    def add_eviction_listener(self, callback):
+        """Register callback(session), called when a session leaves memory"""
+        self._eviction_listeners.append(callback)
+    
+    def _load(self, user_id):
+        """Reload a session from the backend, or None if it was never saved"""
+        if self.backend is None:
+            return None
+        try:
+            record = self.backend.load(user_id)
+            return UserSession.from_record(user_id, record) if record else None
+        except Exception as e:
+            logger.error(f"Error loading session {user_id}: {e}")
+            return None
+    
+    def peek(self, user_id):
+        """Get a session without creating one"""
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = self._load(user_id)
+                if session is not None:
+                    self.loads += 1
+                    self._insert(session)
+            return session
+    
+    def get(self, user_id):
+        """Get the session for a user, creating it on first contact"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                self.hits += 1
+                self._sessions.move_to_end(user_id)
+            else:
+                session = self._load(user_id)
+                if session is not None:
+                    self.loads += 1
+                else:
+                    self.misses += 1
+                    session = UserSession(user_id)
+                self._insert(session)
+            session.last_seen = now
+            self._dirty.add(user_id)
+            
+            if now - self._last_sweep > min(self.idle_ttl, 60):
+                self._evict_idle(now)
+            if now - self._last_flush > self.flush_interval:
+                self.flush()
+            return session
+    
+    def _insert(self, session):
+        self._sessions[session.user_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)))
+    
+    def _evict_idle(self, now):
+        self._last_sweep = now
+        # Least recently used first, so stop at the first session still active
+        for user_id, session in list(self._sessions.items()):
+            if now - session.last_seen <= self.idle_ttl:
+                break
+            self._evict(user_id)
+    
+    def _evict(self, user_id):
+        session = self._sessions.pop(user_id)
+        self.evictions += 1
+        self._persist([session])
+        self._dirty.discard(user_id)
+        for callback in self._eviction_listeners:
+            try:
+                callback(session)
+            except Exception as e:
+                logger.error(f"Session eviction listener error: {e}")
+    
+    def _persist(self, sessions):
+        if self.backend is None or not sessions:
+            return
+        try:
+            self.backend.save_many([
+                (session.user_id, None if session.is_blank() else session.to_record())
+                for session in sessions
+            ])
+        except Exception as e:
+            logger.error(f"Error saving {len(sessions)} sessions: {e}")
+    
+    def flush(self):
+        """Write sessions touched since the last flush to the backend"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            dirty = [self._sessions[user_id] for user_id in self._dirty if user_id in self._sessions]
+            self._dirty.clear()
+            self._persist(dirty)
+    
+    def close(self):
+        """Persist every in-memory session and close the backend"""
+        with self._lock:
+            self._persist(list(self._sessions.values()))
+            self._dirty.clear()
+            if self.backend is not None:
+                self.backend.close()
+    
+    def stats(self):
+        """Session counts, hit rate and approximate memory per session"""
+        with self._lock:
+            lookups = self.hits + self.loads + self.misses
+            sample = list(self._sessions.values())[-100:]
+            return {
+                'active': len(self._sessions),
+                'max_active': self.max_sessions,
+                'hits': self.hits,
+                'loads': self.loads,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_per_session': (sum(session.approximate_size() for session in sample) / len(sample)
+                                      if sample else 0),
+            }
+
+def create_backend():
+    """Build the configured session backend"""
+    if Config.SESSION_BACKEND == 'sqlite':
+        return SqliteSessionBackend(Config.SESSION_DB_PATH)
+    if Config.SESSION_BACKEND == 'memory':
+        return None
+    raise ValueError(f"Unknown SESSION_BACKEND: {Config.SESSION_BACKEND}")
+
+# Singleton instance
+_session_store = None
+
+def get_session_store():
+    """Get singleton session store"""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore(create_backend())
+    return _session_store
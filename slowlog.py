@@ -0,0 +1,267 @@
+"""
+Slow-query log for Grocery Store Bot
+Records statements that run past SLOW_QUERY_MS as JSON lines in a rotating
+file, keyed by a fingerprint of the normalized SQL and the shape of its
+parameters, with one EXPLAIN plan captured per fingerprint
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Statements MySQL can EXPLAIN without side effects worth capturing
+EXPLAINABLE = ('select', 'update', 'delete')
+
+# Frames in these files are the database layer itself, not the caller
+_LAYER_FILES = {'database.py', 'async_database.py', 'sqlite_database.py', 'slowlog.py', 'metrics.py', 'contextlib.py'}
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_WORKER_SUFFIX = re.compile(r"\.worker\d+")
+
+def normalize_sql(query):
+    """Collapse whitespace and replace literals, placeholders and value lists with ?"""
+    sql = _STRING.sub('?', query)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _VALUE_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+def _value_shape(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        # Where the wildcards sit decides whether LIKE can use an index
+        if '%' in value:
+            return ('%' if value.startswith('%') else '') + 'like' + ('%' if value.endswith('%') else '')
+        return 'str'
+    if isinstance(value, datetime):
+        return 'datetime'
+    if isinstance(value, date):
+        return 'date'
+    if isinstance(value, Decimal):
+        return 'decimal'
+    if isinstance(value, (list, tuple)):
+        return f"list[{len(value)}]"
+    return type(value).__name__
+
+def param_shape(params):
+    """Describe the types of a statement's parameters, e.g. 'int,%like%'"""
+    if not params:
+        return ''
+    if isinstance(params, dict):
+        return ','.join(f"{key}:{_value_shape(value)}" for key, value in sorted(params.items()))
+    return ','.join(_value_shape(value) for value in params)
+
+def fingerprint(sql, shape):
+    return hashlib.sha1(f"{sql}|{shape}".encode()).hexdigest()[:16]
+
+def find_caller():
+    """Get (method, caller): the database manager method and the code outside the layer that called it"""
+    frame = sys._getframe(1)
+    method = None
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        if filename not in _LAYER_FILES:
+            return method, f"{filename}:{code.co_name}:{frame.f_lineno}"
+        if (method is None and filename in ('database.py', 'async_database.py', 'sqlite_database.py')
+                and not code.co_name.startswith('_') and code.co_name not in ('execute_query', 'read_query')):
+            method = code.co_name
+        frame = frame.f_back
+    return method, None
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+class SlowQueryLog:
+    """Writes statements slower than the threshold to a rotating JSON-lines file"""
+    
+    def __init__(self, threshold_ms=None, path=None, max_bytes=None, backups=None):
+        self.threshold = (Config.SLOW_QUERY_MS if threshold_ms is None else threshold_ms) / 1000
+        self.path = path or Config.SLOW_QUERY_LOG
+        self._lock = threading.Lock()
+        self._explained = set()
+        self._handler = RotatingFileHandler(
+            self.path, encoding='utf-8',
+            maxBytes=Config.SLOW_QUERY_LOG_MAX_BYTES if max_bytes is None else max_bytes,
+            backupCount=Config.SLOW_QUERY_LOG_BACKUPS if backups is None else backups,
+        )
+        self._handler.setFormatter(logging.Formatter('%(message)s'))
+        self.recorded = 0
+        self.explained = 0
+    
+    def entry(self, query, params, seconds):
+        """Build the log entry for a statement, or None when it was fast enough"""
+        if seconds < self.threshold:
+            return None
+        sql = normalize_sql(query)
+        shape = param_shape(params)
+        method, caller = find_caller()
+        return {
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'fingerprint': fingerprint(sql, shape),
+            'duration_ms': round(seconds * 1000, 3),
+            'sql': sql,
+            'params': shape,
+            'method': method,
+            'caller': caller,
+        }
+    
+    def needs_plan(self, entry):
+        """True the first time an explainable fingerprint is seen"""
+        if not entry['sql'].lower().startswith(EXPLAINABLE):
+            return False
+        with self._lock:
+            if entry['fingerprint'] in self._explained:
+                return False
+            self._explained.add(entry['fingerprint'])
+            return True
+    
+    def write(self, entry, plan=None, error=None):
+        if plan is not None:
+            entry['explain'] = plan
+            self.explained += 1
+        if error is not None:
+            entry['explain_error'] = error
+        record = logging.LogRecord('slow_queries', logging.WARNING, self.path, 0,
+                                   json.dumps(entry, default=_json_default, ensure_ascii=False), None, None)
+        self._handler.handle(record)
+        self.recorded += 1
+    
+    def record(self, query, params, seconds, explain=None):
+        """Log a statement if it was slow, running explain() for its plan once per fingerprint"""
+        try:
+            entry = self.entry(query, params, seconds)
+            if entry is None:
+                return
+            plan = error = None
+            if explain is not None and self.needs_plan(entry):
+                try:
+                    plan = explain()
+                except Exception as e:
+                    error = str(e)
+            self.write(entry, plan, error)
+        except Exception as e:
+            logger.warning(f"Could not record slow query: {e}")
+    
+    def stats(self):
+        return {'recorded': self.recorded, 'explained': self.explained, 'threshold_ms': self.threshold * 1000}
+    
+    def close(self):
+        self._handler.close()
+
+def worker_log_path(path, index):
+    """Slow-query log of one supervisor worker; each process rotates only its own file"""
+    return f"{path}.worker{index}"
+
+def log_files(path):
+    """The log file and its rotated backups, oldest first, then those of each supervisor worker"""
+    files = _rotated_files(path)
+    for name in sorted(glob.glob(glob.escape(path) + '.worker*')):
+        if _WORKER_SUFFIX.fullmatch(name[len(path):]):
+            files += _rotated_files(name)
+    return files
+
+def _rotated_files(path):
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+    files = list(reversed(backups))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+def read_entries(path):
+    """Yield logged entries from path, its backups and the workers' logs; unreadable lines are skipped"""
+    for name in log_files(path):
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def plan_warnings(plan):
+    """Short notes on full scans, filesorts and temporary tables in an EXPLAIN plan"""
+    warnings = []
+    for step in plan or ():
+        table = step.get('table')
+        extra = step.get('Extra') or ''
+        if step.get('type') == 'ALL':
+            warnings.append(f"full scan of {table} (~{step.get('rows')} rows)")
+        elif step.get('type') == 'index' and not step.get('possible_keys'):
+            warnings.append(f"full index scan of {table}")
+        if 'filesort' in extra:
+            warnings.append(f"filesort on {table}")
+        if 'temporary' in extra:
+            warnings.append(f"temporary table for {table}")
+    return warnings
+
+def summarize(entries):
+    """Group entries by fingerprint, ranked by total time spent"""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'],
+                'sql': entry['sql'],
+                'params': entry['params'],
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'callers': {},
+                'explain': None,
+                'explain_error': None,
+                'first_seen': entry['time'],
+                'last_seen': entry['time'],
+            }
+        duration = entry['duration_ms']
+        group['count'] += 1
+        group['total_ms'] += duration
+        group['max_ms'] = max(group['max_ms'], duration)
+        group['last_seen'] = entry['time']
+        caller = entry.get('caller') or entry.get('method') or 'unknown'
+        group['callers'][caller] = group['callers'].get(caller, 0) + 1
+        if 'explain' in entry:
+            group['explain'] = entry['explain']
+        if 'explain_error' in entry:
+            group['explain_error'] = entry['explain_error']
+    
+    ranked = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+    for group in ranked:
+        group['total_ms'] = round(group['total_ms'], 3)
+        group['mean_ms'] = round(group['total_ms'] / group['count'], 3)
+        group['warnings'] = plan_warnings(group['explain'])
+    return ranked
+
+# Singleton instance
+_slow_log = None
+
+def get_slow_log():
+    """Get singleton slow-query log, or None when SLOW_QUERY_MS is not set"""
+    global _slow_log
+    if _slow_log is None and Config.SLOW_QUERY_MS > 0:
+        _slow_log = SlowQueryLog()
+    return _slow_log
@@ -0,0 +1,351 @@
+"""
+Embedded SQLite storage for Grocery Store Bot
+Implements the Storage interface on one SQLite file in WAL mode, for small
+stores and for runs without a MySQL server. Readers do not block the writer
+or each other; writes take SQLite's single write lock in turn
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from config import Config
+from slowlog import get_slow_log
+from storage import Storage
+import sqlite_queries as queries
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = Path(__file__).with_name('sqlite_schema.sql')
+SCHEMA_VERSION = 1
+CENTS = Decimal('0.01')
+
+# Values go in and come out as they do with MySQL: DATETIME to the second,
+# DECIMAL(x, 2) as Decimal, selected by declared type or a [type] column alias
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' ', timespec='seconds'))
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()).quantize(CENTS))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+
+class SQLiteDatabaseManager(Storage):
+    """Storage on an SQLite file, with one connection per thread.
+    
+    Statements run in autocommit mode, each reading the last committed
+    state. Multi-statement writes are BEGIN IMMEDIATE transactions: they
+    take the write lock before their first statement, waiting up to
+    DB_POOL_TIMEOUT seconds for it, rather than failing halfway with
+    SQLITE_BUSY when another writer got there first.
+    """
+    
+    queries = queries
+    ERRORS = (sqlite3.Error,)
+    
+    def __init__(self, path=None):
+        self.path = path or Config.SQLITE_PATH
+        self.slow_log = get_slow_log()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+        self._order_listeners = []
+        
+        # Write lock statistics
+        self.transactions = 0
+        self.rollbacks = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.connect()
+    
+    def _open(self):
+        cnx = sqlite3.connect(self.path, timeout=Config.DB_POOL_TIMEOUT, isolation_level=None,
+                              detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                              check_same_thread=False, cached_statements=Config.DB_STATEMENT_CACHE)
+        cnx.execute("PRAGMA journal_mode = WAL")
+        cnx.execute(f"PRAGMA synchronous = {Config.SQLITE_SYNCHRONOUS}")
+        cnx.execute("PRAGMA foreign_keys = ON")
+        return cnx
+    
+    def _connection(self):
+        """Get the calling thread's connection, opening it on first use"""
+        generation, cnx = getattr(self._local, 'connection', (None, None))
+        if generation != self._generation:
+            cnx = self._open()
+            with self._lock:
+                self._connections.append(cnx)
+                self._local.connection = (self._generation, cnx)
+        return cnx
+    
+    def connect(self):
+        """Open this thread's connection, creating the schema in a new database file"""
+        try:
+            cnx = self._connection()
+            if cnx.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                cnx.executescript(SCHEMA_PATH.read_text(encoding='utf-8'))
+                logger.info(f"Created the SQLite schema in {self.path}")
+            logger.info(f"Using SQLite database {self.path} in WAL mode")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error opening SQLite database {self.path}: {e}")
+            return False
+    
+    def _close_connections(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for cnx in connections:
+            try:
+                cnx.close()
+            except sqlite3.Error:
+                pass
+    
+    def reconnect(self):
+        """Close every thread's connection so each is re-opened on next use"""
+        self._close_connections()
+        return self.connect()
+    
+    def is_connected(self):
+        """Check that the database file can be read"""
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def get_pool_stats(self):
+        """Get open connections and how long transactions waited for the write lock"""
+        with self._lock:
+            return {
+                'open': len(self._connections),
+                'transactions': self.transactions,
+                'rollbacks': self.rollbacks,
+                'avg_wait_ms': (self.total_wait / self.transactions * 1000) if self.transactions else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+    
+    def add_order_listener(self, callback):
+        """Register callback(customer_id), called after a customer's order is placed or changes status"""
+        self._order_listeners.append(callback)
+    
+    def _orders_changed(self, customer_id):
+        for callback in self._order_listeners:
+            try:
+                callback(customer_id)
+            except Exception as e:
+                logger.error(f"Order listener error: {e}")
+    
+    def execute_query(self, query, params=None):
+        """Execute a query and return results"""
+        try:
+            started = time.perf_counter()
+            cursor = self._connection().execute(query, params or ())
+            try:
+                rows = getattr(query, 'returns_rows', None)
+                if rows if rows is not None else cursor.description is not None:
+                    result = cursor.fetchall()
+                else:
+                    result = cursor.rowcount
+            finally:
+                cursor.close()
+            if self.slow_log is not None:
+                # EXPLAIN QUERY PLAN output is not in the MySQL shape the slow-query report reads
+                self.slow_log.record(query, params, time.perf_counter() - started)
+            return result
+        
+        except sqlite3.Error as e:
+            logger.error(f"Database query error: {e}")
+            logger.error(f"Query: {query}")
+            logger.error(f"Params: {params}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error in execute_query: {e}")
+            return None
+    
+    def stream_query(self, query, params=None, batch_size=None):
+        """Yield a SELECT's rows in lists of up to batch_size from a connection of its own.
+        
+        The statement reads one WAL snapshot from start to finish, so orders
+        placed while it runs neither wait for it nor show up in it.
+        """
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        cnx = self._open()
+        try:
+            cursor = cnx.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except sqlite3.Error as e:
+            logger.error(f"Streaming query error: {e}")
+            logger.error(f"Query: {query}")
+            raise
+        finally:
+            cnx.close()
+    
+    @contextmanager
+    def transaction(self):
+        """Run several statements as one BEGIN IMMEDIATE transaction on this thread's connection.
+        
+        Yields (connection, cursor); commits on normal exit unless the caller
+        already committed or rolled back, and rolls back on any exception.
+        """
+        cnx = self._connection()
+        cursor = cnx.cursor()
+        started = time.perf_counter()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            wait = time.perf_counter() - started
+            with self._lock:
+                self.transactions += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            yield cnx, cursor
+            if cnx.in_transaction:
+                cnx.commit()
+        except Exception:
+            if cnx.in_transaction:
+                cnx.rollback()
+                with self._lock:
+                    self.rollbacks += 1
+            raise
+        finally:
+            cursor.close()
+    
+    def get_products_by_category(self, category):
+        """Get all products in a specific category"""
+        return self.execute_query(queries.GET_PRODUCTS_BY_CATEGORY, (category,))
+    
+    def get_product_by_id(self, product_id):
+        """Get product details by ID"""
+        result = self.execute_query(queries.GET_PRODUCT_BY_ID, (product_id,))
+        return result[0] if result else None
+    
+    def get_products_changed_since(self, since=None):
+        """Get full product rows updated at or after a timestamp (all rows when None)"""
+        if since is None:
+            return self.execute_query(queries.GET_ALL_PRODUCTS)
+        return self.execute_query(queries.GET_PRODUCTS_CHANGED_SINCE, (since,))
+    
+    def get_catalog_summary(self):
+        """Get product row count and newest update time"""
+        return self.execute_query(queries.GET_CATALOG_SUMMARY)
+    
+    def get_product_ids(self):
+        """Get the ids of every product"""
+        return self.execute_query(queries.GET_PRODUCT_IDS)
+    
+    def get_all_categories(self):
+        """Get all product categories"""
+        return self.execute_query(queries.GET_ALL_CATEGORIES)
+    
+    def find_products(self, search):
+        """Get (id, name, category, price, stock) for a product ID or products whose name contains search"""
+        if search.isdigit():
+            return self.execute_query(queries.FIND_PRODUCT_BY_ID, (int(search),))
+        return self.execute_query(queries.FIND_PRODUCTS_BY_NAME, (f"%{search}%",))
+    
+    def delete_product(self, product_id):
+        """Delete a product; returns the number of rows deleted"""
+        return self.execute_query(queries.DELETE_PRODUCT, (product_id,))
+    
+    def register_customer(self, telegram_id, first_name, last_name, username):
+        """Register a new customer or update existing one"""
+        params = (telegram_id, first_name or '', last_name or '', username or '', datetime.now())
+        return self.execute_query(queries.REGISTER_CUSTOMER, params)
+    
+    def get_products_by_keys(self, skus, ids):
+        """Get products by sku or id, as rows in PRODUCT_FIELDS order"""
+        if not skus and not ids:
+            return []
+        return self.execute_query(queries.get_products_by_keys(len(skus), len(ids)), [*skus, *ids])
+    
+    def iter_products(self, batch_size=None):
+        """Yield lists of up to batch_size products in id order"""
+        return self.stream_query(queries.GET_PRODUCTS_FOR_EXPORT, batch_size=batch_size)
+    
+    def get_customer_orders(self, telegram_id, limit=10, before=None):
+        """Get customer's order history newest first, starting after the (order_date, id) cursor before"""
+        if before is None:
+            return self.execute_query(queries.GET_CUSTOMER_ORDERS, (telegram_id, limit))
+        order_date, row_id = before
+        return self.execute_query(queries.GET_CUSTOMER_ORDERS_BEFORE,
+                                  (telegram_id, order_date, order_date, row_id, limit))
+    
+    def get_recent_orders(self, limit=10):
+        """Get the newest orders of all customers with the customer's name"""
+        return self.execute_query(queries.GET_RECENT_ORDERS, (limit,))
+    
+    def iter_orders(self, start, end, batch_size=None):
+        """Yield lists of orders placed in [start, end), in EXPORT_ORDERS column order"""
+        return self.stream_query(queries.EXPORT_ORDERS, (start, end), batch_size)
+    
+    def iter_order_items(self, start, end, batch_size=None):
+        """Yield lists of the items of orders placed in [start, end), in EXPORT_ORDER_ITEMS column order"""
+        return self.stream_query(queries.EXPORT_ORDER_ITEMS, (start, end), batch_size)
+    
+    def get_latest_order_id(self, ceiling):
+        """Get the greatest order ID as long as ceiling and not above it, or None"""
+        result = self.execute_query(queries.GET_LATEST_ORDER_ID, (ceiling, len(ceiling)))
+        return result[0][0] if result else None
+    
+    def get_order_details(self, order_id):
+        """Get detailed order information"""
+        result = self.execute_query(queries.GET_ORDER_DETAILS, (order_id,))
+        return result[0] if result else None
+    
+    def get_low_stock_products(self, threshold=10):
+        """Get products with low stock"""
+        return self.execute_query(queries.GET_LOW_STOCK_PRODUCTS, (threshold,))
+    
+    def get_daily_sales_report(self, date=None):
+        """Get daily sales report from the daily rollup"""
+        if date is None:
+            date = datetime.now().date()
+        return self.execute_query(queries.GET_DAILY_SALES_REPORT, (date,))
+    
+    def get_sales_summary(self, start, end=None):
+        """Get (orders, revenue) for the hours in [start, end); end defaults to now"""
+        end = end or datetime.now()
+        return self.execute_query(queries.GET_SALES_SUMMARY, (start, end))
+    
+    def search_products(self, search_term):
+        """Search products by name or description"""
+        search_pattern = f"%{search_term}%"
+        return self.execute_query(queries.SEARCH_PRODUCTS, (search_pattern, search_pattern))
+    
+    def get_popular_products(self, limit=10, days=None):
+        """Get most popular products from the popularity aggregates, optionally for the last N days"""
+        if days is None:
+            return self.execute_query(queries.GET_POPULAR_PRODUCTS, (limit,))
+        since = datetime.now().date() - timedelta(days=days - 1)
+        return self.execute_query(queries.GET_POPULAR_PRODUCTS_SINCE, (since, limit))
+    
+    def add_customer_address(self, telegram_id, address_data):
+        """Add customer delivery address"""
+        return self.execute_query(queries.ADD_CUSTOMER_ADDRESS, (telegram_id, *address_data))
+    
+    def get_customer_addresses(self, telegram_id):
+        """Get customer's saved addresses"""
+        return self.execute_query(queries.GET_CUSTOMER_ADDRESSES, (telegram_id,))
+    
+    def close(self):
+        """Close every thread's connection"""
+        logger.info(f"SQLite stats: {self.get_pool_stats()}")
+        self._close_connections()
+        logger.info("SQLite connections closed")
+
+# Singleton instance
+_sqlite_instance = None
+
+def get_sqlite_db():
+    """Get singleton SQLite database instance"""
+    global _sqlite_instance
+    if _sqlite_instance is None:
+        _sqlite_instance = SQLiteDatabaseManager()
+    return _sqlite_instance
@@ -0,0 +1,382 @@
+"""
+SQLite statements for Grocery Store Bot
+The queries of queries.py in SQLite's dialect, for SQLiteDatabaseManager;
+names, parameters and result columns match the MySQL statements
+
+Row locks have no SQLite equivalent: writes run in BEGIN IMMEDIATE
+transactions, which hold the database's single write lock from the start,
+so the FOR UPDATE reads are plain SELECTs. Aggregates over DATETIME and
+DECIMAL columns are tagged with a [type] column name so they come back as
+datetime and Decimal like the columns themselves.
+"""
+
+from functools import lru_cache
+from queries import read, write
+
+GET_PRODUCTS_BY_CATEGORY = read("""
+    SELECT id, name, price, stock, description, image_url
+    FROM products
+    WHERE category = ? AND stock > 0
+    ORDER BY name
+""")
+
+GET_PRODUCT_BY_ID = read("SELECT id, name, category, price, stock, description FROM products WHERE id = ?")
+
+GET_ALL_PRODUCTS = read("""
+    SELECT id, name, category, price, stock, description, image_url, updated_at
+    FROM products
+""")
+
+GET_PRODUCTS_CHANGED_SINCE = read(GET_ALL_PRODUCTS + " WHERE updated_at >= ?")
+
+GET_CATALOG_SUMMARY = read('SELECT COUNT(*), MAX(updated_at) AS "updated_at [DATETIME]" FROM products')
+
+GET_PRODUCT_IDS = read("SELECT id FROM products")
+
+GET_ALL_CATEGORIES = read("SELECT DISTINCT category FROM products WHERE stock > 0 ORDER BY category")
+
+REGISTER_CUSTOMER = write("""
+    INSERT INTO customers (telegram_id, first_name, last_name, username, registration_date)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (telegram_id) DO UPDATE SET
+    first_name = excluded.first_name,
+    last_name = excluded.last_name,
+    username = excluded.username,
+    last_active = datetime('now', 'localtime')
+""")
+
+CREATE_ORDER = write("""
+    INSERT INTO orders (order_id, customer_id, items, subtotal, delivery_fee,
+                      total, order_type, delivery_address, phone, status, order_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+""")
+
+ADD_ORDER_ITEM = write("""
+    INSERT INTO order_items (order_id, product_id, quantity, unit_price, subtotal)
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+@lru_cache(maxsize=128)
+def decrement_stock(line_count):
+    """Set-based stock decrement for line_count (id, qty) pairs; short lines are left untouched"""
+    requested = " UNION ALL ".join(["SELECT ? AS id, ? AS qty"] * line_count)
+    return write(f"""
+        UPDATE products
+        SET stock = stock - req.qty
+        FROM ({requested}) req
+        WHERE products.id = req.id AND products.stock >= req.qty
+    """)
+
+@lru_cache(maxsize=128)
+def get_stock_levels(id_count):
+    """Current stock of id_count products"""
+    placeholders = ", ".join(["?"] * id_count)
+    return read(f"SELECT id, stock FROM products WHERE id IN ({placeholders})")
+
+# Bulk catalog import/export; columns in catalog_io.PRODUCT_FIELDS order
+GET_PRODUCTS_FOR_EXPORT = read("""
+    SELECT id, sku, name, category, price, stock, description, image_url
+    FROM products
+    ORDER BY id
+""")
+
+@lru_cache(maxsize=128)
+def get_products_by_keys(sku_count, id_count):
+    """Products matching any of sku_count skus or id_count ids, skus first in the parameters"""
+    conditions = []
+    if sku_count:
+        conditions.append(f"sku IN ({', '.join(['?'] * sku_count)})")
+    if id_count:
+        conditions.append(f"id IN ({', '.join(['?'] * id_count)})")
+    return read(f"""
+        SELECT id, sku, name, category, price, stock, description, image_url
+        FROM products
+        WHERE {' OR '.join(conditions)}
+    """)
+
+# A plain SELECT, like the other FOR UPDATE reads
+lock_products_by_keys = get_products_by_keys
+
+# The upsert skips unchanged rows, so inserted and changed rows count 1 each
+UPSERT_ROWS_PER_UPDATE = 1
+
+# A row matches on sku or on id, as with MySQL's ON DUPLICATE KEY. Unchanged
+# rows are not updated, so, as in MySQL, they keep their updated_at and do
+# not count towards the row count
+_UPSERT_PRODUCT_SET = """
+    sku = COALESCE(excluded.sku, sku),
+    name = excluded.name,
+    category = excluded.category,
+    price = excluded.price,
+    stock = excluded.stock,
+    description = excluded.description,
+    image_url = excluded.image_url
+    WHERE (COALESCE(excluded.sku, sku), excluded.name, excluded.category, excluded.price, excluded.stock,
+           excluded.description, excluded.image_url)
+          IS NOT (sku, name, category, price, stock, description, image_url)
+"""
+
+UPSERT_PRODUCT = write(f"""
+    INSERT INTO products (id, sku, name, category, price, stock, description, image_url)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (sku) DO UPDATE SET {_UPSERT_PRODUCT_SET}
+    ON CONFLICT (id) DO UPDATE SET {_UPSERT_PRODUCT_SET}
+""")
+
+ADD_INVENTORY_LOG = write("""
+    INSERT INTO inventory_logs (product_id, action, quantity_change, previous_stock, new_stock, reason)
+    VALUES (?, ?, ?, ?, ?, ?)
+""")
+
+# Order exports over a half-open order_date range, streamed in index order
+EXPORT_ORDERS = read("""
+    SELECT order_id, customer_id, subtotal, delivery_fee, total, order_type,
+           delivery_address, phone, status, order_date, delivery_date
+    FROM orders
+    WHERE order_date >= ? AND order_date < ?
+    ORDER BY order_date
+""")
+
+EXPORT_ORDER_ITEMS = read("""
+    SELECT oi.order_id, oi.product_id, oi.quantity, oi.unit_price, oi.subtotal, o.order_date
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.order_id
+    WHERE o.order_date >= ? AND o.order_date < ?
+    ORDER BY o.order_date, oi.id
+""")
+
+ADJUST_POPULARITY = write("""
+    INSERT INTO product_popularity (product_id, order_count, total_sold)
+    VALUES (?, ?, ?)
+    ON CONFLICT (product_id) DO UPDATE SET
+    order_count = order_count + excluded.order_count,
+    total_sold = total_sold + excluded.total_sold
+""")
+
+ADJUST_DAILY_POPULARITY = write("""
+    INSERT INTO product_popularity_daily (sale_date, product_id, order_count, total_sold)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (sale_date, product_id) DO UPDATE SET
+    order_count = order_count + excluded.order_count,
+    total_sold = total_sold + excluded.total_sold
+""")
+
+# Order history pages run newest first on idx_orders_customer_date; id breaks
+# order_date ties and, with the date, is the cursor for the next page
+GET_CUSTOMER_ORDERS = read("""
+    SELECT order_id, total, status, order_date, order_type, delivery_address, id
+    FROM orders
+    WHERE customer_id = ?
+    ORDER BY order_date DESC, id DESC
+    LIMIT ?
+""")
+
+GET_CUSTOMER_ORDERS_BEFORE = read("""
+    SELECT order_id, total, status, order_date, order_type, delivery_address, id
+    FROM orders
+    WHERE customer_id = ? AND (order_date < ? OR (order_date = ? AND id < ?))
+    ORDER BY order_date DESC, id DESC
+    LIMIT ?
+""")
+
+GET_RECENT_ORDERS = read("""
+    SELECT o.order_id, c.first_name, c.last_name, o.total,
+           o.status, o.order_type, o.order_date
+    FROM orders o
+    JOIN customers c ON o.customer_id = c.telegram_id
+    ORDER BY o.order_date DESC
+    LIMIT ?
+""")
+
+GET_ORDER_DETAILS = read("""
+    SELECT o.order_id, o.customer_id, o.items, o.subtotal, o.delivery_fee,
+           o.total, o.order_type, o.delivery_address, o.phone, o.status,
+           o.order_date, c.first_name, c.last_name
+    FROM orders o
+    JOIN customers c ON o.customer_id = c.telegram_id
+    WHERE o.order_id = ?
+""")
+
+GET_LATEST_ORDER_ID = read("""
+    SELECT order_id FROM orders
+    WHERE order_id <= ? AND length(order_id) = ?
+    ORDER BY order_id DESC
+    LIMIT 1
+""")
+
+LOCK_ORDER_STATUS = read("SELECT status, order_date, customer_id, total FROM orders WHERE order_id = ?")
+
+UPDATE_ORDER_STATUS = write("UPDATE orders SET status = ? WHERE order_id = ?")
+
+GET_ORDER_LINES = read("SELECT product_id, quantity FROM order_items WHERE order_id = ?")
+
+# Admin product maintenance
+FIND_PRODUCT_BY_ID = read("SELECT id, name, category, price, stock FROM products WHERE id = ?")
+
+FIND_PRODUCTS_BY_NAME = read("SELECT id, name, category, price, stock FROM products WHERE name LIKE ?")
+
+ADD_PRODUCT = write("""
+    INSERT INTO products (name, category, price, stock, description)
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+LOCK_PRODUCT_STOCK = read("SELECT stock FROM products WHERE id = ?")
+
+SET_PRODUCT_STOCK = write("UPDATE products SET stock = ? WHERE id = ?")
+
+DELETE_PRODUCT = write("DELETE FROM products WHERE id = ?")
+
+GET_LOW_STOCK_PRODUCTS = read("SELECT id, name, category, stock FROM products WHERE stock <= ? ORDER BY stock ASC")
+
+GET_DAILY_SALES_REPORT = read("""
+    SELECT order_count as total_orders,
+           revenue as total_revenue,
+           revenue / order_count as "average_order_value [DECIMAL]"
+    FROM sales_daily
+    WHERE sale_date = ? AND order_count > 0
+""")
+
+GET_SALES_SUMMARY = read("""
+    SELECT COALESCE(SUM(order_count), 0) as orders,
+           COALESCE(SUM(revenue), 0) as "revenue [DECIMAL]"
+    FROM sales_hourly
+    WHERE sale_hour >= ? AND sale_hour < ?
+""")
+
+COUNT_CUSTOMERS = read("SELECT COUNT(*) FROM customers")
+
+COUNT_ACTIVE_CUSTOMERS = read("SELECT COUNT(*) FROM customer_totals WHERE last_order_date >= ?")
+
+GET_TOP_CUSTOMERS = read("""
+    SELECT c.first_name, c.last_name, t.order_count, t.total_spent
+    FROM customer_totals t
+    JOIN customers c ON c.telegram_id = t.customer_id
+    WHERE t.order_count > 0
+    ORDER BY t.total_spent DESC
+    LIMIT ?
+""")
+
+SEARCH_PRODUCTS = read("""
+    SELECT id, name, category, price, stock, description
+    FROM products
+    WHERE (name LIKE ? OR description LIKE ?) AND stock > 0
+    ORDER BY name
+""")
+
+GET_POPULAR_PRODUCTS = read("""
+    SELECT p.id, p.name, p.category, p.price, p.stock,
+           pp.order_count, pp.total_sold
+    FROM product_popularity pp
+    JOIN products p ON p.id = pp.product_id
+    WHERE pp.order_count > 0
+    ORDER BY pp.order_count DESC, pp.total_sold DESC
+    LIMIT ?
+""")
+
+GET_POPULAR_PRODUCTS_SINCE = read("""
+    SELECT p.id, p.name, p.category, p.price, p.stock,
+           SUM(d.order_count) as order_count,
+           SUM(d.total_sold) as total_sold
+    FROM product_popularity_daily d
+    JOIN products p ON p.id = d.product_id
+    WHERE d.sale_date >= ?
+    GROUP BY p.id
+    HAVING SUM(d.order_count) > 0
+    ORDER BY order_count DESC, total_sold DESC
+    LIMIT ?
+""")
+
+CLEAR_POPULARITY = write("DELETE FROM product_popularity")
+
+REBUILD_POPULARITY = write("""
+    INSERT INTO product_popularity (product_id, order_count, total_sold)
+    SELECT oi.product_id, COUNT(*), SUM(oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    WHERE o.status NOT IN ('cancelled')
+    GROUP BY oi.product_id
+""")
+
+CLEAR_DAILY_POPULARITY = write("DELETE FROM product_popularity_daily")
+
+REBUILD_DAILY_POPULARITY = write("""
+    INSERT INTO product_popularity_daily (sale_date, product_id, order_count, total_sold)
+    SELECT DATE(o.order_date), oi.product_id, COUNT(*), SUM(oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    WHERE o.status NOT IN ('cancelled')
+    GROUP BY DATE(o.order_date), oi.product_id
+""")
+
+ADJUST_SALES_HOURLY = write("""
+    INSERT INTO sales_hourly (sale_hour, order_count, revenue)
+    VALUES (?, ?, ?)
+    ON CONFLICT (sale_hour) DO UPDATE SET
+    order_count = order_count + excluded.order_count,
+    revenue = revenue + excluded.revenue
+""")
+
+ADJUST_SALES_DAILY = write("""
+    INSERT INTO sales_daily (sale_date, order_count, revenue)
+    VALUES (?, ?, ?)
+    ON CONFLICT (sale_date) DO UPDATE SET
+    order_count = order_count + excluded.order_count,
+    revenue = revenue + excluded.revenue
+""")
+
+ADJUST_CUSTOMER_TOTALS = write("""
+    INSERT INTO customer_totals (customer_id, order_count, total_spent, last_order_date)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (customer_id) DO UPDATE SET
+    order_count = order_count + excluded.order_count,
+    total_spent = total_spent + excluded.total_spent,
+    last_order_date = MAX(last_order_date, excluded.last_order_date)
+""")
+
+GET_FIRST_ORDER_DATE = read('SELECT MIN(order_date) AS "order_date [DATETIME]" FROM orders')
+
+# Rollup rebuilds work on half-open [start, end) ranges so idx_order_date is used
+CLEAR_SALES_HOURLY_RANGE = write("DELETE FROM sales_hourly WHERE sale_hour >= ? AND sale_hour < ?")
+
+REBUILD_SALES_HOURLY_RANGE = write("""
+    INSERT INTO sales_hourly (sale_hour, order_count, revenue)
+    SELECT strftime('%Y-%m-%d %H:00:00', order_date), COUNT(*), SUM(total)
+    FROM orders
+    WHERE order_date >= ? AND order_date < ? AND status NOT IN ('cancelled')
+    GROUP BY 1
+""")
+
+CLEAR_SALES_DAILY_RANGE = write("DELETE FROM sales_daily WHERE sale_date >= ? AND sale_date < ?")
+
+REBUILD_SALES_DAILY_RANGE = write("""
+    INSERT INTO sales_daily (sale_date, order_count, revenue)
+    SELECT DATE(sale_hour), SUM(order_count), SUM(revenue)
+    FROM sales_hourly
+    WHERE sale_hour >= ? AND sale_hour < ?
+    GROUP BY 1
+""")
+
+CLEAR_CUSTOMER_TOTALS = write("DELETE FROM customer_totals")
+
+REBUILD_CUSTOMER_TOTALS = write("""
+    INSERT INTO customer_totals (customer_id, order_count, total_spent, last_order_date)
+    SELECT customer_id,
+           SUM(status <> 'cancelled'),
+           COALESCE(SUM(CASE WHEN status <> 'cancelled' THEN total END), 0),
+           MAX(order_date)
+    FROM orders
+    GROUP BY customer_id
+""")
+
+ADD_CUSTOMER_ADDRESS = write("""
+    INSERT INTO customer_addresses (customer_id, address_type, street_address,
+                                  city, state, postal_code, is_default)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+""")
+
+GET_CUSTOMER_ADDRESSES = read("""
+    SELECT id, address_type, street_address, city, state, postal_code, is_default
+    FROM customer_addresses
+    WHERE customer_id = ?
+    ORDER BY is_default DESC, id ASC
+""")
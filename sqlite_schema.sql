@@ -0,0 +1,294 @@
+-- Grocery Store Bot SQLite Schema
+-- The tables, indexes and sample data of database_schema.sql for the embedded
+-- SQLite backend (DB_BACKEND=sqlite). SQLiteDatabaseManager runs it when it
+-- opens a database file whose user_version is 0; every statement is safe to
+-- run again, so processes opening a new file at the same time do no harm.
+--
+-- Differences from MySQL:
+-- * DATETIME and DECIMAL columns hold text and numbers; the bot converts them
+--   to datetime and Decimal by their declared type
+-- * ENUM columns are TEXT with CHECK constraints
+-- * MySQL indexes foreign key columns implicitly; here they are declared
+-- * products.updated_at is bumped by a trigger instead of ON UPDATE
+-- * the rollup tables are WITHOUT ROWID, clustered on their primary key
+-- * there is no UpdateProductStock procedure; admin.py sets stock itself
+
+-- Customers table
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_id BIGINT UNIQUE NOT NULL,
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    username VARCHAR(100),
+    phone VARCHAR(20),
+    registration_date DATETIME DEFAULT (datetime('now', 'localtime')),
+    last_active DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Product categories table
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) UNIQUE NOT NULL,
+    description TEXT,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Products table
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sku VARCHAR(64),
+    name VARCHAR(200) NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    stock INT DEFAULT 0,
+    description TEXT,
+    image_url VARCHAR(500),
+    created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    updated_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_products_sku ON products(sku);
+CREATE INDEX IF NOT EXISTS idx_category ON products(category);
+CREATE INDEX IF NOT EXISTS idx_stock ON products(stock);
+CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
+CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products(updated_at);
+
+-- Catalog sync reads rows changed since its last watermark
+CREATE TRIGGER IF NOT EXISTS products_updated_at
+AFTER UPDATE ON products
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE products SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
+
+-- Orders table
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id VARCHAR(20) UNIQUE NOT NULL,
+    customer_id BIGINT NOT NULL REFERENCES customers(telegram_id) ON DELETE CASCADE,
+    items TEXT NOT NULL,
+    subtotal DECIMAL(10, 2) NOT NULL,
+    delivery_fee DECIMAL(10, 2) DEFAULT 0.00,
+    total DECIMAL(10, 2) NOT NULL,
+    order_type TEXT NOT NULL CHECK (order_type IN ('delivery', 'takeaway')),
+    delivery_address TEXT,
+    phone VARCHAR(20),
+    status TEXT DEFAULT 'pending'
+        CHECK (status IN ('pending', 'confirmed', 'preparing', 'ready', 'delivered', 'cancelled')),
+    order_date DATETIME DEFAULT (datetime('now', 'localtime')),
+    delivery_date DATETIME,
+    notes TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_orders_customer_date ON orders(customer_id, order_date);
+CREATE INDEX IF NOT EXISTS idx_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_order_date ON orders(order_date);
+
+-- Order items table (for detailed tracking)
+CREATE TABLE IF NOT EXISTS order_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id VARCHAR(20) NOT NULL REFERENCES orders(order_id) ON DELETE CASCADE,
+    product_id INT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    quantity INT NOT NULL,
+    unit_price DECIMAL(10, 2) NOT NULL,
+    subtotal DECIMAL(10, 2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id);
+
+-- Sales table for analytics
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id VARCHAR(20) NOT NULL REFERENCES orders(order_id) ON DELETE CASCADE,
+    product_id INT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    quantity_sold INT NOT NULL,
+    revenue DECIMAL(10, 2) NOT NULL,
+    sale_date DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_sale_date ON sales(sale_date);
+CREATE INDEX IF NOT EXISTS idx_product ON sales(product_id);
+CREATE INDEX IF NOT EXISTS idx_sales_order ON sales(order_id);
+
+-- Inventory tracking table
+CREATE TABLE IF NOT EXISTS inventory_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    action TEXT NOT NULL CHECK (action IN ('restock', 'sale', 'adjustment')),
+    quantity_change INT NOT NULL,
+    previous_stock INT NOT NULL,
+    new_stock INT NOT NULL,
+    reason VARCHAR(200),
+    created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_logs_product ON inventory_logs(product_id);
+
+-- Customer addresses table
+CREATE TABLE IF NOT EXISTS customer_addresses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id BIGINT NOT NULL REFERENCES customers(telegram_id) ON DELETE CASCADE,
+    address_type TEXT DEFAULT 'home' CHECK (address_type IN ('home', 'work', 'other')),
+    street_address TEXT NOT NULL,
+    city VARCHAR(100),
+    state VARCHAR(100),
+    postal_code VARCHAR(20),
+    is_default BOOLEAN DEFAULT FALSE,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_customer_addresses_customer ON customer_addresses(customer_id);
+
+-- Popularity aggregate, maintained at checkout and reversed on cancellation
+CREATE TABLE IF NOT EXISTS product_popularity (
+    product_id INT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    order_count INT NOT NULL DEFAULT 0,
+    total_sold INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT (datetime('now', 'localtime'))
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_popularity_rank ON product_popularity(order_count, total_sold);
+
+-- Per-day popularity for windowed rankings (last 7 / 30 days)
+CREATE TABLE IF NOT EXISTS product_popularity_daily (
+    sale_date DATE NOT NULL,
+    product_id INT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    order_count INT NOT NULL DEFAULT 0,
+    total_sold INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, product_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_popularity_daily_product ON product_popularity_daily(product_id);
+
+-- Sales rollups, maintained at checkout and adjusted on cancellation
+CREATE TABLE IF NOT EXISTS sales_hourly (
+    sale_hour DATETIME PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    sale_date DATE PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0.00
+) WITHOUT ROWID;
+
+-- Per-customer order totals for customer statistics
+CREATE TABLE IF NOT EXISTS customer_totals (
+    customer_id BIGINT PRIMARY KEY REFERENCES customers(telegram_id) ON DELETE CASCADE,
+    order_count INT NOT NULL DEFAULT 0,
+    total_spent DECIMAL(14, 2) NOT NULL DEFAULT 0.00,
+    last_order_date DATETIME NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_customer_totals_spent ON customer_totals(total_spent);
+CREATE INDEX IF NOT EXISTS idx_customer_totals_last_order ON customer_totals(last_order_date);
+
+-- Promotions table
+CREATE TABLE IF NOT EXISTS promotions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(200) NOT NULL,
+    description TEXT,
+    discount_type TEXT NOT NULL CHECK (discount_type IN ('percentage', 'fixed')),
+    discount_value DECIMAL(10, 2) NOT NULL,
+    min_order_amount DECIMAL(10, 2) DEFAULT 0.00,
+    start_date DATETIME NOT NULL,
+    end_date DATETIME NOT NULL,
+    is_active BOOLEAN DEFAULT TRUE,
+    usage_limit INT DEFAULT NULL,
+    used_count INT DEFAULT 0,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Views for analytics
+CREATE VIEW IF NOT EXISTS daily_sales AS
+SELECT
+    sale_date,
+    order_count as total_orders,
+    revenue as total_revenue,
+    revenue / order_count as average_order_value
+FROM sales_daily
+WHERE order_count > 0;
+
+CREATE VIEW IF NOT EXISTS popular_products AS
+SELECT
+    p.name,
+    p.category,
+    COUNT(oi.product_id) as times_ordered,
+    SUM(oi.quantity) as total_quantity_sold,
+    SUM(oi.subtotal) as total_revenue
+FROM products p
+JOIN order_items oi ON p.id = oi.product_id
+JOIN orders o ON oi.order_id = o.order_id
+WHERE o.status NOT IN ('cancelled')
+GROUP BY p.id, p.name, p.category
+ORDER BY times_ordered DESC;
+
+-- Insert sample categories
+INSERT OR IGNORE INTO categories (name, description) VALUES
+('Fruits & Vegetables', 'Fresh fruits and vegetables'),
+('Dairy & Eggs', 'Milk, cheese, yogurt, and eggs'),
+('Meat & Seafood', 'Fresh meat and seafood products'),
+('Bakery', 'Bread, pastries, and baked goods'),
+('Pantry Staples', 'Rice, pasta, canned goods, and dry goods'),
+('Beverages', 'Soft drinks, juices, and water'),
+('Snacks', 'Chips, crackers, and snack foods'),
+('Frozen Foods', 'Frozen vegetables, meals, and ice cream'),
+('Personal Care', 'Toiletries and personal hygiene products'),
+('Household', 'Cleaning supplies and household items');
+
+-- Insert sample products into an empty catalog
+INSERT INTO products (name, category, price, stock, description)
+SELECT * FROM (VALUES
+-- Fruits & Vegetables
+('Fresh Bananas (1 lb)', 'Fruits & Vegetables', 1.29, 50, 'Fresh ripe bananas'),
+('Red Apples (1 lb)', 'Fruits & Vegetables', 2.49, 40, 'Crisp red apples'),
+('Carrots (1 lb)', 'Fruits & Vegetables', 1.99, 30, 'Fresh orange carrots'),
+('Tomatoes (1 lb)', 'Fruits & Vegetables', 3.49, 25, 'Ripe red tomatoes'),
+('Spinach (1 bunch)', 'Fruits & Vegetables', 2.99, 20, 'Fresh spinach leaves'),
+
+-- Dairy & Eggs
+('Whole Milk (1 gallon)', 'Dairy & Eggs', 3.99, 35, 'Fresh whole milk'),
+('Large Eggs (dozen)', 'Dairy & Eggs', 4.49, 40, 'Grade A large eggs'),
+('Cheddar Cheese (8 oz)', 'Dairy & Eggs', 4.99, 25, 'Sharp cheddar cheese'),
+('Greek Yogurt (32 oz)', 'Dairy & Eggs', 5.99, 20, 'Plain Greek yogurt'),
+
+-- Meat & Seafood
+('Ground Beef (1 lb)', 'Meat & Seafood', 6.99, 15, 'Fresh ground beef 80/20'),
+('Chicken Breast (1 lb)', 'Meat & Seafood', 7.99, 20, 'Boneless chicken breast'),
+('Salmon Fillet (1 lb)', 'Meat & Seafood', 12.99, 10, 'Fresh Atlantic salmon'),
+
+-- Bakery
+('White Bread (1 loaf)', 'Bakery', 2.99, 30, 'Fresh white bread'),
+('Croissants (4 pack)', 'Bakery', 4.99, 15, 'Buttery croissants'),
+
+-- Pantry Staples
+('Jasmine Rice (2 lb)', 'Pantry Staples', 3.99, 40, 'Premium jasmine rice'),
+('Spaghetti Pasta (1 lb)', 'Pantry Staples', 1.99, 50, 'Italian spaghetti pasta'),
+('Olive Oil (500ml)', 'Pantry Staples', 8.99, 20, 'Extra virgin olive oil'),
+
+-- Beverages
+('Coca Cola (12 pack)', 'Beverages', 5.99, 30, '12 pack of Coca Cola cans'),
+('Orange Juice (64 oz)', 'Beverages', 4.49, 25, 'Fresh orange juice'),
+('Bottled Water (24 pack)', 'Beverages', 4.99, 40, '24 pack of bottled water'),
+
+-- Snacks
+('Potato Chips (family size)', 'Snacks', 3.99, 35, 'Crispy potato chips'),
+('Mixed Nuts (1 lb)', 'Snacks', 7.99, 20, 'Assorted mixed nuts'),
+
+-- Frozen Foods
+('Frozen Pizza (12 inch)', 'Frozen Foods', 6.99, 15, 'Pepperoni pizza'),
+('Ice Cream (1.5 qt)', 'Frozen Foods', 5.99, 20, 'Vanilla ice cream'),
+
+-- Personal Care
+('Shampoo (16 oz)', 'Personal Care', 6.99, 25, 'Moisturizing shampoo'),
+('Toothpaste (4 oz)', 'Personal Care', 3.49, 30, 'Fluoride toothpaste'),
+
+-- Household
+('Dish Soap (32 oz)', 'Household', 4.99, 20, 'Grease-cutting dish soap'),
+('Paper Towels (8 rolls)', 'Household', 12.99, 15, 'Absorbent paper towels')
+)
+WHERE NOT EXISTS (SELECT 1 FROM products);
+
+PRAGMA user_version = 1;
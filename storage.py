@@ -0,0 +1,323 @@
+"""
+Storage interface for Grocery Store Bot
+The methods Bot.py, admin.py, the catalog replica and exports use, implemented
+by DatabaseManager on MySQL and SQLiteDatabaseManager on an embedded SQLite
+file; DB_BACKEND picks one
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from config import Config
+import transactions
+from transactions import run, run_reads, rollup_days, first_rollup_day
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('mysql', 'sqlite')
+
+class Storage(ABC):
+    """Store data access, independent of the database behind it.
+    
+    Rows come back as tuples in the column order of the MySQL queries, with
+    prices as Decimal and dates as datetime, whichever backend is used.
+    Query methods log their errors and return None. A backend missing any
+    abstract method fails when it is instantiated.
+    
+    Multi-statement writes are implemented here once, from transactions.py;
+    a backend supplies its dialect's query module, the errors its driver
+    raises and the execute_query and transaction primitives.
+    """
+    
+    # Methods for which None is a normal result rather than a logged error, for metrics
+    NONE_RESULTS = frozenset({'get_product_by_id', 'get_order_details', 'get_latest_order_id', 'add_order_items',
+                              'add_order_listener', 'get_replica_stats', 'close'})
+    # Query primitives the other methods call; left untimed so metrics count each DB call once
+    UNTIMED = frozenset({'execute_query', 'read_query', 'stream_query'})
+    
+    # Read replicas (see replicas.py); None when every read goes to one database
+    replicas = None
+    
+    # The dialect's statements (queries or sqlite_queries) and the driver's exception types
+    queries = None
+    ERRORS = ()
+    
+    @abstractmethod
+    def execute_query(self, query, params=None):
+        """Run one statement; returns the rows of a read or the row count of a write, or None on error"""
+        raise NotImplementedError
+    
+    def read_query(self, query, params=None, customer_id=None):
+        """Run a read that a replica may answer; without replicas, the same as execute_query"""
+        return self.execute_query(query, params)
+    
+    @abstractmethod
+    def transaction(self):
+        """Context manager running its statements as one transaction; yields (connection, cursor)"""
+        raise NotImplementedError
+    
+    def _transact(self, steps):
+        """Run transactions.py steps as one transaction; returns what they return"""
+        with self.transaction() as (cnx, cursor):
+            return run(steps, cnx, cursor)
+    
+    @abstractmethod
+    def connect(self):
+        """Check the database is reachable; returns True or False"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def reconnect(self):
+        """Drop open connections so they are re-established on next use"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def is_connected(self):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_pool_stats(self):
+        """Get connection usage and wait-time statistics"""
+        raise NotImplementedError
+    
+    def get_replica_stats(self):
+        """Get read replica statistics, or None without replicas"""
+        return None
+    
+    @abstractmethod
+    def add_order_listener(self, callback):
+        """Register callback(customer_id), called after a customer's order is placed or changes status"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def _orders_changed(self, customer_id):
+        """Call the order listeners for a customer"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError
+    
+    # Catalog
+    
+    @abstractmethod
+    def get_products_by_category(self, category):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_product_by_id(self, product_id):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_products_changed_since(self, since=None):
+        """Get full product rows updated at or after a timestamp (all rows when None)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_catalog_summary(self):
+        """Get [(product count, newest updated_at)]"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_product_ids(self):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_all_categories(self):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def search_products(self, search_term):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_popular_products(self, limit=10, days=None):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_low_stock_products(self, threshold=10):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def find_products(self, search):
+        """Get (id, name, category, price, stock) for a product ID or products whose name contains search"""
+        raise NotImplementedError
+    
+    def add_product(self, name, category, price, stock, description=None):
+        """Add a product; returns its id, or None on error"""
+        try:
+            return self._transact(transactions.add_product(self.queries, name, category, price, stock, description))
+        
+        except self.ERRORS as e:
+            logger.error(f"Error adding product {name!r}: {e}")
+            return None
+    
+    def set_product_stock(self, product_id, stock, reason):
+        """Set a product's stock and log the change; returns the previous stock, or None if not found"""
+        try:
+            return self._transact(transactions.set_product_stock(self.queries, product_id, stock, reason))
+        
+        except self.ERRORS as e:
+            logger.error(f"Error setting stock of product {product_id}: {e}")
+            return None
+    
+    @abstractmethod
+    def delete_product(self, product_id):
+        """Delete a product; returns the number of rows deleted"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_products_by_keys(self, skus, ids):
+        """Get products by sku or id, as rows in PRODUCT_FIELDS order"""
+        raise NotImplementedError
+    
+    def upsert_products(self, products, reason="Bulk import"):
+        """Insert or update a chunk of products in one transaction.
+        
+        products are dicts of PRODUCT_FIELDS, matched on sku or, without one,
+        on id. Stock changes are written to inventory_logs in one batch.
+        Returns (inserted, updated, unchanged) or None on error.
+        """
+        try:
+            return self._transact(transactions.upsert_products(self.queries, products, reason))
+        
+        except self.ERRORS as e:
+            logger.error(f"Error importing {len(products)} products: {e}")
+            return None
+    
+    @abstractmethod
+    def iter_products(self, batch_size=None):
+        """Yield lists of up to batch_size products in id order"""
+        raise NotImplementedError
+    
+    # Customers and orders
+    
+    @abstractmethod
+    def register_customer(self, telegram_id, first_name, last_name, username):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add_customer_address(self, telegram_id, address_data):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_customer_addresses(self, telegram_id):
+        raise NotImplementedError
+    
+    def place_order(self, order_data, cart_items):
+        """Create an order with its items and stock decrements in one transaction.
+        
+        Returns (True, []) on success. When some lines lack stock nothing is
+        written and (False, short_items) is returned, each entry being
+        (product_id, requested, available); (False, []) means a database error.
+        """
+        try:
+            placed, short_items = self._transact(transactions.place_order(self.queries, order_data, cart_items))
+        
+        except self.ERRORS as e:
+            logger.error(f"Error placing order {order_data[0]}: {e}")
+            return False, []
+        except Exception as e:
+            logger.error(f"Unexpected error in place_order: {e}")
+            return False, []
+        if placed:
+            self._orders_changed(order_data[1])
+        return placed, short_items
+    
+    @abstractmethod
+    def get_customer_orders(self, telegram_id, limit=10, before=None):
+        """Get customer's order history newest first, starting after the (order_date, id) cursor before"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_recent_orders(self, limit=10):
+        """Get the newest orders of all customers with the customer's name"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_order_details(self, order_id):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_latest_order_id(self, ceiling):
+        """Get the greatest order ID as long as ceiling and not above it, or None"""
+        raise NotImplementedError
+    
+    def update_order_status(self, order_id, status):
+        """Update order status, reversing popularity and sales when an order is cancelled.
+        
+        Returns the affected row count, or None on error.
+        """
+        try:
+            affected_rows, customer_id = self._transact(transactions.update_order_status(self.queries, order_id, status))
+        
+        except self.ERRORS as e:
+            logger.error(f"Error updating status of order {order_id}: {e}")
+            return None
+        if customer_id is not None:
+            self._orders_changed(customer_id)
+        return affected_rows
+    
+    @abstractmethod
+    def iter_orders(self, start, end, batch_size=None):
+        """Yield lists of orders placed in [start, end), in EXPORT_ORDERS column order"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def iter_order_items(self, start, end, batch_size=None):
+        """Yield lists of the items of orders placed in [start, end), in EXPORT_ORDER_ITEMS column order"""
+        raise NotImplementedError
+    
+    # Reports and rollups
+    
+    @abstractmethod
+    def get_daily_sales_report(self, date=None):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_sales_summary(self, start, end=None):
+        """Get (orders, revenue) for the hours in [start, end); end defaults to now"""
+        raise NotImplementedError
+    
+    def get_customer_stats(self, active_days=30, top=5):
+        """Get (total customers, customers active in the last active_days, top customers by spend)"""
+        return run_reads(transactions.customer_stats(self.queries, active_days, top), self.read_query)
+    
+    def rebuild_popularity(self):
+        """Recompute the popularity aggregates from the full order history"""
+        try:
+            return self._transact(transactions.rebuild_popularity(self.queries))
+        
+        except self.ERRORS as e:
+            logger.error(f"Error rebuilding popularity aggregates: {e}")
+            return None
+    
+    def rebuild_sales(self, since=None):
+        """Recompute the sales rollups from orders, one day per transaction, and the customer totals.
+        
+        since limits the rollup rebuild to days from that date on; returns
+        (days, customers) or None on error.
+        """
+        if since is None:
+            since = first_rollup_day(self.execute_query(self.queries.GET_FIRST_ORDER_DATE))
+        
+        days = 0
+        try:
+            for day, start, end in rollup_days(since, datetime.now().date()):
+                self._transact(transactions.rebuild_sales_day(self.queries, day, start, end))
+                days += 1
+            return days, self._transact(transactions.rebuild_customer_totals(self.queries))
+        
+        except self.ERRORS as e:
+            logger.error(f"Error rebuilding sales rollups after {days} days: {e}")
+            return None
+
+def get_storage():
+    """Get the singleton storage of the configured DB_BACKEND"""
+    if Config.DB_BACKEND == 'sqlite':
+        from sqlite_database import get_sqlite_db
+        return get_sqlite_db()
+    if Config.DB_BACKEND != 'mysql':
+        raise ValueError(f"DB_BACKEND must be one of {', '.join(BACKENDS)}, got {Config.DB_BACKEND!r}")
+    from database import get_db
+    return get_db()
@@ -0,0 +1,350 @@
+"""
+Multi-process supervisor for Grocery Store Bot
+Receives updates once, by long polling or webhook, and shards them by user
+across worker processes that each run Bot.py's handlers, so handler CPU is
+spread over cores while each user's session stays in one worker.
+Stock holds (reservations.py) are kept per worker as well: carts on
+different workers can hold the same last units, and the loser is refused
+when the database re-checks stock at checkout
+"""
+
+import argparse
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import telebot
+from config import Config
+from order_ids import MAX_WORKER_ID
+from slowlog import worker_log_path
+
+logger = logging.getLogger(__name__)
+
+HEALTH_INTERVAL = 1.0       # seconds between health checks; workers beat at the same rate
+RESTART_BACKOFF = 1.0       # seconds before restarting a crashed worker, doubled per consecutive crash
+MAX_RESTART_BACKOFF = 60.0
+STATS_INTERVAL = 300
+POLL_TIMEOUT = 20
+
+# Update fields whose object carries the user in 'from'
+USER_FIELDS = ('message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+               'shipping_query', 'pre_checkout_query', 'my_chat_member', 'chat_member', 'chat_join_request')
+
+def update_user_id(update):
+    """Get the Telegram user behind a raw update dict, or None for channel posts and polls"""
+    for field in USER_FIELDS:
+        body = update.get(field)
+        if body and 'from' in body:
+            return body['from']['id']
+    answer = update.get('poll_answer')
+    if answer and 'user' in answer:
+        return answer['user']['id']
+    return None
+
+def shard_for(update, shards):
+    """Worker index for an update: by user, so one user's updates always reach the same worker"""
+    user_id = update_user_id(update)
+    return (user_id if user_id is not None else update['update_id']) % shards
+
+def run_worker(index, workers, updates, heartbeat, taken, processed, setup=None):
+    """Worker process: run Bot.py's handlers on one shard's (sequence, update) pairs until a None arrives"""
+    Config.ORDER_WORKER_ID += index
+    # Telegram's overall send limit is shared by every worker; per-chat limits are not, since chats are sharded
+    Config.SEND_GLOBAL_RATE /= workers
+    if Config.METRICS_PORT:
+        Config.METRICS_PORT += index
+    Config.SLOW_QUERY_LOG = worker_log_path(Config.SLOW_QUERY_LOG, index)
+    if setup is not None:
+        setup()
+    import Bot
+    from metrics import MetricsServer
+    
+    dispatcher = Bot.bot
+    dispatcher.threaded = False
+    executor = ThreadPoolExecutor(max_workers=Config.WORKER_THREADS, thread_name_prefix='handler')
+    slots = threading.BoundedSemaphore(Config.WORKER_THREADS * 2)
+    
+    def process(update):
+        try:
+            dispatcher.process_new_updates([telebot.types.Update.de_json(update)])
+        except Exception as e:
+            logger.error(f"Error handling update {update.get('update_id')}: {e}")
+        finally:
+            with processed.get_lock():
+                processed.value += 1
+            slots.release()
+    
+    metrics_server = MetricsServer(Bot.metrics).start() if Bot.metrics is not None else None
+    logger.info(f"Worker {index} ready (order worker ID {Config.ORDER_WORKER_ID})")
+    try:
+        while True:
+            # Beat only while a handler slot is free, so a jammed pool looks as dead as a hung process
+            if not slots.acquire(timeout=HEALTH_INTERVAL):
+                continue
+            heartbeat.value = time.time()
+            try:
+                item = updates.get(timeout=HEALTH_INTERVAL)
+            except queue.Empty:
+                slots.release()
+                continue
+            if item is None:
+                break
+            sequence, update = item
+            taken.value = sequence
+            executor.submit(process, update)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=True)
+        if metrics_server is not None:
+            metrics_server.stop()
+        Bot.shutdown()
+
+class _Shard:
+    __slots__ = ('index', 'lock', 'updates', 'sent', 'sequence', 'taken', 'processed', 'process', 'heartbeat',
+                 'started', 'crashes', 'restart_at', 'restarts')
+    
+    def __init__(self, index, context):
+        self.index = index
+        self.lock = threading.Lock()
+        self.updates = None
+        self.sent = deque()    # (sequence, update) queued but not yet taken by the worker
+        self.sequence = 0
+        self.taken = context.Value('q', 0)
+        self.processed = context.Value('q', 0)
+        self.process = None
+        self.heartbeat = None
+        self.started = 0.0
+        self.crashes = 0
+        self.restart_at = None
+        self.restarts = 0
+
+class Supervisor:
+    """Runs Bot.py in worker processes and routes each update to its user's worker.
+    
+    Workers beat every HEALTH_INTERVAL seconds; one that exits, or misses
+    beats for WORKER_HEARTBEAT_TIMEOUT seconds, is restarted with backoff.
+    Each update is numbered and kept until its worker takes it, so updates
+    still queued for a dead worker are sent again to the new process;
+    updates it had already taken are lost.
+    """
+    
+    def __init__(self, workers=None, setup=None, queue_size=None, heartbeat_timeout=None):
+        self.workers = workers or Config.BOT_WORKERS
+        if not 0 <= Config.ORDER_WORKER_ID <= MAX_WORKER_ID - self.workers + 1:
+            raise ValueError(f"ORDER_WORKER_ID + BOT_WORKERS - 1 must not exceed {MAX_WORKER_ID}; "
+                             f"workers use IDs {Config.ORDER_WORKER_ID} and up")
+        self.setup = setup
+        self.queue_size = queue_size or Config.WORKER_QUEUE_SIZE
+        self.heartbeat_timeout = heartbeat_timeout or Config.WORKER_HEARTBEAT_TIMEOUT
+        self._context = multiprocessing.get_context('spawn')
+        self._shards = [_Shard(index, self._context) for index in range(self.workers)]
+        self._stopping = threading.Event()
+        self._monitor = None
+        
+        # Updates go to the worker processes, not to telebot's own threads (see WebhookServer)
+        self.threaded = False
+        self.routed = 0
+        self.dropped = 0
+    
+    def start(self):
+        for shard in self._shards:
+            shard.updates = self._context.Queue(self.queue_size)
+            self._spawn(shard)
+        self._monitor = threading.Thread(target=self._watch, name='supervisor', daemon=True)
+        self._monitor.start()
+        logger.info(f"Started {self.workers} bot workers")
+        return self
+    
+    def _spawn(self, shard):
+        shard.heartbeat = self._context.Value('d', 0.0)
+        shard.processed = self._context.Value('q', 0)
+        shard.process = self._context.Process(
+            target=run_worker, name=f"bot-worker-{shard.index}", daemon=True,
+            args=(shard.index, self.workers, shard.updates, shard.heartbeat, shard.taken, shard.processed,
+                  self.setup),
+        )
+        shard.process.start()
+        shard.started = time.time()
+        shard.restart_at = None
+    
+    def dispatch(self, update):
+        """Queue a raw update dict for its user's worker, waiting while that worker's queue is full.
+        
+        Returns False when the supervisor is stopping and the update was not queued.
+        """
+        shard = self._shards[shard_for(update, self.workers)]
+        while True:
+            # Queues are swapped under the lock when a worker restarts, so no put lands in a dead queue
+            with shard.lock:
+                self._trim(shard)
+                try:
+                    shard.updates.put_nowait((shard.sequence + 1, update))
+                except queue.Full:
+                    pass
+                else:
+                    shard.sequence += 1
+                    shard.sent.append((shard.sequence, update))
+                    self.routed += 1
+                    return True
+            if self._stopping.wait(0.01):
+                self.dropped += 1
+                return False
+    
+    @staticmethod
+    def _trim(shard):
+        taken = shard.taken.value
+        while shard.sent and shard.sent[0][0] <= taken:
+            shard.sent.popleft()
+    
+    def process_new_updates(self, updates):
+        """Dispatch a batch of raw updates; lets the webhook server treat the supervisor as its bot"""
+        for update in updates:
+            self.dispatch(update)
+    
+    def wait_ready(self, timeout=60):
+        """Wait until every worker has loaded Bot.py and beaten once; returns whether they all did"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(shard.heartbeat.value for shard in self._shards):
+                return True
+            time.sleep(0.05)
+        return False
+    
+    def _watch(self):
+        last_stats = time.monotonic()
+        while not self._stopping.wait(HEALTH_INTERVAL):
+            for shard in self._shards:
+                try:
+                    self._check(shard)
+                except Exception as e:
+                    logger.error(f"Health check of worker {shard.index} failed: {e}")
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                last_stats = time.monotonic()
+                logger.info(f"Supervisor stats: {self.stats()}")
+    
+    def _check(self, shard):
+        now = time.time()
+        if shard.process.is_alive():
+            beat = shard.heartbeat.value
+            silent = now - (beat or shard.started)
+            if silent <= self.heartbeat_timeout:
+                if shard.crashes and beat and now - shard.started > self.heartbeat_timeout:
+                    shard.crashes = 0
+                return
+            logger.error(f"Worker {shard.index} sent no heartbeat for {silent:.0f}s; killing it")
+            shard.process.kill()
+            shard.process.join(5)
+        
+        if shard.restart_at is None:
+            delay = min(RESTART_BACKOFF * 2 ** shard.crashes, MAX_RESTART_BACKOFF)
+            logger.error(f"Worker {shard.index} exited with code {shard.process.exitcode}; "
+                         f"restarting it in {delay:.0f}s")
+            shard.crashes += 1
+            shard.restart_at = now + delay
+        elif now >= shard.restart_at:
+            self._restart(shard)
+    
+    def _restart(self, shard):
+        """Start a new process for a dead worker on a fresh queue, resending the updates it had not taken"""
+        with shard.lock:
+            # The dead process may still hold the old queue's read lock, so it is abandoned, not drained
+            shard.updates.close()
+            shard.updates.cancel_join_thread()
+            shard.updates = self._context.Queue(self.queue_size)
+            self._trim(shard)
+            for item in shard.sent:
+                shard.updates.put_nowait(item)
+            self._spawn(shard)
+            resent = len(shard.sent)
+        shard.restarts += 1
+        logger.info(f"Restarted worker {shard.index}, resending {resent} queued updates")
+    
+    def health(self):
+        """Liveness of the workers, e.g. for the webhook health check"""
+        now = time.time()
+        alive = sum(1 for shard in self._shards if shard.process.is_alive()
+                    and now - (shard.heartbeat.value or shard.started) <= self.heartbeat_timeout)
+        return {'workers': self.workers, 'alive': alive,
+                'restarts': sum(shard.restarts for shard in self._shards)}
+    
+    def processed(self):
+        """Updates finished by the current worker processes"""
+        return sum(shard.processed.value for shard in self._shards)
+    
+    def stats(self):
+        stats = self.health()
+        stats.update({'routed': self.routed, 'dropped': self.dropped, 'processed': self.processed()})
+        return stats
+    
+    def stop(self, timeout=30):
+        """Ask every worker to finish its queued updates and exit; kill any still running after timeout"""
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        for shard in self._shards:
+            if shard.process.is_alive():
+                try:
+                    shard.updates.put(None, timeout=timeout)
+                except queue.Full:
+                    pass
+        deadline = time.monotonic() + timeout
+        for shard in self._shards:
+            shard.process.join(max(deadline - time.monotonic(), 0))
+            if shard.process.is_alive():
+                logger.warning(f"Worker {shard.index} did not stop in time; killing it")
+                shard.process.kill()
+                shard.process.join()
+        logger.info(f"Supervisor stopped: {self.stats()}")
+
+def run_polling(supervisor):
+    """Long-poll Telegram in this process and dispatch every update to the workers"""
+    offset = None
+    while True:
+        try:
+            updates = telebot.apihelper.get_updates(Config.BOT_TOKEN, offset, 100, POLL_TIMEOUT + 5,
+                                                    long_polling_timeout=POLL_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Polling failed: {e}")
+            time.sleep(3)
+            continue
+        for update in updates:
+            supervisor.dispatch(update)
+            offset = update['update_id'] + 1
+
+if __name__ == "__main__":
+    from webhook import run_webhook
+    
+    logging.basicConfig(
+        level=getattr(logging, Config.LOG_LEVEL.upper()),
+        format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(Config.LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
+    
+    parser = argparse.ArgumentParser(description="Grocery Store Bot supervisor: one process per core, sharded by user")
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default=Config.BOT_MODE,
+                        help="receive updates by long polling (development) or webhook")
+    parser.add_argument('--workers', type=int, default=Config.BOT_WORKERS, help="worker processes")
+    args = parser.parse_args()
+    
+    if Config.TELEGRAM_API_URL:
+        telebot.apihelper.API_URL = Config.TELEGRAM_API_URL
+    bot = telebot.TeleBot(Config.BOT_TOKEN)
+    supervisor = Supervisor(args.workers).start()
+    logger.info(f"Starting Grocery Store Bot in {args.mode} mode with {args.workers} workers...")
+    try:
+        if args.mode == 'webhook':
+            run_webhook(bot, receiver=supervisor)
+        else:
+            bot.remove_webhook()
+            run_polling(supervisor)
+    except KeyboardInterrupt:
+        logger.info("Supervisor interrupted")
+    finally:
+        supervisor.stop()
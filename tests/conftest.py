@@ -0,0 +1,29 @@
+"""
+Shared test setup for Grocery Store Bot
+Puts the repo root on the import path and points every file the bot writes
+at a scratch directory, so the suite runs without MySQL or Telegram
+"""
+
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix='grocery_tests_')
+os.environ.setdefault('BOT_TOKEN', '123456:TEST')
+os.environ.setdefault('SESSION_BACKEND', 'memory')
+os.environ.setdefault('SESSION_DB_PATH', os.path.join(_scratch, 'sessions.db'))
+os.environ.setdefault('SLOW_QUERY_LOG', os.path.join(_scratch, 'slow_queries.log'))
+os.environ.setdefault('LOG_FILE', os.path.join(_scratch, 'grocery_bot.log'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """A fresh SQLite store with the sample catalog from sqlite_schema.sql"""
+    from sqlite_database import SQLiteDatabaseManager
+    db = SQLiteDatabaseManager(str(tmp_path / 'test.db'))
+    yield db
+    db.close()
@@ -0,0 +1,53 @@
+"""Bulk product import: good rows land in the store, malformed ones are reported"""
+
+import io
+import json
+import pytest
+import catalog_io
+
+def write_catalog(fmt, count, bad_every):
+    """A catalog of count rows with every bad_every-th one malformed; returns (text, good, bad)"""
+    stream = io.StringIO()
+    if fmt == 'csv':
+        stream.write(','.join(catalog_io.PRODUCT_FIELDS) + '\n')
+    bad = 0
+    for number in range(1, count + 1):
+        if number % bad_every == 0:
+            bad += 1
+            # Broken JSON, or a CSV row whose price is not a number
+            stream.write('{"sku": "BAD", "name": \n' if fmt == 'jsonl' else f",BAD{number},x,Bakery,abc,1,,\n")
+            continue
+        record = {'id': None, 'sku': f"SKU{number:08d}", 'name': f"Product {number}", 'category': "Bakery",
+                  'price': 1.25, 'stock': number % 50, 'description': "Test product", 'image_url': None}
+        if fmt == 'jsonl':
+            stream.write(json.dumps(record) + '\n')
+        else:
+            stream.write(','.join(f'"{record[field]}"' if record[field] is not None else ''
+                                  for field in catalog_io.PRODUCT_FIELDS) + '\n')
+    return stream.getvalue(), count - bad, bad
+
+def import_catalog(db, text, fmt, chunk_size=100):
+    """The same loop as admin.py import-products; returns (inserted, errors)"""
+    errors = []
+    inserted = 0
+    for chunk in catalog_io.chunked(catalog_io.read_products(io.StringIO(text, newline=''), fmt, errors), chunk_size):
+        inserted += db.upsert_products(chunk)[0]
+    return inserted, errors
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_import_reports_bad_rows(sqlite_db, fmt):
+    text, good, bad = write_catalog(fmt, 1000, 97)
+    before = sqlite_db.get_catalog_summary()[0][0]
+    
+    inserted, errors = import_catalog(sqlite_db, text, fmt)
+    
+    assert inserted == good
+    assert sqlite_db.get_catalog_summary()[0][0] - before == good
+    assert len(errors) == bad
+
+def test_reimport_changes_nothing(sqlite_db):
+    text, good, bad = write_catalog('jsonl', 300, 1000)
+    import_catalog(sqlite_db, text, 'jsonl')
+    
+    products = list(catalog_io.read_products(io.StringIO(text), 'jsonl'))
+    assert sqlite_db.upsert_products(products) == (0, 0, good)
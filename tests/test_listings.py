@@ -0,0 +1,24 @@
+"""Listing cache: search terms whose callback tokens collide keep their own rows"""
+
+from listings import ListingCache, SEARCH, key_token
+
+class StubCatalog:
+    version = 1
+    
+    def add_listener(self, callback):
+        pass
+    
+    def refresh(self):
+        pass
+
+def test_colliding_tokens_keep_their_own_pages():
+    cache = ListingCache(StubCatalog(), 5, 100)
+    first, second = 'nvoabxcbqj', 'vyit gqkew'
+    assert key_token(first) == key_token(second)
+    
+    apples = cache.page(SEARCH, first, 0, lambda: [(1, 'Apple', 'Fruit', 1, 5, '')])
+    bread = cache.page(SEARCH, second, 0, lambda: [(2, 'Bread', 'Bakery', 1, 5, '')])
+    
+    assert 'Apple' in apples[0] and 'Bread' not in apples[0]
+    assert 'Bread' in bread[0] and 'Apple' not in bread[0]
+    assert cache.rows(SEARCH, first) is None
@@ -0,0 +1,61 @@
+"""Order ID allocation: unique across workers and threads, ordered, and resumed after a restart"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from order_ids import OrderIdAllocator, ID_LENGTH
+from sessions import CartItem
+
+def test_ids_are_ordered():
+    allocator = OrderIdAllocator(worker_id=0)
+    ids = [allocator.next_id() for _ in range(5000)]
+    
+    assert all(len(order_id) == ID_LENGTH for order_id in ids)
+    assert all(a < b for a, b in zip(ids, ids[1:]))
+
+def test_ids_are_unique_across_workers_and_threads():
+    allocators = [OrderIdAllocator(worker_id=worker) for worker in range(4)]
+    results = [[] for _ in range(16)]
+    
+    def allocate(index):
+        next_id = allocators[index % len(allocators)].next_id
+        results[index] = [next_id() for _ in range(2000)]
+    
+    threads = [threading.Thread(target=allocate, args=(index,)) for index in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    ids = [order_id for batch in results for order_id in batch]
+    assert len(set(ids)) == len(ids)
+    assert all(a < b for batch in results for a, b in zip(batch, batch[1:]))
+
+def test_resume_after_restart_with_clock_behind(sqlite_db):
+    sqlite_db.register_customer(5, 'Test', 'User', 'test')
+    
+    def place(order_id):
+        cart = {1: CartItem('Bananas', Decimal('1.29'), 1)}
+        order_data = (order_id, 5, json.dumps({}), Decimal('1.29'), Decimal('5.00'), Decimal('6.29'),
+                      'delivery', 'Test address', '555-0100', 'pending', datetime.now())
+        assert sqlite_db.place_order(order_data, cart) == (True, [])
+    
+    now = time.time()
+    # Old random IDs must not be taken for allocated ones
+    place('1A2B3C4D')
+    allocator = OrderIdAllocator(3, clock=lambda: now)
+    issued = [allocator.next_id() for _ in range(3000)]
+    for order_id in issued[-5:]:
+        place(order_id)
+    
+    restarted = OrderIdAllocator(3, clock=lambda: now - 3600)
+    restarted.resume_after(sqlite_db.get_latest_order_id(restarted.resume_ceiling()))
+    assert restarted.next_id() > max(issued)
+
+def test_resume_ignores_missing_or_foreign_ids():
+    allocator = OrderIdAllocator(0)
+    allocator.resume_after(None)
+    allocator.resume_after('bad!')
+    assert len(allocator.next_id()) == ID_LENGTH
@@ -0,0 +1,93 @@
+"""Stock reservations: no two carts can hold the same units"""
+
+import random
+import threading
+from types import SimpleNamespace
+from reservations import ReservationEngine
+
+class StubCatalog:
+    """The catalog replica interface ReservationEngine uses, over a dict of stock"""
+    
+    def __init__(self, stock):
+        self.stock = dict(stock)
+        self.sync_started = 0.0
+        self.listeners = []
+    
+    def get_all_products(self):
+        return [(product_id, '', '', 1.0, stock, '', None) for product_id, stock in self.stock.items()]
+    
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+    
+    def change(self, product_id, stock):
+        self.stock[product_id] = stock
+        for callback in self.listeners:
+            callback([(product_id, '', '', 1.0, stock, '', None)], [])
+
+def cart(**lines):
+    return {int(product_id[1:]): SimpleNamespace(quantity=quantity) for product_id, quantity in lines.items()}
+
+def test_last_units_go_to_one_cart():
+    engine = ReservationEngine(StubCatalog({1: 2}), ttl=60)
+    
+    assert engine.hold(1, 1, 2) == (True, 2)
+    assert engine.hold(2, 1, 1) == (False, 0)
+    engine.release(1)
+    assert engine.hold(2, 1, 1) == (True, 2)
+
+def test_hold_cart_reports_short_lines_and_drops_removed_ones():
+    engine = ReservationEngine(StubCatalog({1: 5, 2: 1}), ttl=60)
+    engine.hold(1, 1, 3)
+    engine.hold(2, 2, 1)
+    
+    assert engine.hold_cart(1, cart(p2=1)) == [(2, 1, 0)]
+    # Product 1 left the cart, so its units are free again
+    assert engine.available(1) == 5
+
+def test_expired_holds_are_released():
+    engine = ReservationEngine(StubCatalog({1: 1}), ttl=0)
+    engine.hold(1, 1, 1)
+    
+    assert engine.hold(2, 1, 1)[0]
+    assert engine.stats()['expired'] == 1
+
+def test_confirmed_sales_stay_off_until_a_later_sync():
+    catalog = StubCatalog({1: 3})
+    engine = ReservationEngine(catalog, ttl=60)
+    engine.hold(1, 1, 2)
+    assert engine.confirm(1) == {1: 2}
+    assert engine.available(1) == 1
+    
+    # A sync that started before the sale may still carry the old stock
+    catalog.sync_started = float('inf')
+    catalog.change(1, 1)
+    assert engine.available(1) == 1
+
+def test_concurrent_holds_never_exceed_stock():
+    stock = {product_id: 3 for product_id in range(1, 6)}
+    engine = ReservationEngine(StubCatalog(stock), ttl=60)
+    carts = [{} for _ in range(8)]
+    
+    def shopper(index):
+        rng = random.Random(index)
+        for _ in range(2000):
+            user_id = index * 10 + rng.randrange(10)
+            product_id = rng.randint(1, 5)
+            lines = carts[index].setdefault(user_id, {})
+            if rng.random() < 0.8:
+                if engine.hold(user_id, product_id, lines.get(product_id, 0) + 1)[0]:
+                    lines[product_id] = lines.get(product_id, 0) + 1
+            else:
+                engine.release(user_id)
+                lines.clear()
+    
+    threads = [threading.Thread(target=shopper, args=(index,)) for index in range(len(carts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    for product_id, units in stock.items():
+        held = sum(lines.get(product_id, 0) for users in carts for lines in users.values())
+        assert held <= units
+        assert engine.available(product_id) == units - held
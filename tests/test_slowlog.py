@@ -0,0 +1,24 @@
+"""Slow-query log files: the main log, rotated files and supervisor workers' logs are read together"""
+
+import json
+import slowlog
+
+def test_worker_logs_are_read_with_the_main_log(tmp_path):
+    path = str(tmp_path / 'slow.log')
+    names = [path, path + '.1', slowlog.worker_log_path(path, 0), slowlog.worker_log_path(path, 0) + '.1',
+             slowlog.worker_log_path(path, 1), path + '.workerx']
+    for name in names:
+        with open(name, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'file': name}) + '\n')
+    
+    read = {entry['file'] for entry in slowlog.read_entries(path)}
+    
+    assert read == set(names[:-1])
+
+def test_worker_writes_its_own_file(tmp_path):
+    path = str(tmp_path / 'slow.log')
+    log = slowlog.SlowQueryLog(0, slowlog.worker_log_path(path, 2))
+    log.write(log.entry("SELECT 1", None, 1.0))
+    log.close()
+    
+    assert len(list(slowlog.read_entries(path))) == 1
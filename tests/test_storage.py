@@ -0,0 +1,158 @@
+"""
+Storage conformance: every backend gives the same answers to the bot's requests.
+MySQL runs on a throwaway database created from database_schema.sql and is
+skipped when the server in DB_HOST is unreachable
+"""
+
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+import pytest
+from config import Config
+from sessions import CartItem
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / 'database_schema.sql'
+CUSTOMER_ID = 900_000_001
+
+def schema_statements(script):
+    """Split a mysql client script into statements, honouring DELIMITER and leaving out CREATE DATABASE and USE"""
+    delimiter = ';'
+    lines = []
+    for line in script.splitlines():
+        if line.strip().upper().startswith('DELIMITER '):
+            delimiter = line.split()[1]
+            continue
+        lines.append(line)
+        if line.rstrip().endswith(delimiter):
+            statement = '\n'.join(lines).rstrip()[:-len(delimiter)].strip()
+            lines = []
+            if statement and not statement.upper().startswith(('CREATE DATABASE', 'USE ')):
+                yield statement
+
+@pytest.fixture
+def mysql_db(monkeypatch):
+    connector = pytest.importorskip('mysql.connector')
+    config = dict(Config.get_db_config(), database=None, connection_timeout=5)
+    try:
+        cnx = connector.connect(**config)
+    except connector.Error as e:
+        pytest.skip(f"MySQL unreachable: {e}")
+    
+    name = f"grocery_test_{os.getpid()}"
+    cursor = cnx.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+    cursor.execute(f"CREATE DATABASE {name}")
+    cursor.execute(f"USE {name}")
+    for statement in schema_statements(SCHEMA_PATH.read_text(encoding='utf-8')):
+        cursor.execute(statement)
+    
+    from database import DatabaseManager
+    monkeypatch.setattr(Config, 'DB_NAME', name)
+    monkeypatch.setattr(Config, 'DB_REPLICAS', '')
+    db = DatabaseManager()
+    try:
+        yield db
+    finally:
+        db.close()
+        cursor.execute(f"DROP DATABASE {name}")
+        cnx.close()
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def db(request):
+    """Each backend, with one product stocked for the tests to order"""
+    store = request.getfixturevalue(f"{request.param}_db")
+    store.set_product_stock(1, 100, "Test stock")
+    store.register_customer(CUSTOMER_ID, 'Test', 'User', 'test')
+    return store
+
+def place(db, product, quantity=1):
+    """Order quantity of a product for the test customer; returns (order_id, place_order's result)"""
+    order_id = f"TEST{os.urandom(4).hex().upper()}"
+    subtotal = product[3] * quantity
+    order_data = (order_id, CUSTOMER_ID, json.dumps({}), subtotal, Decimal('5.00'), subtotal + Decimal('5.00'),
+                  'delivery', 'Test address', '555-0100', 'pending', datetime.now())
+    return order_id, db.place_order(order_data, {product[0]: CartItem(product[1], product[3], quantity)})
+
+def test_register_is_idempotent(db):
+    assert db.register_customer(CUSTOMER_ID, 'Test', 'User', 'test') is not None
+    assert db.register_customer(CUSTOMER_ID, 'Test', 'User', 'test') is not None
+
+def test_product_lookups(db):
+    product = db.get_product_by_id(1)
+    
+    assert product[0] == 1 and product[4] == 100
+    assert db.get_product_by_id(-1) is None
+    assert any(row[0] == 1 for row in db.get_products_by_category(product[2]))
+    assert product[2] in [row[0] for row in db.get_all_categories()]
+
+def test_orders_decrement_stock(db):
+    product = db.get_product_by_id(1)
+    
+    results = [place(db, product)[1] for _ in range(5)]
+    
+    assert results == [(True, [])] * 5
+    assert db.get_product_by_id(1)[4] == 95
+
+def test_short_stock_is_refused(db):
+    product = db.get_product_by_id(1)
+    db.set_product_stock(1, 0, "Test stock")
+    
+    assert place(db, product)[1] == (False, [(1, 1, 0)])
+    assert db.get_product_by_id(1)[4] == 0
+
+def test_history_pages_cover_every_order_once(db):
+    product = db.get_product_by_id(1)
+    placed = {place(db, product)[0] for _ in range(5)}
+    
+    seen, page = [], db.get_customer_orders(CUSTOMER_ID, 2)
+    while page:
+        seen += [row[0] for row in page]
+        page = db.get_customer_orders(CUSTOMER_ID, 2, (page[-1][3], page[-1][6])) if len(page) == 2 else []
+    
+    assert len(seen) == len(set(seen))
+    assert set(seen) == placed
+
+def test_order_details_and_status(db):
+    order_id = place(db, db.get_product_by_id(1))[0]
+    
+    assert db.get_order_details(order_id)[0] == order_id
+    assert db.update_order_status(order_id, 'confirmed') == 1
+    assert db.update_order_status('TEST-missing', 'confirmed') == 0
+
+def test_cancelling_reverses_popularity_and_sales(db):
+    product = db.get_product_by_id(1)
+    place(db, product, 2)
+    cancelled = place(db, product, 3)[0]
+    assert [row[5:] for row in db.get_popular_products(10) if row[0] == 1] == [(2, 5)]
+    
+    assert db.update_order_status(cancelled, 'cancelled') == 1
+    assert [row[5:] for row in db.get_popular_products(10) if row[0] == 1] == [(1, 2)]
+    total, active, top = db.get_customer_stats()
+    assert active >= 1
+    assert [row[2:] for row in top if row[:2] == ('Test', 'User')] == [(1, product[3] * 2 + Decimal('5.00'))]
+    
+    # Rebuilding from the order history gives the same aggregates
+    assert db.rebuild_popularity() is not None
+    days, customers = db.rebuild_sales()
+    assert days >= 1 and customers >= 1
+    assert [row[5:] for row in db.get_popular_products(10) if row[0] == 1] == [(1, 2)]
+    assert db.get_customer_stats()[2] == top
+
+def test_product_writes(db):
+    product_id = db.add_product("Test Loaf", "Bakery", Decimal('2.50'), 7, "For tests")
+    
+    assert db.get_product_by_id(product_id)[1:5] == ("Test Loaf", "Bakery", Decimal('2.50'), 7)
+    assert db.set_product_stock(product_id, 9, "Test stock") == 7
+    assert db.set_product_stock(-1, 9, "Test stock") is None
+    assert db.get_product_by_id(product_id)[4] == 9
+
+def test_upsert_counts_inserts_updates_and_unchanged_rows(db):
+    def product(sku, price, stock):
+        return {'id': None, 'sku': sku, 'name': f"Test {sku}", 'category': "Bakery", 'price': Decimal(price),
+                'stock': stock, 'description': None, 'image_url': None}
+    
+    assert db.upsert_products([product('T1', '1.00', 5), product('T2', '2.00', 5)]) == (2, 0, 0)
+    assert db.upsert_products([product('T1', '1.00', 5), product('T2', '2.50', 8), product('T3', '3.00', 1)]) == (1, 1, 1)
+    assert [row[5] for row in db.get_products_by_keys(['T2'], [])] == [8]
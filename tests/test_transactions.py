@@ -0,0 +1,74 @@
+"""Transaction steps: the async runner gives the same results as the blocking one"""
+
+import asyncio
+import json
+from datetime import datetime
+from decimal import Decimal
+import sqlite_queries
+import transactions
+from sessions import CartItem
+
+class AsyncCursor:
+    """An aiomysql-shaped cursor over a blocking SQLite one"""
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+    
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+    
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+    
+    async def execute(self, query, params=None):
+        self.cursor.execute(query, params or ())
+    
+    async def executemany(self, query, rows):
+        self.cursor.executemany(query, rows)
+    
+    async def fetchone(self):
+        return self.cursor.fetchone()
+    
+    async def fetchall(self):
+        return self.cursor.fetchall()
+
+class AsyncConnection:
+    def __init__(self, cnx):
+        self.cnx = cnx
+    
+    async def rollback(self):
+        self.cnx.rollback()
+
+def run_async(db, steps):
+    """Run steps through run_async in one of the SQLite store's transactions"""
+    async def main():
+        with db.transaction() as (cnx, cursor):
+            return await transactions.run_async(steps, AsyncConnection(cnx), AsyncCursor(cursor))
+    return asyncio.run(main())
+
+def order(order_id, product, quantity):
+    subtotal = product[3] * quantity
+    order_data = (order_id, 7, json.dumps({}), subtotal, Decimal('5.00'), subtotal + Decimal('5.00'),
+                  'takeaway', None, '555-0100', 'pending', datetime.now())
+    return order_data, {product[0]: CartItem(product[1], product[3], quantity)}
+
+def test_async_runner_places_refuses_and_cancels(sqlite_db):
+    sqlite_db.register_customer(7, 'Test', 'User', 'test')
+    sqlite_db.set_product_stock(1, 3, "Test stock")
+    product = sqlite_db.get_product_by_id(1)
+    
+    assert run_async(sqlite_db, transactions.place_order(sqlite_queries, *order('TESTA', product, 2))) == (True, [])
+    assert run_async(sqlite_db, transactions.place_order(sqlite_queries, *order('TESTB', product, 2))) == (False, [(1, 2, 1)])
+    assert sqlite_db.get_product_by_id(1)[4] == 1
+    
+    steps = transactions.update_order_status(sqlite_queries, 'TESTA', 'cancelled')
+    assert run_async(sqlite_db, steps) == (1, 7)
+    assert sqlite_db.get_customer_stats()[2] == []
+
+def test_async_runner_inserts(sqlite_db):
+    steps = transactions.add_product(sqlite_queries, "Test Loaf", "Bakery", Decimal('2.50'), 7, None)
+    product_id = run_async(sqlite_db, steps)
+    
+    assert sqlite_db.get_product_by_id(product_id)[1] == "Test Loaf"
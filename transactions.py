@@ -0,0 +1,280 @@
+"""
+Transaction logic for Grocery Store Bot
+The multi-statement work every storage backend does, written once as
+generators: a step yields the statement to run and is sent back its result,
+so the same logic drives a blocking DB-API cursor (run) and an aiomysql one
+(run_async). Backends pass in their dialect's query module and keep their
+own connections, transactions and error handling
+"""
+
+from datetime import datetime, timedelta
+from catalog_io import PRODUCT_FIELDS, product_key, index_existing
+
+# What a step asks for, and what it is sent back
+EXECUTE = 'execute'            # the row count
+EXECUTE_MANY = 'executemany'   # the row count
+INSERT = 'insert'              # the new row's id
+FETCH_ONE = 'fetchone'         # the first row, or None
+FETCH_ALL = 'fetchall'         # every row
+ROLLBACK = 'rollback'          # nothing; the transaction is over and later statements autocommit
+
+def execute(query, params=None):
+    return EXECUTE, query, params
+
+def execute_many(query, rows):
+    return EXECUTE_MANY, query, rows
+
+def insert(query, params):
+    return INSERT, query, params
+
+def fetch_one(query, params=None):
+    return FETCH_ONE, query, params
+
+def fetch_all(query, params=None):
+    return FETCH_ALL, query, params
+
+def rollback():
+    return ROLLBACK, None, None
+
+def run(steps, cnx, cursor):
+    """Drive steps on a blocking connection and cursor; returns what the steps return"""
+    result = None
+    while True:
+        try:
+            action, query, params = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        if action == ROLLBACK:
+            cnx.rollback()
+            result = None
+        elif action == EXECUTE_MANY:
+            cursor.executemany(query, params)
+            result = cursor.rowcount
+        else:
+            if params is None:
+                cursor.execute(query)
+            else:
+                cursor.execute(query, params)
+            if action == FETCH_ONE:
+                result = cursor.fetchone()
+            elif action == FETCH_ALL:
+                result = cursor.fetchall()
+            elif action == INSERT:
+                result = cursor.lastrowid
+            else:
+                result = cursor.rowcount
+
+async def run_async(steps, conn, cursor):
+    """Drive steps on an aiomysql connection and cursor; returns what the steps return"""
+    result = None
+    while True:
+        try:
+            action, query, params = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        if action == ROLLBACK:
+            await conn.rollback()
+            result = None
+        elif action == EXECUTE_MANY:
+            await cursor.executemany(query, params)
+            result = cursor.rowcount
+        else:
+            await cursor.execute(query, params)
+            if action == FETCH_ONE:
+                result = await cursor.fetchone()
+            elif action == FETCH_ALL:
+                result = await cursor.fetchall()
+            elif action == INSERT:
+                result = cursor.lastrowid
+            else:
+                result = cursor.rowcount
+
+def run_reads(steps, read):
+    """Drive read-only steps outside a transaction, each FETCH_ALL through read(query, params)"""
+    result = None
+    while True:
+        try:
+            action, query, params = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result = read(query, params)
+
+async def run_reads_async(steps, read):
+    """Like run_reads, with read a coroutine function"""
+    result = None
+    while True:
+        try:
+            action, query, params = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result = await read(query, params)
+
+def order_lines(order_id, cart_items):
+    """Split a cart into (product_id, quantity) lines and order_items rows"""
+    lines = [(product_id, item.quantity) for product_id, item in cart_items.items()]
+    item_rows = [
+        (order_id, product_id, item.quantity, item.price, item.price * item.quantity)
+        for product_id, item in cart_items.items()
+    ]
+    return lines, item_rows
+
+def short_lines(lines, stock_levels):
+    """List (product_id, requested, available) for lines that cannot be filled"""
+    available = dict(stock_levels)
+    return [
+        (product_id, quantity, available.get(product_id, 0))
+        for product_id, quantity in lines
+        if available.get(product_id, 0) < quantity
+    ]
+
+def popularity_deltas(order_date, lines, sign):
+    """Rows for ADJUST_POPULARITY and ADJUST_DAILY_POPULARITY, in product order to keep lock order stable"""
+    lines = sorted(lines)
+    sale_date = order_date.date()
+    return ([(product_id, sign, sign * quantity) for product_id, quantity in lines],
+            [(sale_date, product_id, sign, sign * quantity) for product_id, quantity in lines])
+
+def sales_deltas(order_date, customer_id, total, sign):
+    """Rows for ADJUST_SALES_HOURLY, ADJUST_SALES_DAILY and ADJUST_CUSTOMER_TOTALS"""
+    sale_hour = order_date.replace(minute=0, second=0, microsecond=0)
+    return ((sale_hour, sign, sign * total),
+            (order_date.date(), sign, sign * total),
+            (customer_id, sign, sign * total, order_date))
+
+def rollup_days(first_day, last_day):
+    """Yield (day, start, end) for each day in [first_day, last_day], end being exclusive"""
+    day = first_day
+    while day <= last_day:
+        start = datetime.combine(day, datetime.min.time())
+        yield day, start, start + timedelta(days=1)
+        day += timedelta(days=1)
+
+def first_rollup_day(first_order):
+    """The day rebuild_sales starts from by default, given GET_FIRST_ORDER_DATE's result: the first order's, or today"""
+    if not first_order or first_order[0][0] is None:
+        return datetime.now().date()
+    return first_order[0][0].date()
+
+def add_product(queries, name, category, price, stock, description):
+    """Insert a product; returns its id"""
+    return (yield insert(queries.ADD_PRODUCT, (name, category, price, stock, description)))
+
+def set_product_stock(queries, product_id, stock, reason):
+    """Set a product's stock and log the change; returns the previous stock, or None if not found"""
+    row = yield fetch_one(queries.LOCK_PRODUCT_STOCK, (product_id,))
+    if row is None:
+        return None
+    previous_stock = row[0]
+    change = stock - previous_stock
+    if change:
+        yield execute(queries.SET_PRODUCT_STOCK, (stock, product_id))
+        action = 'restock' if change > 0 else 'adjustment'
+        yield execute(queries.ADD_INVENTORY_LOG, (product_id, action, change, previous_stock, stock, reason))
+    return previous_stock
+
+def upsert_products(queries, products, reason):
+    """Insert or update products, logging stock changes in one batch; returns (inserted, updated, unchanged)"""
+    by_key = dict((product_key(product), product) for product in products)
+    skus = [value for kind, value in by_key if kind == 'sku']
+    ids = [value for kind, value in by_key if kind == 'id']
+    select = queries.lock_products_by_keys(len(skus), len(ids))
+    
+    before = index_existing((yield fetch_all(select, [*skus, *ids])))
+    changed = yield execute_many(queries.UPSERT_PRODUCT,
+                                 [tuple(product[field] for field in PRODUCT_FIELDS) for product in by_key.values()])
+    inserted = sum(1 for key in by_key if key not in before)
+    updated = (changed - inserted) // queries.UPSERT_ROWS_PER_UPDATE
+    
+    after = index_existing((yield fetch_all(select, [*skus, *ids])))
+    log_rows = []
+    for key in by_key:
+        current = after.get(key)
+        previous_stock = before[key]['stock'] if key in before else 0
+        change = current['stock'] - previous_stock if current else 0
+        if change:
+            action = 'restock' if change > 0 else 'adjustment'
+            log_rows.append((current['id'], action, change, previous_stock, current['stock'], reason))
+    if log_rows:
+        yield execute_many(queries.ADD_INVENTORY_LOG, log_rows)
+    return inserted, updated, len(by_key) - inserted - updated
+
+def place_order(queries, order_data, cart_items):
+    """Decrement stock and write the order, its items and aggregates.
+    
+    Returns (True, []), or (False, short_items) after rolling back when
+    some lines lack stock, each entry being (product_id, requested, available).
+    """
+    lines, item_rows = order_lines(order_data[0], cart_items)
+    decremented = yield execute(queries.decrement_stock(len(lines)), [value for line in lines for value in line])
+    if decremented != len(lines):
+        yield rollback()
+        stock_levels = yield fetch_all(queries.get_stock_levels(len(lines)), [product_id for product_id, _ in lines])
+        return False, short_lines(lines, stock_levels)
+    
+    yield execute(queries.CREATE_ORDER, order_data)
+    yield execute_many(queries.ADD_ORDER_ITEM, item_rows)
+    yield from adjust_popularity(queries, order_data[10], lines, 1)
+    yield from adjust_sales(queries, order_data[10], order_data[1], order_data[5], 1)
+    return True, []
+
+def adjust_popularity(queries, order_date, lines, sign):
+    """Add (sign=1) or reverse (sign=-1) an order's lines in the popularity aggregates"""
+    popularity_rows, daily_rows = popularity_deltas(order_date, lines, sign)
+    yield execute_many(queries.ADJUST_POPULARITY, popularity_rows)
+    yield execute_many(queries.ADJUST_DAILY_POPULARITY, daily_rows)
+
+def adjust_sales(queries, order_date, customer_id, total, sign):
+    """Add (sign=1) or reverse (sign=-1) an order in the sales rollups and customer totals"""
+    hourly_row, daily_row, customer_row = sales_deltas(order_date, customer_id, total, sign)
+    yield execute(queries.ADJUST_SALES_HOURLY, hourly_row)
+    yield execute(queries.ADJUST_SALES_DAILY, daily_row)
+    yield execute(queries.ADJUST_CUSTOMER_TOTALS, customer_row)
+
+def update_order_status(queries, order_id, status):
+    """Set an order's status, reversing popularity and sales when it is cancelled.
+    
+    Returns (affected rows, customer_id), customer_id being None for an unknown order.
+    """
+    current = yield fetch_one(queries.LOCK_ORDER_STATUS, (order_id,))
+    if current is None:
+        return 0, None
+    previous_status, order_date, customer_id, total = current
+    
+    affected_rows = yield execute(queries.UPDATE_ORDER_STATUS, (status, order_id))
+    # Cancelled orders don't count towards popularity or sales; un-cancelling restores them
+    if (previous_status == 'cancelled') != (status == 'cancelled'):
+        sign = -1 if status == 'cancelled' else 1
+        lines = yield fetch_all(queries.GET_ORDER_LINES, (order_id,))
+        if lines:
+            yield from adjust_popularity(queries, order_date, lines, sign)
+        yield from adjust_sales(queries, order_date, customer_id, total, sign)
+    return affected_rows, customer_id
+
+def customer_stats(queries, active_days, top):
+    """Reads for get_customer_stats; returns (total customers, active customers, top customers by spend)"""
+    since = datetime.now() - timedelta(days=active_days)
+    total = yield fetch_all(queries.COUNT_CUSTOMERS)
+    active = yield fetch_all(queries.COUNT_ACTIVE_CUSTOMERS, (since,))
+    top_customers = yield fetch_all(queries.GET_TOP_CUSTOMERS, (top,))
+    return (total[0][0] if total else 0,
+            active[0][0] if active else 0,
+            top_customers or [])
+
+def rebuild_popularity(queries):
+    """Recompute the popularity aggregates from the order history; returns (products, product days)"""
+    yield execute(queries.CLEAR_POPULARITY)
+    products = yield execute(queries.REBUILD_POPULARITY)
+    yield execute(queries.CLEAR_DAILY_POPULARITY)
+    return products, (yield execute(queries.REBUILD_DAILY_POPULARITY))
+
+def rebuild_sales_day(queries, day, start, end):
+    """Recompute one day of the hourly and daily sales rollups"""
+    yield execute(queries.CLEAR_SALES_HOURLY_RANGE, (start, end))
+    yield execute(queries.REBUILD_SALES_HOURLY_RANGE, (start, end))
+    yield execute(queries.CLEAR_SALES_DAILY_RANGE, (day, end.date()))
+    yield execute(queries.REBUILD_SALES_DAILY_RANGE, (start, end))
+
+def rebuild_customer_totals(queries):
+    """Recompute the customer totals; returns the number of customers"""
+    yield execute(queries.CLEAR_CUSTOMER_TOTALS)
+    return (yield execute(queries.REBUILD_CUSTOMER_TOTALS))
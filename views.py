@@ -0,0 +1,249 @@
+"""
+Message views for Grocery Store Bot
+Builds reply texts and keyboards from plain data, shared by the threaded bot
+(Bot.py) and the asyncio bot (async_bot.py)
+"""
+
+from datetime import datetime
+import telebot
+from config import Config
+from sessions import cart_to_json
+from order_ids import format_order_id
+
+# Inline buttons; reply keyboards live in keyboards.py
+def add_to_cart_button(product_id, name):
+    return telebot.types.InlineKeyboardButton(f"🛒 Add {name}", callback_data=f"add_to_cart_{product_id}")
+
+# Message texts
+def welcome_text(first_name):
+    return f"""
+🏪 Welcome to {Config.STORE_NAME}, {first_name}!
+
+I can help you:
+• 🛒 Browse and order products
+• 🛍️ Manage your shopping cart
+• 📦 Choose delivery or take-away
+• 📋 Track your orders
+• 📞 Get customer support
+
+Let's get started! 🛒
+    """
+
+HELP_TEXT = """
+🆘 **How to use this bot:**
+
+🛒 **Browse Products** - View available items by category
+🛍️ **View Cart** - See items in your cart and manage them
+📦 **Order Type** - Choose between home delivery or take-away
+📋 **My Orders** - View your order history
+ℹ️ **Help** - Show this help message
+📞 **Contact** - Get store contact information
+
+**Commands:**
+/start - Start the bot
+/help - Show help
+/cart - Quick access to cart
+/orders - View your orders
+    """
+
+def contact_text():
+    return f"""
+📞 **Contact Information**
+
+🏪 **Store Name:** {Config.STORE_NAME}
+📍 **Address:** {Config.STORE_ADDRESS}
+📞 **Phone:** {Config.STORE_PHONE}
+📧 **Email:** {Config.STORE_EMAIL}
+
+🕒 **Store Hours:**
+Monday - Friday: {Config.STORE_OPEN_TIME} - {Config.STORE_CLOSE_TIME}
+Saturday - Sunday: {Config.STORE_OPEN_TIME} - {Config.STORE_CLOSE_TIME}
+
+🚚 **Delivery Hours:**
+Monday - Sunday: {Config.DELIVERY_OPEN_TIME} - {Config.DELIVERY_CLOSE_TIME}
+
+💰 **Delivery Info:**
+• Delivery fee: ${Config.DELIVERY_FEE:.2f}
+• Free delivery on orders over ${Config.FREE_DELIVERY_MINIMUM:.2f}
+• Delivery radius: {Config.DELIVERY_RADIUS_KM} km
+    """
+
+# Listing pages; descriptions are cut so a full page stays under Telegram's 4096 characters
+DESCRIPTION_PREVIEW = 120
+PAGE_NOOP = "page_noop"
+
+def _description(description):
+    if description and len(description) > DESCRIPTION_PREVIEW:
+        return description[:DESCRIPTION_PREVIEW - 1] + "…"
+    return description
+
+def category_entry(product):
+    """Markdown for a catalog row (id, name, price, stock, description, image_url)"""
+    product_id, name, price, stock, description, image_url = product
+    entry = f"**{name}**\n"
+    entry += f"💰 Price: ${price:.2f}\n"
+    entry += f"📦 Stock: {stock} units\n"
+    if description:
+        entry += f"📝 {_description(description)}\n"
+    return entry + "\n"
+
+def search_entry(product):
+    """Markdown for a search result (id, name, category, price, stock, description)"""
+    product_id, name, category, price, stock, description = product
+    entry = f"**{name}**\n"
+    entry += f"📂 Category: {category}\n"
+    entry += f"💰 Price: ${price:.2f}\n"
+    entry += f"📦 Stock: {stock} units\n"
+    if description:
+        entry += f"📝 {_description(description)}\n"
+    return entry + "\n"
+
+def popular_entry(rank, product):
+    """Markdown for a popular products row"""
+    product_id, name, category, price, stock, order_count, total_sold = product
+    entry = f"**{rank}. {name}**\n"
+    entry += f"📂 {category} | 💰 ${price:.2f}\n"
+    entry += f"📦 {stock} in stock | 🔥 Ordered {order_count} times\n\n"
+    return entry
+
+def listing_page(title, entries, products, page, page_count, page_data):
+    """Text and keyboard for one page: add-to-cart buttons plus prev/next buttons
+    whose callback data is page_data(page_number)"""
+    response = f"{title}\n\n" + "".join(entries)
+    markup = telebot.types.InlineKeyboardMarkup()
+    
+    for product in products:
+        markup.add(add_to_cart_button(product[0], product[1]))
+    
+    if page_count > 1:
+        response += f"📄 Page {page + 1} of {page_count}"
+        buttons = []
+        if page > 0:
+            buttons.append(telebot.types.InlineKeyboardButton("◀️ Prev", callback_data=page_data(page - 1)))
+        buttons.append(telebot.types.InlineKeyboardButton(f"{page + 1}/{page_count}", callback_data=PAGE_NOOP))
+        if page < page_count - 1:
+            buttons.append(telebot.types.InlineKeyboardButton("Next ▶️", callback_data=page_data(page + 1)))
+        markup.row(*buttons)
+    
+    return response, markup
+
+def cart_text(cart):
+    cart_text = "🛍️ **Your Cart:**\n\n"
+    total = 0
+    
+    for product_id, item in cart.items():
+        subtotal = item.price * item.quantity
+        total += subtotal
+        cart_text += f"**{item.name}**\n"
+        cart_text += f"💰 ${item.price:.2f} x {item.quantity} = ${subtotal:.2f}\n\n"
+    
+    cart_text += f"**Total: ${total:.2f}**"
+    return cart_text
+
+def orders_text(orders, title="📋 **Your Recent Orders:**"):
+    response = f"{title}\n\n"
+    for order in orders:
+        order_id, total, status, order_date, order_type, delivery_address = order[:6]
+        response += f"🔢 **Order #{format_order_id(order_id)}**\n"
+        response += f"💰 Total: ${total:.2f}\n"
+        response += f"📦 Type: {order_type.title()}\n"
+        response += f"📅 Date: {order_date.strftime('%Y-%m-%d %H:%M')}\n"
+        response += f"📊 Status: {status.title()}\n"
+        if order_type == 'delivery' and delivery_address:
+            response += f"📍 Address: {delivery_address[:50]}...\n"
+        response += "\n"
+    return response
+
+def orders_page(orders, newest_data=None, older_data=None):
+    """Text and keyboard for a page of order history. The first page has no
+    newest_data; older_data is None on the last page"""
+    title = "📋 **Your Recent Orders:**" if newest_data is None else "📋 **Your Earlier Orders:**"
+    response = orders_text(orders, title)
+    buttons = []
+    if newest_data is not None:
+        buttons.append(telebot.types.InlineKeyboardButton("⏮️ Newest", callback_data=newest_data))
+    if older_data is not None:
+        buttons.append(telebot.types.InlineKeyboardButton("Older orders ▶️", callback_data=older_data))
+    if not buttons:
+        return response, None
+    
+    markup = telebot.types.InlineKeyboardMarkup()
+    markup.row(*buttons)
+    return response, markup
+
+def generate_bill(session, order_id, subtotal, delivery_fee, total):
+    bill = f"""
+🧾 **ORDER CONFIRMATION**
+
+📋 Order ID: `{format_order_id(order_id)}`
+📅 Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+**Items Ordered:**
+"""
+    
+    for item in session.cart.values():
+        item_total = item.price * item.quantity
+        bill += f"• {item.name} x {item.quantity} = ${item_total:.2f}\n"
+    
+    bill += f"""
+💰 **Subtotal:** ${subtotal:.2f}
+🚚 **Delivery Fee:** ${delivery_fee:.2f}
+**Total Amount:** ${total:.2f}
+
+📦 **Order Type:** {session.delivery_type.title()}
+"""
+    
+    if session.delivery_type == "delivery":
+        bill += f"📍 **Delivery Address:** {session.customer_info.get('address', 'N/A')}\n"
+    
+    bill += f"📞 **Phone:** {session.customer_info.get('phone', 'N/A')}\n"
+    bill += "\n✅ Your order has been confirmed!\n"
+    
+    if session.delivery_type == "delivery":
+        bill += "🚚 Expected delivery time: 30-45 minutes"
+    else:
+        bill += "🏪 You can pick up your order in 15-20 minutes"
+    
+    return bill
+
+# Checkout helpers
+def order_totals(session):
+    """Get (subtotal, delivery_fee, total) for a session's cart"""
+    total = sum(item.price * item.quantity for item in session.cart.values())
+    
+    # Add delivery fee if applicable
+    delivery_fee = 0.0
+    if session.delivery_type == "delivery":
+        if total < Config.FREE_DELIVERY_MINIMUM:
+            delivery_fee = Config.DELIVERY_FEE
+    
+    return total, delivery_fee, total + delivery_fee
+
+def order_record(order_id, user_id, session, subtotal, delivery_fee, total):
+    """Build the orders row for DatabaseManager.place_order"""
+    return (
+        order_id,
+        user_id,
+        cart_to_json(session.cart),
+        subtotal,
+        delivery_fee,
+        total,
+        session.delivery_type,
+        session.customer_info.get('address', ''),
+        session.customer_info.get('phone', ''),
+        'pending',
+        datetime.now()
+    )
+
+def trim_short_items(session, short_items):
+    """Cut cart lines down to the stock left and describe what changed"""
+    response = "❌ Sorry, some items are no longer available in the quantity you asked for:\n\n"
+    for product_id, requested, available in short_items:
+        item = session.cart[product_id]
+        response += f"• {item.name}: requested {requested}, {available} left\n"
+        if available > 0:
+            item.quantity = available
+        else:
+            del session.cart[product_id]
+    response += "\nYour cart has been updated. Please review it and checkout again."
+    return response
@@ -0,0 +1,207 @@
+"""
+Webhook server for Grocery Store Bot
+Receives Telegram updates on an asyncio HTTP server, validates the secret
+token and hands updates to a bounded pool of handler threads
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import telebot
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+MAX_BODY_SIZE = 1024 * 1024
+READ_TIMEOUT = 30
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+               405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+class WebhookServer:
+    """Minimal HTTP/1.1 server for Telegram webhook updates.
+    
+    An update is acknowledged once it is queued. When all workers are busy
+    and the queue is full the server answers 503, and Telegram retries the
+    update later instead of it piling up in memory.
+    
+    With raw_updates, bot.process_new_updates gets the decoded JSON dicts
+    rather than telebot Update objects, e.g. for the supervisor to shard.
+    """
+    
+    def __init__(self, bot, host=None, port=None, path=None, secret_token=None,
+                 workers=None, queue_size=None, raw_updates=False):
+        self.bot = bot
+        self.raw_updates = raw_updates
+        self.host = host or Config.WEBHOOK_HOST
+        self.port = port if port is not None else Config.WEBHOOK_PORT
+        self.path = path or Config.WEBHOOK_PATH
+        self.secret_token = secret_token or Config.WEBHOOK_SECRET
+        if not self.secret_token:
+            raise ValueError("WEBHOOK_SECRET must be set to run in webhook mode")
+        
+        workers = workers or Config.WEBHOOK_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self._slots = threading.BoundedSemaphore(workers + (queue_size or Config.WEBHOOK_QUEUE_SIZE))
+        self._server = None
+        
+        # Updates are dispatched by our pool, not telebot's own worker threads
+        self.bot.threaded = False
+        
+        # Counters are updated from the event loop and the handler threads
+        self._lock = threading.Lock()
+        self.received = 0
+        self.rejected = 0
+        self.failed = 0
+        self.pending = 0
+    
+    async def start(self):
+        """Start listening; returns once the socket is bound"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+    
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+    
+    async def stop(self, drain_timeout=30):
+        """Stop accepting updates and wait for queued ones to finish"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(loop.run_in_executor(None, self._executor.shutdown, True), drain_timeout)
+        logger.info(f"Webhook server stopped: {self.stats()}")
+    
+    def stats(self):
+        with self._lock:
+            return {'received': self.received, 'rejected': self.rejected,
+                    'failed': self.failed, 'pending': self.pending}
+    
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = self._handle_request(method, target, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            logger.warning(f"Malformed webhook request: {e}")
+            await self._write_response(writer, 400, None, False)
+        finally:
+            writer.close()
+    
+    async def _read_request(self, reader):
+        """Parse one HTTP request, or return None when the client closed the connection"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ValueError("bad request line")
+        method, target, _ = parts
+        
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_SIZE:
+            raise ValueError("body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+    
+    def _handle_request(self, method, target, headers, body):
+        path = target.split('?', 1)[0]
+        if method == 'GET' and path == '/healthz':
+            health = getattr(self.bot, 'health', None)
+            if health is None:
+                return 200, self.stats()
+            # Supervisor mode: unhealthy only once no worker is left to take updates
+            workers = health()
+            return (200 if workers['alive'] else 503), dict(self.stats(), workers=workers)
+        if path != self.path:
+            return 404, None
+        if method != 'POST':
+            return 405, None
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ''), self.secret_token):
+            logger.warning("Rejected webhook request with a missing or wrong secret token")
+            return 403, None
+        
+        try:
+            text = body.decode('utf-8')
+            update = json.loads(text) if self.raw_updates else telebot.types.Update.de_json(text)
+        except Exception as e:
+            logger.warning(f"Unparseable webhook update: {e}")
+            return 400, None
+        
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return 503, None
+        with self._lock:
+            self.received += 1
+            self.pending += 1
+        self._executor.submit(self._process, update)
+        return 200, None
+    
+    def _process(self, update):
+        try:
+            self.bot.process_new_updates([update])
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            update_id = update['update_id'] if self.raw_updates else update.update_id
+            logger.error(f"Error handling update {update_id}: {e}")
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+    
+    async def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+def run_webhook(bot, receiver=None):
+    """Register the webhook with Telegram (when WEBHOOK_URL is set) and serve until interrupted.
+    
+    Updates go to bot, or as raw dicts to receiver when one is given.
+    """
+    server = WebhookServer(receiver or bot, raw_updates=receiver is not None)
+    if Config.WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(url=Config.WEBHOOK_URL, secret_token=server.secret_token,
+                        max_connections=Config.WEBHOOK_WORKERS)
+    
+    async def main():
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+    
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Webhook server interrupted")